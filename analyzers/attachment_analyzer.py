@@ -1,5 +1,7 @@
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+from utils.file_signature import FILE_TYPE_DESCRIPTIONS
 
 class AttachmentAnalyzer:
     """Analyze email attachments for phishing indicators"""
@@ -24,8 +26,40 @@ class AttachmentAnalyzer:
         '.pdf.js', '.doc.js', '.jpg.js'
     ]
     
+    # Extensions each sniffed file type (see utils.file_signature) legitimately carries
+    FILE_TYPE_EXTENSIONS = {
+        'pe': ['.exe', '.dll', '.scr', '.com', '.sys', '.cpl', '.ocx', '.drv', '.efi'],
+        'elf': ['.so', '.elf', '.bin', '.run'],
+        'lnk': ['.lnk'],
+        'ole2': ['.doc', '.dot', '.xls', '.xlt', '.ppt', '.pps', '.pot', '.msg', '.msi', '.vsd', '.pub'],
+        'zip': ['.zip', '.jar', '.apk', '.odt', '.ods', '.odp', '.epub', '.kmz',
+                '.docx', '.docm', '.xlsx', '.xlsm', '.pptx', '.pptm'],
+        'ooxml': ['.docx', '.docm', '.dotx', '.dotm', '.xlsx', '.xlsm', '.xltx', '.xlsb',
+                  '.pptx', '.pptm', '.ppsx', '.potx', '.vsdx', '.zip'],
+        'rar': ['.rar'],
+        '7z': ['.7z'],
+        'iso': ['.iso', '.img'],
+        'html': ['.html', '.htm', '.hta', '.xhtml', '.shtml', '.svg', '.mht'],
+        'pdf': ['.pdf'],
+        'png': ['.png'],
+        'jpeg': ['.jpg', '.jpeg', '.jpe', '.jfif'],
+        'gif': ['.gif'],
+    }
+    
+    # Sniffed types that run code when opened
+    EXECUTABLE_FILE_TYPES = ['pe', 'elf', 'lnk']
+    
+    # Archives that expand more than this many times, to at least this size, are treated as bombs
+    ARCHIVE_BOMB_RATIO = 100
+    ARCHIVE_BOMB_MIN_SIZE = 100 * 1024 * 1024
+    
+    # Known-bad attachment SHA-256 digests (utils.hash_blocklist.HashBlocklist), loaded with load_hash_blocklist
+    _hash_blocklist = None
+    KNOWN_MALWARE_SCORE = 100
+    
     def __init__(self, attachments: List[Dict]):
         self.attachments = attachments
+        self.known_malware = []
     
     def analyze(self) -> Dict:
         """Perform comprehensive attachment analysis"""
@@ -33,7 +67,8 @@ class AttachmentAnalyzer:
             return {
                 'risk_score': 0,
                 'findings': [],
-                'has_dangerous_attachments': False
+                'has_dangerous_attachments': False,
+                'known_malware_attachments': []
             }
         
         findings = []
@@ -44,6 +79,15 @@ class AttachmentAnalyzer:
             filename = attachment.get('filename', '').lower()
             content_type = attachment.get('content_type', '')
             file_size = attachment.get('size', 0)
+            detected_type = attachment.get('detected_type')
+            
+            # Check the content hash against known malware
+            known = self._check_known_malware(filename, attachment.get('sha256'))
+            if known:
+                findings.append(known)
+                risk_score += self.KNOWN_MALWARE_SCORE
+                has_dangerous = True
+                self.known_malware.append(attachment.get('filename', ''))
             
             # Check for dangerous extensions
             dangerous = self._check_dangerous_extension(filename)
@@ -65,21 +109,24 @@ class AttachmentAnalyzer:
                 risk_score += 30
                 has_dangerous = True
             
-            # Check for password-protected archives
-            if self._is_password_protected_archive(filename, content_type):
-                findings.append({
-                    'type': 'attachment',
-                    'severity': 'high',
-                    'description': 'Password-protected archive detected',
-                    'details': f"'{filename}' - often used to bypass security scans"
-                })
-                risk_score += 25
+            # Check archive members and flags, listed from the archive directory
+            # ZIP, RAR and 7z attachments carry a listing, or None when their structures do not parse
+            if 'archive' in attachment:
+                for finding, score in self._check_archive(filename, attachment['archive']):
+                    findings.append(finding)
+                    risk_score += score
+                    if finding['severity'] == 'critical':
+                        has_dangerous = True
             
             # Check for mismatched extension and content type
-            mismatch = self._check_content_type_mismatch(filename, content_type)
+            mismatch = self._check_content_type_mismatch(filename, content_type, detected_type)
             if mismatch:
                 findings.append(mismatch)
-                risk_score += 20
+                if mismatch['severity'] == 'critical':
+                    risk_score += 40
+                    has_dangerous = True
+                else:
+                    risk_score += 20
             
             # Check for unusually large files
             if file_size > 10 * 1024 * 1024:  # 10MB
@@ -95,7 +142,20 @@ class AttachmentAnalyzer:
             'risk_score': min(risk_score, 100),
             'findings': findings,
             'has_dangerous_attachments': has_dangerous,
-            'attachment_count': len(self.attachments)
+            'attachment_count': len(self.attachments),
+            'known_malware_attachments': self.known_malware
+        }
+    
+    def _check_known_malware(self, filename: str, sha256: str) -> Dict:
+        """Look the attachment's SHA-256 up in the hash blocklist"""
+        blocklist = self._hash_blocklist
+        if blocklist is None or not sha256 or not blocklist.contains_sha256(sha256):
+            return None
+        return {
+            'type': 'attachment',
+            'severity': 'critical',
+            'description': 'Known malware attachment',
+            'details': f"'{filename}' matches known-bad SHA-256 {sha256}"
         }
     
     def _check_dangerous_extension(self, filename: str) -> Dict:
@@ -160,15 +220,109 @@ class AttachmentAnalyzer:
         
         return None
     
-    def _is_password_protected_archive(self, filename: str, content_type: str) -> bool:
-        """Check if file is likely a password-protected archive"""
-        # This is a heuristic - we can't definitively know without opening the file
-        # But we can flag archives which are commonly password-protected in phishing
-        archive_extensions = ['.zip', '.rar', '.7z']
-        return any(filename.endswith(ext) for ext in archive_extensions)
+    def _check_archive(self, filename: str, archive: Optional[Dict]) -> List[Tuple[Dict, int]]:
+        """Check an archive's members, encryption and compression ratio"""
+        if archive is None:
+            # Damaged, cut short or crafted to defeat parsers: none of its contents could be checked
+            return [({
+                'type': 'attachment',
+                'severity': 'high',
+                'description': 'Unreadable archive',
+                'details': f"'{filename}' could not be listed, so its contents were not checked"
+            }, 20)]
+        
+        results = []
+        dangerous_members = []
+        double_extension_members = []
+        for member in archive.get('entries', []):
+            # Members are checked by their own name, without the folders they sit in
+            name = member.replace('\\', '/').rsplit('/', 1)[-1].lower()
+            if self._check_double_extension(name):
+                double_extension_members.append(member)
+            elif self._check_dangerous_extension(name):
+                dangerous_members.append(member)
+        
+        if dangerous_members:
+            results.append(({
+                'type': 'attachment',
+                'severity': 'critical',
+                'description': 'Dangerous executable inside archive',
+                'details': f"'{filename}' contains {self._describe_members(dangerous_members)}"
+            }, 40))
+        if double_extension_members:
+            results.append(({
+                'type': 'attachment',
+                'severity': 'critical',
+                'description': 'Double extension inside archive',
+                'details': f"'{filename}' contains {self._describe_members(double_extension_members)}"
+            }, 30))
+        
+        if archive.get('encrypted'):
+            if archive.get('headers_encrypted'):
+                details = f"'{filename}' also encrypts its file names, hiding its contents from scanners"
+            else:
+                details = f"'{filename}' - often used to bypass security scans"
+            results.append(({
+                'type': 'attachment',
+                'severity': 'high',
+                'description': 'Password-protected archive detected',
+                'details': details
+            }, 25))
+        
+        # Header-encrypted archives are explained above; others stopped at a limit, damage or a compressed 7z header
+        if archive.get('truncated') and not archive.get('headers_encrypted'):
+            results.append(({
+                'type': 'attachment',
+                'severity': 'medium',
+                'description': 'Archive could not be fully inspected',
+                'details': f"'{filename}' was listed only in part ({len(archive.get('entries', []))} entries), "
+                           f"the rest of its contents were not checked"
+            }, 10))
+        
+        compressed = archive.get('compressed_size', 0)
+        uncompressed = archive.get('uncompressed_size', 0)
+        if archive.get('overlapping_entries') or (
+                uncompressed >= self.ARCHIVE_BOMB_MIN_SIZE
+                and uncompressed > compressed * self.ARCHIVE_BOMB_RATIO):
+            results.append(({
+                'type': 'attachment',
+                'severity': 'high',
+                'description': 'Possible archive bomb',
+                'details': (f"'{filename}' has entries sharing the same data" if archive.get('overlapping_entries')
+                            else f"'{filename}' expands from {compressed / (1024*1024):.1f}MB "
+                                 f"to {uncompressed / (1024*1024):.1f}MB")
+            }, 25))
+        
+        return results
+    
+    @staticmethod
+    def _describe_members(members: List[str]) -> str:
+        if len(members) == 1:
+            return f"'{members[0]}'"
+        return f"'{members[0]}' and {len(members) - 1} more"
     
-    def _check_content_type_mismatch(self, filename: str, content_type: str) -> Dict:
-        """Check if filename extension matches content type"""
+    def _check_content_type_mismatch(self, filename: str, content_type: str, detected_type: str = None) -> Dict:
+        """Check if filename extension matches the sniffed (or else the declared) content type"""
+        if detected_type in self.FILE_TYPE_EXTENSIONS:
+            extension = os.path.splitext(filename)[1]
+            if extension in self.FILE_TYPE_EXTENSIONS[detected_type]:
+                return None
+            description = FILE_TYPE_DESCRIPTIONS.get(detected_type, detected_type)
+            if detected_type in self.EXECUTABLE_FILE_TYPES:
+                return {
+                    'type': 'attachment',
+                    'severity': 'critical',
+                    'description': 'Executable disguised as another file type',
+                    'details': f"'{filename}' contains {description}"
+                }
+            return {
+                'type': 'attachment',
+                'severity': 'medium',
+                'description': 'Extension and file content mismatch',
+                'details': f"'{filename}' contains {description}"
+            }
+        
+        # Nothing recognizable in the content, so only the sender's declared type is left
         # Simple extension to MIME type mapping
         mime_map = {
             '.pdf': 'application/pdf',
@@ -193,6 +347,13 @@ class AttachmentAnalyzer:
         
         return None
     
+    @classmethod
+    def load_hash_blocklist(cls, path: str):
+        """Check attachment hashes against a hash blocklist written by build_blocklist.py --hashes"""
+        # Imported here so the mmap machinery is only loaded when a hash blocklist is in use
+        from utils.hash_blocklist import HashBlocklist
+        cls._hash_blocklist = HashBlocklist(path)
+    
     def get_attachment_summary(self) -> List[Dict]:
         """Get summary of all attachments"""
         summary = []
@@ -1,5 +1,6 @@
-import re
 from typing import Dict, List
+from utils import patterns
+from utils.keyword_matcher import KeywordMatcher
 
 class ContentAnalyzer:
     """Analyze email content for phishing indicators"""
@@ -39,11 +40,44 @@ class ContentAnalyzer:
         'valued customer', 'valued member', 'hello user', 'greetings'
     ]
     
+    # Common misspellings in phishing
+    MISSPELLINGS = {
+        'recieve': 'receive',
+        'occured': 'occurred',
+        'seperate': 'separate',
+        'untill': 'until',
+        'transfered': 'transferred'
+    }
+    
+    # Keyword automaton shared by every instance, compiled on first use
+    _matcher = None
+    
     def __init__(self, subject: str, body_text: str, body_html: str):
         self.subject = subject.lower() if subject else ""
         self.body_text = body_text.lower() if body_text else ""
         self.body_html = body_html.lower() if body_html else ""
         self.full_content = f"{self.subject} {self.body_text}".lower()
+        self._keyword_hits = None
+    
+    @classmethod
+    def _get_matcher(cls) -> KeywordMatcher:
+        """Compile every keyword list into one automaton, once per class"""
+        if cls.__dict__.get('_matcher') is None:
+            cls._matcher = KeywordMatcher({
+                'urgency': cls.URGENCY_KEYWORDS,
+                'threat': cls.THREAT_KEYWORDS,
+                'offer': cls.OFFER_KEYWORDS,
+                'sensitive_request': cls.SENSITIVE_REQUEST_KEYWORDS,
+                'greeting': cls.GENERIC_GREETINGS,
+                'misspelling': list(cls.MISSPELLINGS)
+            })
+        return cls._matcher
+    
+    def _get_keyword_hits(self) -> Dict[str, Dict[str, int]]:
+        """Scan the content once for every keyword category"""
+        if self._keyword_hits is None:
+            self._keyword_hits = self._get_matcher().find_categories(self.full_content)
+        return self._keyword_hits
     
     def analyze(self) -> Dict:
         """Perform comprehensive content analysis"""
@@ -117,11 +151,10 @@ class ContentAnalyzer:
     def _check_keywords(self, keywords: List[str], category: str) -> List[Dict]:
         """Check for presence of specific keywords"""
         findings = []
-        found_keywords = []
+        hits = self._get_keyword_hits().get(category, {})
         
-        for keyword in keywords:
-            if keyword in self.full_content:
-                found_keywords.append(keyword)
+        # Report keywords in list order, as the lists are ordered by relevance
+        found_keywords = [keyword for keyword in keywords if keyword in hits]
         
         if found_keywords:
             severity_map = {
@@ -149,8 +182,9 @@ class ContentAnalyzer:
     
     def _check_generic_greeting(self) -> Dict:
         """Check for generic greetings"""
+        hits = self._get_keyword_hits().get('greeting', {})
         for greeting in self.GENERIC_GREETINGS:
-            if greeting in self.full_content:
+            if greeting in hits:
                 return {
                     'type': 'content',
                     'severity': 'low',
@@ -162,18 +196,10 @@ class ContentAnalyzer:
     def _check_spelling_issues(self) -> List[Dict]:
         """Check for common spelling issues in phishing emails"""
         findings = []
+        hits = self._get_keyword_hits().get('misspelling', {})
         
-        # Common misspellings in phishing
-        misspellings = {
-            'recieve': 'receive',
-            'occured': 'occurred',
-            'seperate': 'separate',
-            'untill': 'until',
-            'transfered': 'transferred'
-        }
-        
-        for wrong, correct in misspellings.items():
-            if wrong in self.full_content:
+        for wrong, correct in self.MISSPELLINGS.items():
+            if wrong in hits:
                 findings.append({
                     'type': 'content',
                     'severity': 'low',
@@ -186,21 +212,21 @@ class ContentAnalyzer:
     def _check_excessive_punctuation(self) -> bool:
         """Check for excessive punctuation marks"""
         # Check for multiple exclamation or question marks
-        if re.search(r'[!?]{2,}', self.full_content):
+        if patterns.EXCESSIVE_PUNCTUATION.search(self.full_content):
             return True
         return False
     
     def _check_excessive_caps(self) -> bool:
         """Check for excessive use of capital letters"""
         # Check for words with 5+ consecutive caps
-        if re.search(r'\b[A-Z]{5,}\b', self.subject + " " + self.body_text):
+        if patterns.CAPS_WORD.search(self.subject + " " + self.body_text):
             return True
         
         # Check if more than 30% of letters are capitalized
         if self.body_text:
-            letters = re.findall(r'[a-zA-Z]', self.body_text)
-            if len(letters) > 20:  # Only check if there's substantial text
-                caps_ratio = sum(1 for c in letters if c.isupper()) / len(letters)
+            letter_count = len(patterns.ASCII_LETTER.findall(self.body_text))
+            if letter_count > 20:  # Only check if there's substantial text
+                caps_ratio = len(patterns.ASCII_UPPERCASE.findall(self.body_text)) / letter_count
                 if caps_ratio > 0.3:
                     return True
         
@@ -1,29 +1,41 @@
-import re
-from email_validator import validate_email, EmailNotValidError
-from typing import Dict, List
+from typing import Dict, List, Tuple
+from utils import patterns
+from utils.domain_set import DomainSet
+from utils.public_suffix import registrable_domain
 
 class SenderAnalyzer:
     """Analyze email sender for phishing indicators"""
     
-    # Free email providers
-    FREE_EMAIL_PROVIDERS = [
+    # Free email providers (an address matches if its domain is one of these or a subdomain of one)
+    FREE_EMAIL_PROVIDERS = DomainSet([
         'gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com',
         'aol.com', 'mail.com', 'protonmail.com', 'icloud.com',
         'live.com', 'msn.com', 'zoho.com', 'yandex.com'
-    ]
+    ])
     
     # Legitimate company domains
-    COMPANY_DOMAINS = [
+    COMPANY_DOMAINS = DomainSet([
         'paypal.com', 'amazon.com', 'microsoft.com', 'apple.com',
         'google.com', 'facebook.com', 'netflix.com', 'ebay.com',
         'chase.com', 'wellsfargo.com', 'bankofamerica.com'
-    ]
+    ])
     
-    def __init__(self, sender_info: Dict, reply_to: str = ""):
+    # Sender domains registered more recently than this are flagged
+    NEW_DOMAIN_DAYS = 30
+    
+    def __init__(self, sender_info: Dict, reply_to: str = "", authentication: Dict = None,
+                 domain_info: Dict[str, Dict] = None):
         self.sender_name = sender_info.get('name', '')
         self.sender_email = sender_info.get('email', '')
         self.raw_sender = sender_info.get('raw', '')
         self.reply_to = reply_to
+        self.email_domain = self.sender_email.split('@')[-1].lower().rstrip('.') if '@' in self.sender_email else ''
+        # Registrable domain per the Public Suffix List, so 'gmail.com.evil.tk' is 'evil.tk'
+        self.sender_registrable = (registrable_domain(self.email_domain) or self.email_domain) if self.email_domain else ''
+        # SPF/DKIM/DMARC results from utils.email_auth.EmailAuthenticator, when available
+        self.authentication = authentication
+        # Host -> WHOIS/DNS data from utils.enrichment.DomainEnricher, when available
+        self.domain_info = domain_info or {}
     
     def analyze(self) -> Dict:
         """Perform comprehensive sender analysis"""
@@ -71,6 +83,16 @@ class SenderAnalyzer:
             findings.append(lookalike)
             risk_score += 25
         
+        # Check SPF, DKIM and DMARC results
+        for finding, score in self._check_authentication():
+            findings.append(finding)
+            risk_score += score
+        
+        # Check domain age and MX records
+        for finding, score in self._check_domain_info():
+            findings.append(finding)
+            risk_score += score
+        
         return {
             'risk_score': min(risk_score, 100),
             'findings': findings,
@@ -79,6 +101,9 @@ class SenderAnalyzer:
     
     def _validate_email_format(self) -> Dict:
         """Validate email address format"""
+        # Imported on first use to keep worker and CLI start-up cheap
+        from email_validator import validate_email, EmailNotValidError
+        
         try:
             # Validate email
             valid = validate_email(self.sender_email, check_deliverability=False)
@@ -92,13 +117,13 @@ class SenderAnalyzer:
             return None
         
         name_lower = self.sender_name.lower()
-        email_domain = self.sender_email.split('@')[-1].lower() if '@' in self.sender_email else ''
+        email_domain = self.email_domain
         
         # Check if name claims to be from a company but email doesn't match
         for company_domain in self.COMPANY_DOMAINS:
             company_name = company_domain.split('.')[0]
             
-            if company_name in name_lower and company_domain not in email_domain:
+            if company_name in name_lower and self.COMPANY_DOMAINS.match(self.email_domain) != company_domain:
                 return {
                     'type': 'sender',
                     'severity': 'high',
@@ -113,11 +138,11 @@ class SenderAnalyzer:
         if not self.sender_name:
             return None
         
-        email_domain = self.sender_email.split('@')[-1].lower() if '@' in self.sender_email else ''
+        email_domain = self.email_domain
         name_lower = self.sender_name.lower()
         
         # Check if using free provider
-        is_free_provider = any(provider in email_domain for provider in self.FREE_EMAIL_PROVIDERS)
+        is_free_provider = self.email_domain in self.FREE_EMAIL_PROVIDERS
         
         # Check if name suggests official organization
         official_keywords = ['bank', 'support', 'service', 'team', 'security', 
@@ -139,7 +164,7 @@ class SenderAnalyzer:
         email_local = self.sender_email.split('@')[0] if '@' in self.sender_email else self.sender_email
         
         # Check for random character sequences
-        if re.search(r'[a-z]{2,}\d{4,}', email_local) or re.search(r'\d{4,}[a-z]{2,}', email_local):
+        if patterns.RANDOM_LOCAL_PART.search(email_local):
             return {
                 'type': 'sender',
                 'severity': 'medium',
@@ -173,7 +198,7 @@ class SenderAnalyzer:
     
     def _check_lookalike_characters(self) -> Dict:
         """Check for homograph/lookalike characters in domain"""
-        email_domain = self.sender_email.split('@')[-1].lower() if '@' in self.sender_email else ''
+        email_domain = self.sender_registrable
         
         # Common lookalike substitutions
         lookalikes = {
@@ -182,21 +207,97 @@ class SenderAnalyzer:
             'rn': 'm',  # rn vs m
         }
         
-        for company_domain in self.COMPANY_DOMAINS:
-            # Check if domain looks similar to legitimate domain
-            for fake, real in lookalikes.items():
-                if fake in email_domain:
-                    possible_real = email_domain.replace(fake, real)
-                    if possible_real == company_domain:
-                        return {
-                            'type': 'sender',
-                            'severity': 'critical',
-                            'description': 'Possible homograph/lookalike domain',
-                            'details': f"Domain '{email_domain}' may be impersonating '{company_domain}'"
-                        }
+        # Check if undoing a substitution turns the domain into a legitimate one
+        for fake, real in lookalikes.items():
+            if fake in email_domain:
+                company_domain = self.COMPANY_DOMAINS.match(email_domain.replace(fake, real))
+                if company_domain:
+                    return {
+                        'type': 'sender',
+                        'severity': 'critical',
+                        'description': 'Possible homograph/lookalike domain',
+                        'details': f"Domain '{email_domain}' may be impersonating '{company_domain}'"
+                    }
         
         return None
     
+    def _check_authentication(self) -> List[Tuple[Dict, int]]:
+        """Turn SPF/DKIM/DMARC failures into findings"""
+        if not self.authentication:
+            return []
+        
+        results = []
+        spf = self.authentication.get('spf', {})
+        dkim = self.authentication.get('dkim', {})
+        dmarc = self.authentication.get('dmarc', {})
+        
+        if dmarc.get('result') == 'fail':
+            enforced = dmarc.get('policy') in ('reject', 'quarantine')
+            results.append(({
+                'type': 'sender',
+                'severity': 'critical' if enforced else 'high',
+                'description': 'DMARC authentication failed',
+                'details': f"{self.authentication.get('from_domain', '')} publishes p={dmarc.get('policy')} "
+                           f"but neither SPF nor DKIM passed for it"
+            }, 40 if enforced else 25))
+        
+        if spf.get('result') == 'fail':
+            results.append(({
+                'type': 'sender',
+                'severity': 'high',
+                'description': 'SPF check failed',
+                'details': f"{spf.get('ip')} is not allowed to send mail for {spf.get('domain')}"
+            }, 20))
+        elif spf.get('result') == 'softfail':
+            results.append(({
+                'type': 'sender',
+                'severity': 'medium',
+                'description': 'SPF soft failure',
+                'details': f"{spf.get('domain')} does not expect mail from {spf.get('ip')}"
+            }, 10))
+        
+        if dkim.get('result') == 'fail':
+            failed = [signature for signature in dkim.get('signatures', []) if signature['result'] == 'fail']
+            results.append(({
+                'type': 'sender',
+                'severity': 'high',
+                'description': 'DKIM signature invalid',
+                'details': f"Signature from {failed[0]['domain']}: {failed[0]['reason']}" if failed else ''
+            }, 20))
+        
+        return results
+    
+    def _check_domain_info(self) -> List[Tuple[Dict, int]]:
+        """Flag sender domains that cannot receive mail or were registered very recently"""
+        info = self.domain_info.get(self.email_domain)
+        if not info:
+            return []
+        
+        results = []
+        if info.get('accepts_mail') is False:
+            results.append(({
+                'type': 'sender',
+                'severity': 'high',
+                'description': 'Sender domain cannot receive mail',
+                'details': f"{info['domain']} has no usable MX or address records, so replies cannot be delivered"
+            }, 20))
+        
+        age_days = info.get('age_days')
+        if age_days is not None and age_days < self.NEW_DOMAIN_DAYS:
+            results.append(({
+                'type': 'sender',
+                'severity': 'high',
+                'description': 'Recently registered sender domain',
+                'details': f"{info['domain']} was registered {age_days} days ago ({info.get('created')})"
+            }, 25))
+        
+        return results
+    
+    @classmethod
+    def load_free_email_providers(cls, path: str):
+        """Add a free or disposable provider feed (one domain per line) to FREE_EMAIL_PROVIDERS"""
+        cls.FREE_EMAIL_PROVIDERS = DomainSet.from_file(path, extra_domains=cls.FREE_EMAIL_PROVIDERS)
+    
     def get_sender_details(self) -> Dict:
         """Get detailed sender information"""
         email_domain = self.sender_email.split('@')[-1] if '@' in self.sender_email else 'unknown'
@@ -206,5 +307,6 @@ class SenderAnalyzer:
             'email': self.sender_email,
             'domain': email_domain,
             'reply_to': self.reply_to,
-            'is_free_provider': any(provider in email_domain for provider in self.FREE_EMAIL_PROVIDERS)
+            'registrable_domain': self.sender_registrable,
+            'is_free_provider': self.email_domain in self.FREE_EMAIL_PROVIDERS
         }
\ No newline at end of file
@@ -1,22 +1,25 @@
-import re
 from urllib.parse import urlparse
-import requests
-from typing import List, Dict
+from typing import List, Dict, Optional
+from utils import patterns
+from utils.cache import LRUCache
+from utils.domain_set import DomainSet
+from utils.public_suffix import split_host
+from utils.typosquat_index import TyposquatIndex
 
 class URLAnalyzer:
     """Analyze URLs for phishing indicators"""
     
-    # Common URL shorteners
-    URL_SHORTENERS = [
+    # Common URL shorteners (a host matches if it is one of these or a subdomain of one)
+    URL_SHORTENERS = DomainSet([
         'bit.ly', 'tinyurl.com', 'goo.gl', 'ow.ly', 't.co',
         'is.gd', 'buff.ly', 'adf.ly', 'cutt.ly', 'short.link'
-    ]
+    ])
     
     # Suspicious TLDs
-    SUSPICIOUS_TLDS = [
+    SUSPICIOUS_TLDS = DomainSet([
         '.tk', '.ml', '.ga', '.cf', '.gq', '.xyz', '.top',
         '.work', '.click', '.link', '.download'
-    ]
+    ])
     
     # Legitimate domains (for typosquatting detection)
     LEGITIMATE_DOMAINS = [
@@ -26,9 +29,29 @@ class URLAnalyzer:
         'wellsfargo.com', 'bankofamerica.com', 'citibank.com'
     ]
     
-    def __init__(self, urls: List[str]):
+    # Typosquatting index over the protected brand domains, built once per process
+    _typosquat_index = None
+    
+    # Process-wide verdict caches for hosts and full URLs seen in earlier messages
+    HOST_CACHE_SIZE = 50000
+    URL_CACHE_SIZE = 100000
+    CACHE_TTL = 3600
+    _host_cache = LRUCache(max_size=HOST_CACHE_SIZE, ttl=CACHE_TTL)
+    _url_cache = LRUCache(max_size=URL_CACHE_SIZE, ttl=CACHE_TTL)
+    
+    # Domains registered more recently than this are flagged
+    NEW_DOMAIN_DAYS = 30
+    
+    # Known-bad URL and domain feeds (utils.blocklist.Blocklist), loaded with load_blocklist
+    _blocklist = None
+    BLOCKLIST_SCORE = 60
+    
+    def __init__(self, urls: List[str], domain_info: Optional[Dict[str, Dict]] = None):
         self.urls = urls
+        # Host -> WHOIS/DNS data from utils.enrichment.DomainEnricher, when available
+        self.domain_info = domain_info or {}
         self.findings = []
+        self.known_malicious = []
     
     def analyze(self) -> Dict:
         """Perform comprehensive URL analysis"""
@@ -45,83 +68,133 @@ class URLAnalyzer:
         for url in self.urls:
             url_findings = self._analyze_single_url(url)
             if url_findings:
-                suspicious_urls.append({
+                finding = {
                     'url': url,
                     'issues': url_findings
-                })
+                }
                 total_score += len(url_findings) * 10
+                if url in self.known_malicious:
+                    finding['severity'] = 'critical'
+                    total_score += self.BLOCKLIST_SCORE
+                suspicious_urls.append(finding)
         
         self.findings = suspicious_urls
         
         return {
             'risk_score': min(total_score, 100),
             'findings': self.findings,
-            'suspicious_urls': [item['url'] for item in suspicious_urls]
+            'suspicious_urls': [item['url'] for item in suspicious_urls],
+            'known_malicious_urls': self.known_malicious
         }
     
     def _analyze_single_url(self, url: str) -> List[str]:
         """Analyze a single URL for suspicious patterns"""
-        issues = []
-        
         try:
             parsed = urlparse(url)
             domain = parsed.netloc.lower()
-            
-            # Check for IP address instead of domain
-            if self._is_ip_address(domain):
-                issues.append("Uses IP address instead of domain name")
-            
-            # Check for URL shorteners
-            if any(shortener in domain for shortener in self.URL_SHORTENERS):
-                issues.append("Uses URL shortener (hiding actual destination)")
-            
-            # Check for suspicious TLDs
-            if any(domain.endswith(tld) for tld in self.SUSPICIOUS_TLDS):
-                issues.append("Uses suspicious top-level domain")
-            
-            # Check for typosquatting
-            typosquat = self._check_typosquatting(domain)
-            if typosquat:
-                issues.append(f"Possible typosquatting of {typosquat}")
-            
-            # Check for excessive subdomains
-            if domain.count('.') > 3:
-                issues.append("Excessive subdomains (possible obfuscation)")
-            
-            # Check for suspicious keywords in domain
-            suspicious_keywords = ['secure', 'account', 'update', 'verify', 
-                                  'login', 'banking', 'paypal', 'amazon']
+        except Exception as e:
+            return ["Malformed URL structure"]
+        
+        # Host-level verdicts are shared by every URL on the same host, whatever its userinfo or port
+        host = self._hostname(domain)
+        issues = list(self._host_cache.get_or_compute(host, lambda: self._analyze_host(host)))
+        issues.extend(self._url_cache.get_or_compute(url, lambda: self._analyze_url_string(url)))
+        
+        known = self._check_blocklist(url, domain)
+        if known:
+            issues.append(known)
+            self.known_malicious.append(url)
+        
+        # Enrichment data changes between runs, so it stays out of the verdict caches
+        age_days = self.domain_info.get(domain, {}).get('age_days')
+        if age_days is not None and age_days < self.NEW_DOMAIN_DAYS:
+            issues.append(f"Domain registered {age_days} days ago")
+        return issues
+    
+    def _analyze_host(self, host: str) -> List[str]:
+        """Run the checks that depend only on the host (as returned by _hostname)"""
+        issues = []
+        
+        # Check for IP address instead of domain
+        if self._is_ip_address(host):
+            issues.append("Uses IP address instead of domain name")
+        
+        # Split on the Public Suffix List, so 'example.co.uk' is one registrable domain
+        subdomain, registrable, suffix = split_host(host)
+        
+        # Check for URL shorteners
+        if host in self.URL_SHORTENERS:
+            issues.append("Uses URL shortener (hiding actual destination)")
+        
+        # Check for suspicious TLDs
+        if suffix in self.SUSPICIOUS_TLDS:
+            issues.append("Uses suspicious top-level domain")
+        
+        # Check for typosquatting
+        typosquat = self._check_typosquatting(host)
+        if typosquat:
+            issues.append(f"Possible typosquatting of {typosquat}")
+        
+        # Check for excessive subdomains
+        if subdomain.count('.') >= 2:
+            issues.append("Excessive subdomains (possible obfuscation)")
+        
+        # Check for suspicious keywords in domain
+        suspicious_keywords = ['secure', 'account', 'update', 'verify', 
+                              'login', 'banking', 'paypal', 'amazon']
+        if registrable not in self.LEGITIMATE_DOMAINS:
             for keyword in suspicious_keywords:
-                if keyword in domain and not any(legit in domain for legit in self.LEGITIMATE_DOMAINS):
+                if keyword in host:
                     issues.append(f"Suspicious keyword '{keyword}' in domain")
-            
-            # Check for @ symbol (username in URL)
-            if '@' in url:
-                issues.append("Contains @ symbol (URL obfuscation technique)")
-            
-            # Check for very long URLs
-            if len(url) > 150:
-                issues.append("Unusually long URL (possible obfuscation)")
-            
-            # Check for hexadecimal encoding
-            if '%' in url and re.search(r'%[0-9A-Fa-f]{2}', url):
-                hex_count = len(re.findall(r'%[0-9A-Fa-f]{2}', url))
-                if hex_count > 3:
-                    issues.append("Heavy use of URL encoding (possible obfuscation)")
-            
-        except Exception as e:
-            issues.append(f"Malformed URL structure")
         
         return issues
     
+    def _analyze_url_string(self, url: str) -> List[str]:
+        """Run the checks that look at the full URL string"""
+        issues = []
+        
+        # Check for @ symbol (username in URL)
+        if '@' in url:
+            issues.append("Contains @ symbol (URL obfuscation technique)")
+        
+        # Check for very long URLs
+        if len(url) > 150:
+            issues.append("Unusually long URL (possible obfuscation)")
+        
+        # Check for hexadecimal encoding (a single scan both finds and counts escapes)
+        if '%' in url and len(patterns.HEX_ESCAPE.findall(url)) > 3:
+            issues.append("Heavy use of URL encoding (possible obfuscation)")
+        
+        return issues
+    
+    def _check_blocklist(self, url: str, domain: str) -> Optional[str]:
+        """Look the URL and its host up in the known-bad feeds"""
+        blocklist = self._blocklist
+        if blocklist is None:
+            return None
+        if blocklist.contains_url(url):
+            return "Known malicious URL (blocklist)"
+        listed = blocklist.match_domain(self._hostname(domain))
+        if listed:
+            return f"Known malicious domain '{listed}' (blocklist)"
+        return None
+    
+    @staticmethod
+    def _hostname(domain: str) -> str:
+        """Host part of a netloc, without userinfo, port or trailing dot"""
+        host = domain.rsplit('@', 1)[-1]
+        if host.startswith('['):
+            # IPv6 literal: the port follows the closing bracket
+            return host.split(']', 1)[0] + ']'
+        return host.split(':')[0].rstrip('.')
+    
     def _is_ip_address(self, domain: str) -> bool:
         """Check if domain is an IP address"""
-        # Remove port if present
-        domain = domain.split(':')[0]
+        # Remove userinfo and port if present
+        domain = self._hostname(domain)
         
         # IPv4 pattern
-        ipv4_pattern = r'^(\d{1,3}\.){3}\d{1,3}$'
-        if re.match(ipv4_pattern, domain):
+        if patterns.IPV4_ADDRESS.match(domain):
             return True
         
         # IPv6 pattern (simplified)
@@ -130,35 +203,44 @@ class URLAnalyzer:
         
         return False
     
+    @classmethod
+    def _get_typosquat_index(cls) -> TyposquatIndex:
+        """Build the typosquatting index from LEGITIMATE_DOMAINS on first use"""
+        if cls.__dict__.get('_typosquat_index') is None:
+            cls._typosquat_index = TyposquatIndex(cls.LEGITIMATE_DOMAINS)
+        return cls._typosquat_index
+    
+    @classmethod
+    def load_brand_domains(cls, path: str):
+        """Protect an additional list of brand domains (one per line) against typosquatting"""
+        cls._typosquat_index = TyposquatIndex.from_file(path, extra_domains=cls.LEGITIMATE_DOMAINS)
+        # Cached host verdicts were computed against the old brand list
+        cls._host_cache.clear()
+    
+    @classmethod
+    def load_blocklist(cls, path: str):
+        """Check URLs against a blocklist file written by build_blocklist.py"""
+        # Imported here so the mmap machinery is only loaded when a blocklist is in use
+        from utils.blocklist import Blocklist
+        cls._blocklist = Blocklist(path)
+    
+    @classmethod
+    def load_url_shorteners(cls, path: str):
+        """Add a shortener feed (one domain per line) to the built-in URL_SHORTENERS"""
+        cls.URL_SHORTENERS = DomainSet.from_file(path, extra_domains=cls.URL_SHORTENERS)
+        cls._host_cache.clear()
+    
+    @classmethod
+    def cache_stats(cls) -> Dict:
+        """Get hit/miss counters for the host and URL verdict caches"""
+        return {
+            'host': cls._host_cache.stats(),
+            'url': cls._url_cache.stats()
+        }
+    
     def _check_typosquatting(self, domain: str) -> str:
         """Check for typosquatting of legitimate domains"""
-        # Remove www. prefix
-        domain = domain.replace('www.', '')
-        
-        for legit_domain in self.LEGITIMATE_DOMAINS:
-            # Check for character substitution
-            if self._similar_domain(domain, legit_domain):
-                return legit_domain
-        
-        return None
-    
-    def _similar_domain(self, domain1: str, domain2: str) -> bool:
-        """Check if domains are suspiciously similar"""
-        # Remove TLD for comparison
-        d1 = domain1.split('.')[0] if '.' in domain1 else domain1
-        d2 = domain2.split('.')[0] if '.' in domain2 else domain2
-        
-        # Check if d1 contains d2 (e.g., paypa1.com contains paypal)
-        if d2 in d1 and d1 != d2:
-            return True
-        
-        # Check character substitution (l -> 1, o -> 0, etc.)
-        substitutions = {'l': '1', 'i': '1', 'o': '0', 'a': '@'}
-        for orig, sub in substitutions.items():
-            if d1.replace(sub, orig) == d2:
-                return True
-        
-        return False
+        return self._get_typosquat_index().lookup(self._hostname(domain))
     
     def get_url_details(self) -> List[Dict]:
         """Get detailed information about each URL"""
@@ -168,6 +250,7 @@ class URLAnalyzer:
             details.append({
                 'url': url,
                 'domain': parsed.netloc,
+                'registrable_domain': split_host(self._hostname(parsed.netloc.lower()))[1],
                 'scheme': parsed.scheme,
                 'path': parsed.path
             })
@@ -1,10 +1,8 @@
 import streamlit as st
-from utils.email_parser import EmailParser
-from analyzers.url_analyzer import URLAnalyzer
-from analyzers.content_analyzer import ContentAnalyzer
-from analyzers.sender_analyzer import SenderAnalyzer
-from analyzers.attachment_analyzer import AttachmentAnalyzer
-from utils.scoring import PhishingScorer
+from typing import Union
+from utils.pipeline import AnalysisPipeline
+from utils.result_cache import ResultCache
+from utils.samples import SAMPLE_EMAILS
 
 # Page configuration
 st.set_page_config(
@@ -328,7 +326,8 @@ PayPal Security Team"""
         else:
             uploaded_file = st.file_uploader("Choose an .eml file", type=['eml', 'txt'])
             if uploaded_file:
-                email_content = uploaded_file.read().decode('utf-8', errors='ignore')
+                # Hand the raw bytes to the parser so non-UTF-8 messages survive intact
+                email_content = uploaded_file.getvalue()
                 st.success("File uploaded successfully!")
         
         # Analyze button with icon
@@ -344,48 +343,22 @@ PayPal Security Team"""
     with tab3:
         show_learn_more()
 
-def analyze_email(email_content: str):
+@st.cache_resource
+def get_pipeline() -> AnalysisPipeline:
+    """Build the analysis pipeline once and reuse it across reruns"""
+    # Widget interactions rerun the script, so remember verdicts for messages already analyzed
+    return AnalysisPipeline(cache=ResultCache(max_size=256))
+
+def analyze_email(email_content: Union[str, bytes]):
     """Main email analysis function"""
     
     with st.spinner("🔄 Analyzing email... This may take a moment..."):
         try:
-            # Parse email
-            parser = EmailParser(email_content)
-            
-            # Extract components
-            sender_info = parser.get_sender()
-            subject = parser.get_subject()
-            body = parser.get_body()
-            urls = parser.extract_urls()
-            attachments = parser.get_attachments()
-            headers = parser.get_headers()
-            
-            # Run analyzers
-            url_analyzer = URLAnalyzer(urls)
-            url_analysis = url_analyzer.analyze()
-            
-            content_analyzer = ContentAnalyzer(subject, body['text'], body['html'])
-            content_analysis = content_analyzer.analyze()
-            
-            sender_analyzer = SenderAnalyzer(sender_info, headers.get('reply_to', ''))
-            sender_analysis = sender_analyzer.analyze()
-            
-            attachment_analyzer = AttachmentAnalyzer(attachments)
-            attachment_analysis = attachment_analyzer.analyze()
-            
-            # Calculate overall score
-            analysis_results = {
-                'url_analysis': url_analysis,
-                'content_analysis': content_analysis,
-                'sender_analysis': sender_analysis,
-                'attachment_analysis': attachment_analysis
-            }
-            
-            scorer = PhishingScorer()
-            overall_results = scorer.calculate_overall_score(analysis_results)
+            results = get_pipeline().analyze(email_content)
+            details = results['email']
             
             # Display results
-            display_results(overall_results, sender_info, subject, urls, attachments)
+            display_results(results, details['sender'], details['subject'], details['urls'], details['attachments'])
             
         except Exception as e:
             st.error(f"❌ Error analyzing email: {str(e)}")
@@ -562,59 +535,7 @@ def show_sample_emails():
     </div>
     """, unsafe_allow_html=True)
     
-    samples = {
-        "🚨 Critical - Obvious PayPal Scam": """From: security@paypal-verify.tk
-To: victim@email.com
-Subject: URGENT: Account Suspended - Verify Now!!!
-
-Dear Customer,
-
-Your PayPal account has been SUSPENDED due to unusual activity detected. You have 24 HOURS to verify your information or your account will be PERMANENTLY CLOSED.
-
-CLICK HERE IMMEDIATELY: http://bit.ly/paypal-verify-urgent
-
-You must provide:
-- Full Name
-- Password
-- Credit Card Number
-- SSN
-
-Failure to comply will result in account termination.
-
-PayPal Security Team
-DO NOT REPLY TO THIS EMAIL""",
-        
-        "⚠️ High Risk - Sophisticated Spear Phishing": """From: IT Support <it.support@gmail.com>
-To: employee@company.com
-Subject: Password Reset Required
-
-Hi,
-
-As part of our security upgrade, all employees must reset their passwords by end of day. Please click the link below to update your credentials:
-
-https://company-portal-secure.xyz/reset
-
-This is mandatory for all staff. Contact IT if you have issues.
-
-Best regards,
-IT Department""",
-        
-        "✅ Safe - Legitimate GitHub Notification": """From: notifications@github.com
-To: developer@email.com
-Subject: [GitHub] New pull request on your repository
-
-Hello,
-
-A new pull request has been opened on your repository "awesome-project":
-
-Pull Request #42: Fix authentication bug
-View on GitHub: https://github.com/user/awesome-project/pull/42
-
-Thanks,
-GitHub Team"""
-    }
-    
-    for title, content in samples.items():
+    for title, content in SAMPLE_EMAILS.items():
         with st.expander(title, expanded=False):
             st.code(content, language=None)
             col1, col2, col3 = st.columns([1, 2, 1])
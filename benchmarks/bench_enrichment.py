@@ -0,0 +1,163 @@
+"""Domain enrichment against local fake DNS and WHOIS servers: lookups per domain and wall time.
+
+Usage:
+    python -m benchmarks.bench_enrichment --domains 200 --batches 20 --threads 4 --latency-ms 50
+
+Both servers run on 127.0.0.1 in a thread of their own and answer after --latency-ms, so
+nothing leaves the machine. Batches drawn from a shared domain pool are enriched through
+enrich_blocking() from several threads at once; every domain should reach each server
+once, and every TLD should be referred once, however the batches overlap.
+"""
+import argparse
+import asyncio
+import json
+import random
+import struct
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from utils.dns_resolver import SystemResolver
+from utils.enrichment import DomainEnricher, WhoisClient
+
+TLDS = ['com', 'net', 'org', 'io', 'co.uk']
+
+# Query type codes served by the fake DNS server
+TYPE_A = 1
+TYPE_MX = 15
+
+DNS_HEADER = struct.Struct('!HHHHHH')
+QUESTION_TAIL = struct.Struct('!HH')
+ANSWER_HEAD = struct.Struct('!HHHIH')
+
+def _encode_name(name: str) -> bytes:
+    return b''.join(bytes([len(label)]) + label.encode('ascii') for label in name.split('.')) + b'\0'
+
+class FakeDNSServer(asyncio.DatagramProtocol):
+    """UDP DNS server answering MX and A queries for the domains it is given, NXDOMAIN otherwise"""
+
+    def __init__(self, domains: List[str], latency: float):
+        self.domains = set(domains)
+        self.latency = latency
+        self.queries: Counter = Counter()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, address):
+        query_id, _flags, _questions, _answers, _authority, _additional = DNS_HEADER.unpack_from(data)
+        position, labels = DNS_HEADER.size, []
+        while data[position]:
+            labels.append(data[position + 1:position + 1 + data[position]].decode('ascii'))
+            position += 1 + data[position]
+        qtype, _qclass = QUESTION_TAIL.unpack_from(data, position + 1)
+        question = data[DNS_HEADER.size:position + 1 + QUESTION_TAIL.size]
+        name = '.'.join(labels).lower()
+        self.queries[(name, qtype)] += 1
+
+        answers = []
+        if name in self.domains and qtype == TYPE_MX:
+            rdata = struct.pack('!H', 10) + _encode_name(f"mx.{name}")
+            answers.append(ANSWER_HEAD.pack(0xC00C, TYPE_MX, 1, 300, len(rdata)) + rdata)
+        elif name in self.domains and qtype == TYPE_A:
+            answers.append(ANSWER_HEAD.pack(0xC00C, TYPE_A, 1, 300, 4) + bytes([192, 0, 2, 1]))
+        flags = 0x8180 if name in self.domains else 0x8183
+        response = DNS_HEADER.pack(query_id, flags, 1, len(answers), 0, 0) + question + b''.join(answers)
+        asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, response, address)
+
+class FakeWhoisServer:
+    """WHOIS server acting as both IANA (referring every TLD back to itself) and the registry"""
+
+    def __init__(self, domains: List[str], latency: float):
+        self.created = {domain: f"20{10 + index % 15}-0{1 + index % 9}-1{index % 10}"
+                        for index, domain in enumerate(domains)}
+        self.latency = latency
+        self.queries: Counter = Counter()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        query = (await reader.readline()).decode('idna').strip().lower()
+        self.queries[query] += 1
+        await asyncio.sleep(self.latency)
+        if '.' not in query:
+            answer = f"domain: {query.upper()}\nrefer: 127.0.0.1\n"
+        elif query in self.created:
+            answer = f"Domain Name: {query.upper()}\nCreation Date: {self.created[query]}T00:00:00Z\n"
+        else:
+            answer = f"No match for \"{query.upper()}\".\n"
+        writer.write(answer.encode('utf-8'))
+        await writer.drain()
+        writer.close()
+
+def start_servers(domains: List[str], latency: float) -> Tuple[FakeDNSServer, FakeWhoisServer, int, int]:
+    """Start both servers on free loopback ports in a daemon thread; returns them and their ports"""
+    loop = asyncio.new_event_loop()
+    dns = FakeDNSServer(domains, latency)
+    whois = FakeWhoisServer(domains, latency)
+
+    async def start():
+        transport, _protocol = await loop.create_datagram_endpoint(lambda: dns, local_addr=('127.0.0.1', 0))
+        server = await asyncio.start_server(whois.handle, '127.0.0.1', 0)
+        return transport.get_extra_info('sockname')[1], server.sockets[0].getsockname()[1]
+
+    dns_port, whois_port = loop.run_until_complete(start())
+    threading.Thread(target=loop.run_forever, name='fake-servers', daemon=True).start()
+    return dns, whois, dns_port, whois_port
+
+def run(domain_count: int, batches: int, batch_size: int, threads: int, latency: float, seed: int) -> Dict:
+    rng = random.Random(seed)
+    domains = [f"site{index}.{TLDS[index % len(TLDS)]}" for index in range(domain_count)]
+    dns, whois, dns_port, whois_port = start_servers(domains, latency)
+
+    enricher = DomainEnricher(SystemResolver(nameservers=['127.0.0.1'], port=dns_port),
+                              WhoisClient(port=whois_port, iana_server='127.0.0.1'))
+    # URL hosts of several messages: subdomains of the same registrable domain collapse to one lookup
+    work = [[f"{rng.choice(['www.', 'login.', ''])}{rng.choice(domains)}" for _ in range(batch_size)]
+            for _ in range(batches)]
+
+    def worker(thread_batches: List[List[str]]):
+        for hosts in thread_batches:
+            enricher.enrich_blocking(hosts)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(work[index::threads],)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    enricher.close()
+
+    seen = {DomainEnricher.registrable(host) for hosts in work for host in hosts}
+    whois_domains = Counter({query: count for query, count in whois.queries.items() if '.' in query})
+    tld_referrals = Counter({query: count for query, count in whois.queries.items() if '.' not in query})
+    mx_queries = Counter({name: count for (name, qtype), count in dns.queries.items() if qtype == TYPE_MX})
+    return {
+        'distinct_domains': len(seen),
+        'seconds': round(elapsed, 3),
+        'whois_domain_queries': sum(whois_domains.values()),
+        'whois_referral_queries': sum(tld_referrals.values()),
+        'tlds': len({domain.rsplit('.', 1)[-1] for domain in seen}),
+        'dns_mx_queries': sum(mx_queries.values()),
+        'duplicate_lookups': sum(count - 1 for counter in (whois_domains, tld_referrals, mx_queries)
+                                 for count in counter.values()),
+        'coalesced': enricher.coalesced,
+    }
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Enrichment against local fake DNS and WHOIS servers")
+    arg_parser.add_argument('--domains', type=int, default=200, help="size of the shared domain pool")
+    arg_parser.add_argument('--batches', type=int, default=20)
+    arg_parser.add_argument('--batch-size', type=int, default=50, help="hosts per batch")
+    arg_parser.add_argument('--threads', type=int, default=4, help="threads calling enrich_blocking at once")
+    arg_parser.add_argument('--latency-ms', type=float, default=50, help="delay before each server answer")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    result = run(args.domains, args.batches, args.batch_size, args.threads, args.latency_ms / 1000, args.seed)
+    print(json.dumps(result, indent=2))
+    return 1 if result['duplicate_lookups'] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+"""Import-time report (python -X importtime) for the headless entry points.
+
+Usage:
+    python -m benchmarks.bench_imports [--module utils.pipeline] [--top 15] [--json]
+
+Runs each import in a fresh interpreter, so the numbers reflect a cold worker or CLI start.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+# Modules a worker or CLI process imports before it analyzes anything
+DEFAULT_MODULES = ['utils.pipeline', 'scan']
+
+# Dependencies that should only be loaded on the code paths that need them
+LAZY_DEPENDENCIES = ['bs4', 'email_validator', 'requests', 'streamlit']
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure(module: str) -> Dict:
+    """Import module in a fresh interpreter and parse the -X importtime output"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+
+    imports: List[Dict] = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us)
+        })
+
+    imported = {item['module'] for item in imports}
+    target = next((item for item in imports if item['module'] == module), None)
+
+    return {
+        'module': module,
+        'total_us': target['cumulative_us'] if target else None,
+        'imports': len(imports),
+        'lazy_dependencies_loaded': [name for name in LAZY_DEPENDENCIES if name in imported],
+        'slowest': sorted(imports, key=lambda item: item['cumulative_us'], reverse=True)
+    }
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Report cold import time of the headless entry points")
+    arg_parser.add_argument('--module', action='append', help="module to import (repeatable)")
+    arg_parser.add_argument('--top', type=int, default=15, help="number of slowest imports to list")
+    arg_parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = arg_parser.parse_args(argv)
+
+    reports = [measure(module) for module in args.module or DEFAULT_MODULES]
+    for report in reports:
+        report['slowest'] = report['slowest'][:args.top]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+
+    for report in reports:
+        print(f"{report['module']}: {report['total_us'] / 1000:.1f} ms cumulative, {report['imports']} modules")
+        loaded = report['lazy_dependencies_loaded']
+        print(f"  eagerly loaded heavy dependencies: {', '.join(loaded) if loaded else 'none'}")
+        for item in report['slowest']:
+            print(f"  {item['cumulative_us'] / 1000:8.1f} ms  {'  ' * item['depth']}{item['module']}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+"""Micro-benchmark: per-URL and per-body regex cost, inline patterns vs precompiled.
+
+Usage:
+    python -m benchmarks.bench_patterns [--number 2000] [--json]
+"""
+import argparse
+import json
+import re
+import timeit
+from typing import Dict
+
+from utils import patterns
+
+SAMPLE_URLS = [
+    'http://192.168.10.4/login.php',
+    'https://paypal-verify.tk/%61%63%63%6f%75%6e%74/update?id=%31%32%33',
+    'https://github.com/user/awesome-project/pull/42',
+    'http://bit.ly/paypal-verify-urgent',
+]
+
+SAMPLE_BODY = (
+    "Dear Customer,\n\nYour PayPal account has been SUSPENDED due to unusual activity!!! "
+    "CLICK HERE IMMEDIATELY: http://bit.ly/paypal-verify-urgent or visit "
+    "https://paypal-verify.tk/login?session=%61%62%63 to restore access.\n"
+) * 20
+
+SAMPLE_LOCAL_PARTS = ['security', 'john.smith', 'xkcd12345', '98231abc', 'it.support']
+
+def legacy_url_checks(url: str) -> bool:
+    """URL regex work as done before precompilation (IPv4 match plus two hex scans)"""
+    host = url.split('/')[2].split(':')[0]
+    is_ip = bool(re.match(r'^(\d{1,3}\.){3}\d{1,3}$', host))
+    heavy_encoding = False
+    if '%' in url and re.search(r'%[0-9A-Fa-f]{2}', url):
+        heavy_encoding = len(re.findall(r'%[0-9A-Fa-f]{2}', url)) > 3
+    return is_ip or heavy_encoding
+
+def compiled_url_checks(url: str) -> bool:
+    """The same checks with precompiled patterns and a single hex scan"""
+    host = url.split('/')[2].split(':')[0]
+    is_ip = bool(patterns.IPV4_ADDRESS.match(host))
+    heavy_encoding = '%' in url and len(patterns.HEX_ESCAPE.findall(url)) > 3
+    return is_ip or heavy_encoding
+
+def legacy_body_checks(body: str) -> tuple:
+    """Body regex work as done before precompilation"""
+    urls = re.findall(
+        r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
+        body
+    )
+    punctuation = bool(re.search(r'[!?]{2,}', body))
+    caps_word = bool(re.search(r'\b[A-Z]{5,}\b', body))
+    letters = re.findall(r'[a-zA-Z]', body)
+    caps_ratio = sum(1 for c in letters if c.isupper()) / len(letters)
+    return len(urls), punctuation, caps_word, caps_ratio
+
+def compiled_body_checks(body: str) -> tuple:
+    """The same checks with precompiled patterns"""
+    urls = patterns.TEXT_URL.findall(body)
+    punctuation = bool(patterns.EXCESSIVE_PUNCTUATION.search(body))
+    caps_word = bool(patterns.CAPS_WORD.search(body))
+    letter_count = len(patterns.ASCII_LETTER.findall(body))
+    caps_ratio = len(patterns.ASCII_UPPERCASE.findall(body)) / letter_count
+    return len(urls), punctuation, caps_word, caps_ratio
+
+def legacy_sender_checks(local: str) -> bool:
+    """Sender local-part checks as done before precompilation"""
+    return bool(re.search(r'[a-z]{2,}\d{4,}', local) or re.search(r'\d{4,}[a-z]{2,}', local))
+
+def compiled_sender_checks(local: str) -> bool:
+    """The same check as a single alternation"""
+    return bool(patterns.RANDOM_LOCAL_PART.search(local))
+
+def _per_call_us(func, items, number: int) -> float:
+    """Average microseconds per item"""
+    seconds = timeit.timeit(lambda: [func(item) for item in items], number=number)
+    return seconds / (number * len(items)) * 1e6
+
+def run(number: int = 2000) -> Dict:
+    """Time each check both ways and return per-call costs in microseconds"""
+    # Sanity check that both variants agree before timing them
+    for url in SAMPLE_URLS:
+        assert legacy_url_checks(url) == compiled_url_checks(url)
+    assert legacy_body_checks(SAMPLE_BODY) == compiled_body_checks(SAMPLE_BODY)
+    for local in SAMPLE_LOCAL_PARTS:
+        assert legacy_sender_checks(local) == compiled_sender_checks(local)
+
+    body_number = max(number // 20, 1)
+    results = {
+        'per_url': {
+            'before_us': _per_call_us(legacy_url_checks, SAMPLE_URLS, number),
+            'after_us': _per_call_us(compiled_url_checks, SAMPLE_URLS, number),
+        },
+        'per_body': {
+            'body_chars': len(SAMPLE_BODY),
+            'before_us': _per_call_us(legacy_body_checks, [SAMPLE_BODY], body_number),
+            'after_us': _per_call_us(compiled_body_checks, [SAMPLE_BODY], body_number),
+        },
+        'per_sender': {
+            'before_us': _per_call_us(legacy_sender_checks, SAMPLE_LOCAL_PARTS, number),
+            'after_us': _per_call_us(compiled_sender_checks, SAMPLE_LOCAL_PARTS, number),
+        },
+    }
+    for timing in results.values():
+        timing['speedup'] = round(timing['before_us'] / timing['after_us'], 2)
+    return results
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmark inline vs precompiled regex checks")
+    arg_parser.add_argument('--number', type=int, default=2000, help="timing iterations")
+    arg_parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = arg_parser.parse_args(argv)
+
+    results = run(args.number)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, timing in results.items():
+            print(f"{name:<12} before {timing['before_us']:9.2f} us   "
+                  f"after {timing['after_us']:9.2f} us   x{timing['speedup']}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,183 @@
+"""Per-stage throughput, latency and memory benchmark of the analysis pipeline.
+
+Usage:
+    python -m benchmarks.bench_pipeline --count 500 --seed 0 -o results.json
+    python -m benchmarks.bench_pipeline --count 500 --compare baseline.json
+
+Stages run one after another over the whole corpus (every message is parsed, then every
+message goes through URL analysis, and so on), so each stage's latency distribution and
+the growth of peak RSS after it can be attributed to that stage alone.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from analyzers.attachment_analyzer import AttachmentAnalyzer
+from analyzers.content_analyzer import ContentAnalyzer
+from analyzers.sender_analyzer import SenderAnalyzer
+from analyzers.url_analyzer import URLAnalyzer
+from benchmarks.corpus import CorpusSpec, generate
+from utils.pipeline import AnalysisPipeline
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ['parse', 'url', 'content', 'sender', 'attachment', 'score']
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process so far, in KiB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def git_commit() -> str:
+    """Current commit hash, if the benchmark runs inside a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _stage_functions(pipeline: AnalysisPipeline) -> Dict[str, Callable[[Dict], None]]:
+    """Each stage reads what earlier stages stored on the per-message state dict"""
+    def parse(state):
+        state['components'] = pipeline.extract(pipeline.parse(state['raw']))
+
+    def url(state):
+        state['url_analysis'] = URLAnalyzer(state['components']['urls']).analyze()
+
+    def content(state):
+        body = state['components']['body']
+        state['content_analysis'] = ContentAnalyzer(state['components']['subject'], body['text'], body['html']).analyze()
+
+    def sender(state):
+        components = state['components']
+        state['sender_analysis'] = SenderAnalyzer(components['sender'], components['headers'].get('reply_to', '')).analyze()
+
+    def attachment(state):
+        state['attachment_analysis'] = AttachmentAnalyzer(state['components']['attachments']).analyze()
+
+    def score(state):
+        pipeline.scorer.calculate_overall_score({
+            key: state[key] for key in ('url_analysis', 'content_analysis', 'sender_analysis', 'attachment_analysis')
+        })
+
+    return {'parse': parse, 'url': url, 'content': content, 'sender': sender, 'attachment': attachment, 'score': score}
+
+def run(spec: CorpusSpec, trace_memory: bool = False) -> Dict:
+    """Benchmark every stage over a generated corpus"""
+    messages = list(generate(spec))
+    states = [{'raw': raw} for raw in messages]
+    stage_functions = _stage_functions(AnalysisPipeline())
+
+    # Start from cold per-process caches so runs are comparable
+    URLAnalyzer._host_cache.clear()
+    URLAnalyzer._url_cache.clear()
+
+    stages = {}
+    total_seconds = 0.0
+    for stage in STAGES:
+        func = stage_functions[stage]
+        if trace_memory:
+            tracemalloc.start()
+
+        latencies = []
+        for state in states:
+            started = time.perf_counter()
+            func(state)
+            latencies.append(time.perf_counter() - started)
+
+        traced_peak_kb = None
+        if trace_memory:
+            traced_peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+
+        stage_seconds = sum(latencies)
+        total_seconds += stage_seconds
+        latencies.sort()
+        stages[stage] = {
+            'seconds': round(stage_seconds, 6),
+            'messages_per_sec': round(len(states) / stage_seconds, 1) if stage_seconds else None,
+            'mean_ms': round(stage_seconds / len(states) * 1000, 4),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 4),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+            'max_ms': round(latencies[-1] * 1000, 4),
+            'peak_rss_kb': peak_rss_kb(),
+            'traced_peak_kb': traced_peak_kb
+        }
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'trace_memory': trace_memory
+        },
+        'corpus': dict(spec.to_dict(), bytes=sum(len(raw) for raw in messages)),
+        'total': {
+            'messages': len(states),
+            'seconds': round(total_seconds, 6),
+            'messages_per_sec': round(len(states) / total_seconds, 1) if total_seconds else None,
+            'peak_rss_kb': peak_rss_kb()
+        },
+        'stages': stages
+    }
+
+def compare(baseline: Dict, current: Dict) -> str:
+    """Render a per-stage comparison of two result files"""
+    lines = [f"{'stage':<12}{'base p50':>11}{'new p50':>11}{'base p99':>11}{'new p99':>11}{'msg/s x':>10}"]
+    for stage in STAGES:
+        old = baseline['stages'].get(stage)
+        new = current['stages'].get(stage)
+        if not old or not new:
+            continue
+        ratio = (new['messages_per_sec'] / old['messages_per_sec']) if old['messages_per_sec'] else float('nan')
+        lines.append(f"{stage:<12}{old['p50_ms']:>11.3f}{new['p50_ms']:>11.3f}"
+                     f"{old['p99_ms']:>11.3f}{new['p99_ms']:>11.3f}{ratio:>10.2f}")
+    return '\n'.join(lines)
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmark each analysis stage over a synthetic corpus")
+    arg_parser.add_argument('--count', type=int, default=500)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--attachment-kb', type=lambda v: [int(x) for x in v.split(',')], default=None)
+    arg_parser.add_argument('--trace-memory', action='store_true', help="record tracemalloc peaks per stage (slower)")
+    arg_parser.add_argument('-o', '--output', help="write JSON results to this file")
+    arg_parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = arg_parser.parse_args(argv)
+
+    results = run(CorpusSpec(count=args.count, seed=args.seed, attachment_kb=args.attachment_kb), args.trace_memory)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(json.load(f), results), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
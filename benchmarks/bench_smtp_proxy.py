@@ -0,0 +1,123 @@
+"""End-to-end run of smtp_proxy.py between a local client and a local sink SMTP server.
+
+Usage:
+    python -m benchmarks.bench_smtp_proxy --count 200 --connections 8 --workers 2
+    python -m benchmarks.bench_smtp_proxy --count 200 --connections 32 --workers 1 --max-pending 2
+
+Messages from the synthetic corpus, each carrying a forged X-Phish-Level header, are sent
+through the proxy over several connections at once and collected by an aiosmtpd sink.
+Reports accepted (250) and deferred (451) messages, per-message latency and throughput,
+and checks that every relayed message reached the sink once with one fresh verdict.
+"""
+import argparse
+import json
+import smtplib
+import socket
+import threading
+import time
+from email import message_from_bytes
+from typing import Dict, List
+
+from aiosmtpd.controller import Controller
+
+from benchmarks.corpus import CorpusSpec, generate
+from smtp_proxy import SMTPProxy
+
+FORGED_HEADER = b'X-Phish-Level: SAFE\r\n'
+
+class SinkHandler:
+    """Downstream MTA stand-in that keeps every message it is given"""
+
+    def __init__(self):
+        self.messages: List[bytes] = []
+        self._lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope) -> str:
+        with self._lock:
+            self.messages.append(envelope.original_content or envelope.content)
+        return '250 OK'
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def run(count: int, connections: int, workers: int, deadline: float, max_pending: int, seed: int) -> Dict:
+    messages = [FORGED_HEADER + raw.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+                for raw in generate(CorpusSpec(count=count, seed=seed))]
+
+    sink = SinkHandler()
+    sink_controller = Controller(sink, hostname='127.0.0.1', port=free_port())
+    sink_controller.start()
+    proxy = SMTPProxy('127.0.0.1', free_port(), '127.0.0.1', sink_controller.port,
+                      workers=workers, deadline=deadline, max_pending=max_pending)
+    proxy.start()
+
+    codes: List[int] = []
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def send(batch: List[bytes]):
+        with smtplib.SMTP('127.0.0.1', proxy.listen_port, timeout=60) as client:
+            for raw in batch:
+                started = time.perf_counter()
+                try:
+                    client.sendmail('sender@example.com', ['rcpt@example.org'], raw)
+                    code = 250
+                except smtplib.SMTPDataError as e:
+                    code = e.smtp_code
+                with lock:
+                    codes.append(code)
+                    latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    senders = [threading.Thread(target=send, args=(messages[index::connections],)) for index in range(connections)]
+    for thread in senders:
+        thread.start()
+    for thread in senders:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    proxy.stop()
+    sink_controller.stop()
+
+    verdicts_ok = 0
+    for raw in sink.messages:
+        levels = message_from_bytes(raw).get_all('X-Phish-Level') or []
+        if len(levels) == 1 and raw.startswith((b'X-Phish-Score:', b'X-Phish-Level:')):
+            verdicts_ok += 1
+    accepted = codes.count(250)
+    return {
+        'sent': len(codes),
+        'accepted': accepted,
+        'deferred_451': sum(1 for code in codes if code == 451),
+        'relayed_to_sink': len(sink.messages),
+        'fresh_verdicts': verdicts_ok,
+        'unscored': proxy.handler.stats['unscored'],
+        'msgs_per_sec': round(len(codes) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'ok': len(sink.messages) == accepted == verdicts_ok,
+    }
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="End-to-end SMTP proxy run against a local sink")
+    arg_parser.add_argument('--count', type=int, default=200)
+    arg_parser.add_argument('--connections', type=int, default=8, help="client connections sending at once")
+    arg_parser.add_argument('-w', '--workers', type=int, default=2)
+    arg_parser.add_argument('--deadline', type=float, default=5.0)
+    arg_parser.add_argument('--max-pending', type=int, help="as smtp_proxy.py --max-pending")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    result = run(args.count, args.connections, args.workers, args.deadline, args.max_pending, args.seed)
+    print(json.dumps(result, indent=2))
+    return 0 if result['ok'] else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,173 @@
+"""Reproducible synthetic phishing corpus built from the app's sample emails.
+
+Usage:
+    python -m benchmarks.corpus --count 1000 --seed 7 --format mbox -o corpus.mbox
+    python -m benchmarks.corpus --count 200 --attachment-kb 512 --format eml -o corpus/
+"""
+import argparse
+import email
+import mailbox
+import os
+import random
+import time
+from email import policy
+from email.message import EmailMessage
+from typing import Dict, Iterator, List
+
+from utils.samples import SAMPLE_EMAILS
+
+# Charsets and filler text that can be encoded in them
+CHARSET_FILLER = {
+    'utf-8': "Please review the attached statement. Grüße, 感谢您的耐心 — the team.",
+    'iso-8859-1': "Veuillez vérifier votre compte. Merci de votre confiance, à bientôt.",
+    'windows-1252': "Please review the “updated” terms – your account is at risk…",
+    'koi8-r': "Пожалуйста, подтвердите вашу учетную запись немедленно.",
+    'shift_jis': "アカウントを確認してください。至急ご対応ください。",
+}
+
+URL_HOSTS = [
+    'paypal-verify.tk', 'bit.ly', 'secure-login.xyz', 'github.com', 'amazom.com',
+    '192.168.10.4', 'accounts.google.com', 'update-billing.top', 'microsoft.com', 'tinyurl.com'
+]
+
+ATTACHMENT_TYPES = [
+    ('invoice.pdf', 'application', 'pdf'),
+    ('statement.pdf.exe', 'application', 'octet-stream'),
+    ('report.docm', 'application', 'vnd.ms-word.document.macroEnabled.12'),
+    ('archive.zip', 'application', 'zip'),
+    ('photo.jpg', 'image', 'jpeg'),
+]
+
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie']
+
+class CorpusSpec:
+    """Knobs for generating a corpus; the same spec and seed always yield the same bytes"""
+    
+    def __init__(self, count: int = 1000, seed: int = 0, body_repeat: List[int] = None,
+                 html_ratio: float = 0.5, urls_per_message: List[int] = None,
+                 attachment_ratio: float = 0.3, attachment_kb: List[int] = None,
+                 charsets: List[str] = None):
+        self.count = count
+        self.seed = seed
+        self.body_repeat = body_repeat or [1, 4, 16]
+        self.html_ratio = html_ratio
+        self.urls_per_message = urls_per_message or [0, 1, 5, 20]
+        self.attachment_ratio = attachment_ratio
+        self.attachment_kb = attachment_kb or [4, 64]
+        self.charsets = charsets or list(CHARSET_FILLER)
+    
+    def to_dict(self) -> Dict:
+        """Describe the spec for benchmark reports"""
+        return dict(vars(self))
+
+def _templates() -> List[EmailMessage]:
+    """Parse the sample emails into message templates"""
+    return [email.message_from_string(sample, policy=policy.default) for sample in SAMPLE_EMAILS.values()]
+
+def _build_message(template: EmailMessage, rng: random.Random, spec: CorpusSpec, index: int) -> EmailMessage:
+    """Derive one synthetic message from a template"""
+    charset = rng.choice(spec.charsets)
+    recipient = rng.choice(FIRST_NAMES)
+
+    urls = [
+        f"http{'s' if rng.random() < 0.5 else ''}://{rng.choice(URL_HOSTS)}/{rng.getrandbits(32):08x}"
+        f"?u={recipient.lower()}&t={rng.getrandbits(24):06x}"
+        for _ in range(rng.choice(spec.urls_per_message))
+    ]
+
+    body = template.get_content()
+    body = body.replace('Dear Customer', f'Dear {recipient}').replace('Hi,', f'Hi {recipient},')
+    paragraphs = [body] + [CHARSET_FILLER[charset]] * rng.choice(spec.body_repeat)
+    text = '\n\n'.join(paragraphs + urls) + '\n'
+
+    message = EmailMessage()
+    for header in ('From', 'To', 'Subject'):
+        message[header] = template[header]
+    message['Message-ID'] = f'<synthetic-{spec.seed}-{index}@corpus.invalid>'
+    message.set_content(text, charset=charset)
+
+    if rng.random() < spec.html_ratio:
+        links = ''.join(f'<p><a href="{url}">Click here</a></p>' for url in urls)
+        html = '<html><body>' + ''.join(f'<p>{p}</p>' for p in paragraphs) + links + '</body></html>'
+        message.add_alternative(html, subtype='html', charset=charset)
+
+    if rng.random() < spec.attachment_ratio:
+        filename, maintype, subtype = rng.choice(ATTACHMENT_TYPES)
+        size = rng.choice(spec.attachment_kb) * 1024
+        payload = rng.getrandbits(size * 8).to_bytes(size, 'little')
+        message.add_attachment(payload, maintype=maintype, subtype=subtype, filename=filename)
+
+    # Fixed boundaries keep the output byte-for-byte reproducible
+    for part_index, part in enumerate(message.walk()):
+        if part.is_multipart():
+            part.set_boundary(f'=_synthetic_{index}_{part_index}_{rng.getrandbits(32):08x}')
+
+    return message
+
+def generate(spec: CorpusSpec) -> Iterator[bytes]:
+    """Yield the raw bytes of every message in the corpus"""
+    rng = random.Random(spec.seed)
+    templates = _templates()
+    for index in range(spec.count):
+        yield _build_message(rng.choice(templates), rng, spec, index).as_bytes()
+
+def write_mbox(spec: CorpusSpec, path: str) -> int:
+    """Write the corpus to an mbox file"""
+    box = mailbox.mbox(path, create=True)
+    box.lock()
+    try:
+        count = 0
+        for raw in generate(spec):
+            message = mailbox.mboxMessage(raw)
+            # Fixed envelope date so the file is reproducible
+            message.set_from('corpus@synthetic.invalid', time.gmtime(0))
+            box.add(message)
+            count += 1
+        box.flush()
+    finally:
+        box.unlock()
+        box.close()
+    return count
+
+def write_eml_directory(spec: CorpusSpec, path: str) -> int:
+    """Write the corpus as one .eml file per message"""
+    os.makedirs(path, exist_ok=True)
+    count = 0
+    for raw in generate(spec):
+        with open(os.path.join(path, f'{count:07d}.eml'), 'wb') as f:
+            f.write(raw)
+        count += 1
+    return count
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(',')]
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Generate a synthetic phishing corpus")
+    arg_parser.add_argument('-o', '--output', required=True, help="mbox file or .eml directory to write")
+    arg_parser.add_argument('--format', choices=['mbox', 'eml'], default='mbox')
+    arg_parser.add_argument('--count', type=int, default=1000)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--body-repeat', type=_int_list, default=[1, 4, 16], help="comma-separated filler paragraph counts")
+    arg_parser.add_argument('--urls', type=_int_list, default=[0, 1, 5, 20], help="comma-separated URL counts")
+    arg_parser.add_argument('--html-ratio', type=float, default=0.5)
+    arg_parser.add_argument('--attachment-ratio', type=float, default=0.3)
+    arg_parser.add_argument('--attachment-kb', type=_int_list, default=[4, 64], help="comma-separated attachment sizes")
+    arg_parser.add_argument('--charsets', default=','.join(CHARSET_FILLER), help="comma-separated body charsets")
+    args = arg_parser.parse_args(argv)
+
+    spec = CorpusSpec(
+        count=args.count, seed=args.seed, body_repeat=args.body_repeat, html_ratio=args.html_ratio,
+        urls_per_message=args.urls, attachment_ratio=args.attachment_ratio,
+        attachment_kb=args.attachment_kb, charsets=args.charsets.split(',')
+    )
+
+    if args.format == 'mbox':
+        count = write_mbox(spec, args.output)
+    else:
+        count = write_eml_directory(spec, args.output)
+    print(f"Wrote {count} messages to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
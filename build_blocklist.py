@@ -0,0 +1,53 @@
+"""Build a Bloom-filter blocklist file for URLAnalyzer from feeds of known-bad domains and URLs,
+or a hash blocklist for AttachmentAnalyzer from feeds of known-bad attachment SHA-256s.
+
+Usage:
+    python build_blocklist.py -o blocklist.bin --domains bad_domains.txt --urls bad_urls.txt
+    python build_blocklist.py -o malware.bin --hashes malware_sha256.txt
+"""
+import argparse
+import sys
+from typing import Iterator, List
+
+from utils.blocklist import Blocklist
+from utils.hash_blocklist import HashBlocklist, parse_sha256
+
+def iter_lines(paths: List[str], hosts_format: bool = False) -> Iterator[str]:
+    """Yield entries from feed files, skipping blank lines and lines starting with #"""
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                # Hosts-file feeds list '0.0.0.0 example.com'
+                yield line.split()[-1] if hosts_format else line
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Build a memory-mapped blocklist of known-bad domains and URLs")
+    arg_parser.add_argument('-o', '--output', required=True, help="blocklist file to write")
+    arg_parser.add_argument('--domains', nargs='*', default=[], help="files of domains (one per line or hosts-file format)")
+    arg_parser.add_argument('--urls', nargs='*', default=[], help="files of URLs (one per line)")
+    arg_parser.add_argument('--fp-rate', type=float, default=0.001, help="Bloom filter false-positive rate")
+    arg_parser.add_argument('--hashes', nargs='*', default=[],
+                            help="files of attachment SHA-256s (hex, one per line or sha256sum output); "
+                                 "writes a hash blocklist instead")
+    args = arg_parser.parse_args(argv)
+    if args.hashes and (args.domains or args.urls):
+        arg_parser.error("--hashes builds a separate hash blocklist and cannot be combined with --domains or --urls")
+
+    if args.hashes:
+        try:
+            count = HashBlocklist.build(args.output, (parse_sha256(line) for line in iter_lines(args.hashes)))
+        except ValueError as e:
+            arg_parser.error(str(e))
+        print(f"Wrote {count} hashes to {args.output}", file=sys.stderr)
+        return 0
+
+    count = Blocklist.build(args.output, iter_lines(args.domains, hosts_format=True), iter_lines(args.urls),
+                            false_positive_rate=args.fp_rate)
+    print(f"Wrote {count} entries to {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
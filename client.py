@@ -0,0 +1,161 @@
+"""Command-line and Python client for the HTTP scoring service in server.py.
+
+Usage:
+    python client.py message.eml                          # score one message
+    python client.py a.eml b.eml c.eml --batch            # score several in one request
+    python client.py --health
+    python client.py message.eml --serve --workers 2      # start a local server, score, stop it
+
+Only the standard library is used, so the service can be exercised fully offline: --serve
+runs server.ScoringServer on a free loopback port for the duration of the call.
+"""
+import argparse
+import asyncio
+import base64
+import http.client
+import json
+import sys
+import threading
+from typing import Dict, List, Optional
+
+class ScoringError(Exception):
+    """A non-2xx answer from the scoring service"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[str] = None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+class ScoringClient:
+    """Keep-alive HTTP client for /score, /score/batch and /health"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8080, timeout: float = 60.0):
+        self.host = host
+        self.port = port
+        self._connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method: str, path: str, body: bytes = None, content_type: str = None) -> Dict:
+        headers = {'Content-Type': content_type} if content_type else {}
+        try:
+            self._connection.request(method, path, body=body, headers=headers)
+            response = self._connection.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # The server closed an idle keep-alive connection; retry once on a new one
+            self._connection.close()
+            self._connection.request(method, path, body=body, headers=headers)
+            response = self._connection.getresponse()
+        payload = json.loads(response.read() or b'{}')
+        if response.will_close:
+            self._connection.close()
+        if response.status >= 300:
+            raise ScoringError(response.status, payload.get('error', response.reason),
+                               response.getheader('Retry-After'))
+        return payload
+
+    def score(self, raw: bytes) -> Dict:
+        return self._request('POST', '/score', raw, 'message/rfc822')
+
+    def score_batch(self, messages: List[bytes]) -> List[Dict]:
+        body = json.dumps({'messages': [base64.b64encode(raw).decode('ascii') for raw in messages]})
+        return self._request('POST', '/score/batch', body.encode('utf-8'), 'application/json')['results']
+
+    def health(self) -> Dict:
+        return self._request('GET', '/health')
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self) -> 'ScoringClient':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class LocalServer:
+    """server.ScoringServer on a free loopback port, run in a background thread.
+
+    with LocalServer(workers=2) as (host, port):
+        with ScoringClient(host, port) as client:
+            client.score(raw)
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        from server import ScoringServer  # Pulls in the analysis pipeline only when serving locally
+
+        started = threading.Event()
+        failure = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = ScoringServer('127.0.0.1', 0, **self.options)
+            try:
+                self._loop.run_until_complete(self._server.start())
+            except Exception as e:
+                failure.append(e)
+                return
+            finally:
+                started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._server.close())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        if failure:
+            raise failure[0]
+        return self._server.host, self._server.port
+
+    def __exit__(self, *exc_info):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Score messages with the HTTP scoring service")
+    arg_parser.add_argument('messages', nargs='*', help="raw message files (.eml)")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('--batch', action='store_true', help="send all messages in one /score/batch request")
+    arg_parser.add_argument('--health', action='store_true', help="print /health")
+    arg_parser.add_argument('--serve', action='store_true', help="start a local server on a free port for this call")
+    arg_parser.add_argument('-w', '--workers', type=int, default=1, help="worker processes for --serve")
+    args = arg_parser.parse_args(argv)
+    if not args.messages and not args.health:
+        arg_parser.error("give message files or --health")
+
+    raw_messages = []
+    for path in args.messages:
+        with open(path, 'rb') as f:
+            raw_messages.append(f.read())
+
+    def run(host: str, port: int) -> int:
+        with ScoringClient(host, port) as client:
+            try:
+                if args.health:
+                    print(json.dumps(client.health()))
+                if args.batch:
+                    results = client.score_batch(raw_messages)
+                else:
+                    results = [client.score(raw) for raw in raw_messages]
+            except ScoringError as e:
+                print(f"Scoring failed with {e}", file=sys.stderr)
+                return 1
+        for path, result in zip(args.messages, results):
+            print(json.dumps({'path': path, **result}, default=str))
+        return 0
+
+    if args.serve:
+        with LocalServer(workers=args.workers) as (host, port):
+            return run(host, port)
+    return run(args.host, args.port)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Batch scanner: analyze every message in an mbox, Maildir or .eml directory.
+
+Usage:
+    python scan.py quarantine.mbox --workers 8 --chunk-size 64 -o results.jsonl
+"""
+import argparse
+import mailbox
+import os
+import sys
+import time
+from multiprocessing import Pool
+from itertools import islice
+from typing import AbstractSet, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils import worker
+from utils.checkpoint import Checkpoint
+from utils.mbox_reader import MboxReader
+from utils.result_writer import JSONLWriter, open_writer
+
+# Longest time between checkpoints, however slowly messages are scored
+CHECKPOINT_INTERVAL = 30
+
+# Open mbox files per process; a reader opened before the pool forks is shared with its workers
+_mbox_readers: Dict[str, MboxReader] = {}
+
+def _open_mbox(path: str) -> MboxReader:
+    reader = _mbox_readers.get(path)
+    if reader is None:
+        reader = _mbox_readers[path] = MboxReader(path)
+    return reader
+
+def _analyze_message(item: Tuple[str, bytes]) -> Dict:
+    """Analyze one (message id, raw bytes) pair inside a worker"""
+    message_id, raw = item
+    try:
+        result = worker.analyze(raw)
+        return {'id': message_id, **result}
+    except Exception as e:
+        return {'id': message_id, 'error': str(e)}
+
+def _analyze_chunk(items: List[Tuple[str, bytes]]) -> List[Dict]:
+    """Analyze a chunk of messages together, so domains are enriched once per chunk"""
+    results = worker.analyze_batch([raw for _message_id, raw in items])
+    return [{'id': message_id, **result} for (message_id, _raw), result in zip(items, results)]
+
+def _analyze_mbox_messages(task: Tuple[str, Sequence[int], bool]) -> List[Dict]:
+    """Analyze the given messages of an mbox, read straight from the worker's own mapping"""
+    path, numbers, batch = task
+    reader = _open_mbox(path)
+    items = [(str(number), reader[number]) for number in numbers]
+    if batch:
+        return _analyze_chunk(items)
+    return [_analyze_message(item) for item in items]
+
+def _chunks(items: Iterator, size: int) -> Iterator[List]:
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_messages(path: str, done: AbstractSet[str] = frozenset()) -> Iterator[Tuple[str, bytes]]:
+    """Yield (message id, raw bytes) for every message found at path whose key is not in done.
+
+    Keys are the message ids for Maildirs and .eml directories, and the From_ line byte
+    offsets (see mbox_key) for mbox files, whose ids are message numbers.
+    """
+    if os.path.isdir(path):
+        if all(os.path.isdir(os.path.join(path, sub)) for sub in ('cur', 'new', 'tmp')):
+            yield from _iter_mailbox(mailbox.Maildir(path, create=False), done)
+        else:
+            yield from _iter_eml_directory(path, done)
+    else:
+        reader = _open_mbox(path)
+        for number in _pending_mbox_messages(reader, done):
+            yield str(number), reader[number].tobytes()
+
+def mbox_key(reader: MboxReader, message_id: str) -> str:
+    """Checkpoint key of an mbox message: where its From_ line starts, which appending keeps in place"""
+    return str(reader.offsets[int(message_id)])
+
+def _pending_mbox_messages(reader: MboxReader, done: AbstractSet[str]) -> Sequence[int]:
+    if not done:
+        return range(len(reader))
+    return [number for number, offset in enumerate(reader.offsets) if str(offset) not in done]
+
+def _iter_mailbox(box: mailbox.Mailbox, done: AbstractSet[str] = frozenset()) -> Iterator[Tuple[str, bytes]]:
+    """Yield raw messages from a Maildir"""
+    try:
+        keys = box.keys()
+        if isinstance(box, mailbox.Maildir):
+            # Maildir keys come back in directory order, sort them for stable output
+            keys = sorted(keys)
+        for key in keys:
+            # Scored messages are never read
+            if str(key) not in done:
+                yield str(key), box.get_bytes(key)
+    finally:
+        box.close()
+
+def _iter_eml_directory(path: str, done: AbstractSet[str] = frozenset()) -> Iterator[Tuple[str, bytes]]:
+    """Yield raw messages from every .eml file below a directory"""
+    for file_path in _eml_paths(path):
+        message_id = os.path.relpath(file_path, path)
+        # Scored files are never opened
+        if message_id not in done:
+            with open(file_path, 'rb') as f:
+                yield message_id, f.read()
+
+def _eml_paths(path: str) -> Iterator[str]:
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith('.eml'):
+                yield os.path.join(root, name)
+
+def scan(path: str, output, workers: int = None, chunk_size: int = 16, brand_domains: str = None,
+         cache_path: str = None, verify_auth: bool = False, zone_file: str = None, enrich: bool = False,
+         enrich_cache: str = None, shorteners: str = None, free_providers: str = None,
+         blocklist: str = None, checkpoint: Checkpoint = None, checkpoint_every: int = 500,
+         done: AbstractSet[str] = frozenset(), hash_blocklist: str = None, fuzzy_hashes: bool = False) -> int:
+    """Analyze every message at path whose key is not in done and write one result per message.
+
+    output is a text stream or a writer from utils.result_writer. With a checkpoint, every
+    scored key is recorded, and the output is synced and progress saved every
+    checkpoint_every messages (or CHECKPOINT_INTERVAL seconds) and once more at the end.
+    Returns the messages scanned.
+    """
+    if not hasattr(output, 'sync'):
+        output = JSONLWriter(stream=output)
+
+    count = 0
+    initargs = (brand_domains, cache_path, verify_auth, zone_file, enrich, enrich_cache, shorteners, free_providers,
+                blocklist, hash_blocklist, fuzzy_hashes)
+    is_mbox = not os.path.isdir(path)
+    if is_mbox:
+        # Index (or load the saved index) once, before the workers fork
+        reader = _open_mbox(path)
+
+    def save_progress(last_id):
+        offset = output.sync()
+        if checkpoint is not None:
+            state = {'source': os.path.abspath(path), 'done': len(done) + count, 'last_id': last_id,
+                     'output_offset': offset}
+            if is_mbox:
+                state['source_size'] = reader.size
+            checkpoint.save(state)
+
+    with Pool(processes=workers, initializer=worker.init_worker, initargs=initargs) as pool:
+        # imap keeps results in input order regardless of which worker finishes first
+        if is_mbox:
+            # Workers get message numbers, not bytes, and slice the messages out of the mapped file
+            pending = _pending_mbox_messages(reader, done)
+            tasks = [(path, pending[first:first + chunk_size], enrich) for first in range(0, len(pending), chunk_size)]
+            results = (result for chunk in pool.imap(_analyze_mbox_messages, tasks) for result in chunk)
+        elif enrich:
+            # Whole chunks go to analyze_batch so their domains are looked up together
+            results = (result for chunk in pool.imap(_analyze_chunk, _chunks(iter_messages(path, done), chunk_size))
+                       for result in chunk)
+        else:
+            results = pool.imap(_analyze_message, iter_messages(path, done), chunksize=chunk_size)
+
+        last_id = None
+        saved_count, saved_at = 0, time.monotonic()
+        for result in results:
+            output.write(result)
+            count += 1
+            last_id = result['id']
+            if checkpoint is not None:
+                checkpoint.record(mbox_key(reader, last_id) if is_mbox else last_id)
+            if checkpoint is not None and (count - saved_count >= checkpoint_every
+                                           or time.monotonic() - saved_at >= CHECKPOINT_INTERVAL):
+                save_progress(last_id)
+                saved_count, saved_at = count, time.monotonic()
+        if checkpoint is None or count > saved_count:
+            save_progress(last_id)
+    return count
+
+def resume_point(checkpoint: Checkpoint, path: str) -> Tuple[AbstractSet[str], Optional[int]]:
+    """(keys of the messages already scanned, JSONL offset to truncate to) from an earlier run's checkpoint"""
+    state = checkpoint.load()
+    if state is not None:
+        if state['source'] != os.path.abspath(path):
+            raise ValueError(f"Checkpoint {checkpoint.path} belongs to a scan of {state['source']}")
+        # mbox keys are byte offsets, which only appending leaves valid
+        if 'source_size' in state and os.path.getsize(path) < state['source_size']:
+            raise ValueError(f"{path} has shrunk since checkpoint {checkpoint.path}, so its message offsets moved")
+    done = checkpoint.start(state)
+    return done, state['output_offset'] if state else None
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Scan an mbox, Maildir or directory of .eml files for phishing")
+    arg_parser.add_argument('path', help="mbox file, Maildir or directory of .eml files")
+    arg_parser.add_argument('-o', '--output', help="output file: SQLite for .db/.sqlite, JSON lines otherwise (default: stdout)")
+    arg_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="number of worker processes")
+    arg_parser.add_argument('-c', '--chunk-size', type=int, default=16, help="messages handed to a worker at a time")
+    arg_parser.add_argument('--brand-domains', help="file of brand domains (one per line) to protect against typosquatting")
+    arg_parser.add_argument('--cache', help="SQLite file that keeps verdicts across runs for identical messages")
+    arg_parser.add_argument('--verify-auth', action='store_true', help="check SPF, DKIM and DMARC using DNS")
+    arg_parser.add_argument('--zone-file', help="answer SPF/DKIM/DMARC lookups from this zone file instead of DNS")
+    arg_parser.add_argument('--enrich', action='store_true', help="check domain age (WHOIS) and MX records of URL and sender domains")
+    arg_parser.add_argument('--enrich-cache', help="SQLite file that keeps domain lookups across runs")
+    arg_parser.add_argument('--shorteners', help="file of URL shortener domains (one per line) to add to the built-in list")
+    arg_parser.add_argument('--free-providers', help="file of free or disposable email domains (one per line) to add to the built-in list")
+    arg_parser.add_argument('--blocklist', help="blocklist of known-bad URLs and domains built with build_blocklist.py")
+    arg_parser.add_argument('--hash-blocklist', help="blocklist of known-bad attachment SHA-256s built with build_blocklist.py --hashes")
+    arg_parser.add_argument('--fuzzy-hashes', action='store_true', help="add ssdeep and TLSH hashes (where installed) to attachments")
+    arg_parser.add_argument('--checkpoint', help="progress file; an interrupted scan rerun with the same file continues where it stopped")
+    arg_parser.add_argument('--checkpoint-every', type=int, default=500, help="messages between checkpoints")
+    args = arg_parser.parse_args(argv)
+    if args.checkpoint and not args.output:
+        arg_parser.error("--checkpoint needs --output, which a resumed run appends to")
+
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    done, resume_at = resume_point(checkpoint, args.path) if checkpoint else (frozenset(), None)
+    output = open_writer(args.output, resume_at=resume_at) if args.output else sys.stdout
+    try:
+        count = scan(args.path, output, args.workers, args.chunk_size, args.brand_domains, args.cache,
+                     args.verify_auth, args.zone_file, args.enrich, args.enrich_cache,
+                     args.shorteners, args.free_providers, args.blocklist, checkpoint, args.checkpoint_every, done,
+                     args.hash_blocklist, args.fuzzy_hashes)
+    finally:
+        if args.output:
+            output.close()
+        if checkpoint:
+            checkpoint.close()
+
+    if done:
+        print(f"Resumed after {len(done)} messages", file=sys.stderr)
+    print(f"Scanned {count} messages", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
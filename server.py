@@ -0,0 +1,314 @@
+"""HTTP scoring service: POST raw RFC 822 messages, get the PhishingScorer verdict as JSON.
+
+Usage:
+    python server.py --host 127.0.0.1 --port 8080 --workers 4
+
+Endpoints:
+    POST /score          body is one raw message (message/rfc822 bytes)
+    POST /score/batch    body is JSON {"messages": ["<base64 raw message>", ...]}
+    GET  /health         liveness and load information
+
+Analysis runs in a pre-warmed process pool, so the event loop only moves bytes around.
+When more messages are in flight than --max-in-flight allows, requests get 429 with Retry-After.
+A batch can never be larger than --max-in-flight, so every accepted batch can eventually run.
+If a worker process dies, the pool is rebuilt and the affected requests get 503.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+
+from utils import worker
+
+class HTTPError(Exception):
+    """An error that maps directly onto an HTTP response"""
+
+    def __init__(self, status: HTTPStatus, message: str, headers: Dict[str, str] = None, close: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+        self.close = close
+
+class ScoringServer:
+    """Minimal asyncio HTTP/1.1 server in front of a process pool of analysis pipelines"""
+
+    MAX_HEADER_BYTES = 64 * 1024
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8080, workers: int = None,
+                 max_body_bytes: int = 25 * 1024 * 1024, max_batch: int = 100,
+                 max_in_flight: int = None, batch_chunk_size: int = 8):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_body_bytes = max_body_bytes
+        self.max_in_flight = max_in_flight or self.workers * 4
+        # A batch bigger than the in-flight limit would get 429 forever, even on an idle server
+        self.max_batch = min(max_batch, self.max_in_flight)
+        self.batch_chunk_size = batch_chunk_size
+        self.in_flight = 0
+        self.requests_served = 0
+        self.requests_rejected = 0
+        self.pool_restarts = 0
+        self.started_at = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self):
+        """Start and warm the worker pool, then begin accepting connections"""
+        self._executor = self._new_executor()
+        await self._warm_up(self._executor)
+
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=self.MAX_HEADER_BYTES
+        )
+        # Pick up the real port when binding to port 0
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.started_at = time.time()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=worker.init_worker)
+
+    async def _warm_up(self, executor: ProcessPoolExecutor):
+        # One warm-up task per worker forces every process to start and load its imports
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(executor, worker.warm_up) for _ in range(self.workers)])
+
+    def _replace_broken_pool(self, broken: ProcessPoolExecutor):
+        """Swap in a fresh pool after a worker died; the old one rejects every new task"""
+        # Requests that failed on the same broken pool only replace it once
+        if self._executor is broken:
+            self.pool_restarts += 1
+            self._executor = self._new_executor()
+            broken.shutdown(wait=False)
+            asyncio.ensure_future(self._warm_up(self._executor))
+
+    async def _run_in_pool(self, function, *args):
+        """Run a worker function in the pool, rebuilding the pool and answering 503 if it broke"""
+        executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        except BrokenProcessPool:
+            self._replace_broken_pool(executor)
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Analysis worker crashed, retry shortly",
+                            {'Retry-After': '1'})
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        """Stop accepting connections and shut the worker pool down"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # Closing the transport ends idle keep-alive connections the way a client hang-up would
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection until the client or an error closes it"""
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    status, payload, extra_headers = await self._dispatch(method, path, body)
+                    close = headers.get('connection', '').lower() == 'close'
+                except HTTPError as e:
+                    status, payload, extra_headers = e.status, {'error': e.message}, e.headers
+                    close = e.close
+                    if status == HTTPStatus.TOO_MANY_REQUESTS:
+                        self.requests_rejected += 1
+
+                await self._write_response(writer, status, payload, extra_headers, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """Read one request, enforcing header and body size limits"""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None  # Client closed an idle keep-alive connection
+            raise
+        except asyncio.LimitOverrunError:
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request headers too large", close=True)
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, path, _version = lines[0].split(' ', 2)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line", close=True)
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Chunked bodies are not supported, send Content-Length", close=True)
+
+        try:
+            length = int(headers.get('content-length', '0'))
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length", close=True)
+        if length > self.max_body_bytes:
+            # The body is left unread, so the connection cannot be reused
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            f"Request body exceeds {self.max_body_bytes} bytes", close=True)
+
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), path.split('?', 1)[0], headers, body
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[HTTPStatus, Dict, Dict[str, str]]:
+        """Route a request to its handler"""
+        if path == '/health':
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET", {'Allow': 'GET'})
+            return HTTPStatus.OK, self.health(), {}
+
+        if path in ('/score', '/score/batch'):
+            if method != 'POST':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST", {'Allow': 'POST'})
+            if path == '/score':
+                return HTTPStatus.OK, await self._score_single(body), {}
+            return HTTPStatus.OK, await self._score_batch(body), {}
+
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+
+    def _acquire(self, count: int):
+        """Reserve in-flight slots or reject the request with 429"""
+        if self.in_flight + count > self.max_in_flight:
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS, "Scoring capacity exhausted, retry later", {'Retry-After': '1'})
+        self.in_flight += count
+
+    async def _score_single(self, body: bytes) -> Dict:
+        if not body.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Empty message")
+
+        self._acquire(1)
+        try:
+            try:
+                result = await self._run_in_pool(worker.analyze, body)
+            except HTTPError:
+                raise
+            except Exception as e:
+                raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, f"Could not analyze message: {e}")
+        finally:
+            self.in_flight -= 1
+
+        self.requests_served += 1
+        return result
+
+    async def _score_batch(self, body: bytes) -> Dict:
+        try:
+            encoded = json.loads(body)['messages']
+            messages = [base64.b64decode(item, validate=True) for item in encoded]
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Expected JSON {"messages": [<base64 message>, ...]}')
+        if len(messages) > self.max_batch:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Batch exceeds {self.max_batch} messages")
+
+        self._acquire(len(messages))
+        try:
+            # Spread the batch over the pool in chunks to amortize inter-process overhead
+            chunks = [messages[i:i + self.batch_chunk_size] for i in range(0, len(messages), self.batch_chunk_size)]
+            chunk_results = await asyncio.gather(
+                *[self._run_in_pool(worker.analyze_batch, chunk) for chunk in chunks]
+            )
+        finally:
+            self.in_flight -= len(messages)
+
+        self.requests_served += 1
+        return {'results': [result for chunk in chunk_results for result in chunk]}
+
+    def health(self) -> Dict:
+        return {
+            'status': 'ok',
+            'workers': self.workers,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'max_batch': self.max_batch,
+            'pool_restarts': self.pool_restarts,
+            'requests_served': self.requests_served,
+            'requests_rejected': self.requests_rejected,
+            'uptime_seconds': round(time.time() - self.started_at, 1) if self.started_at else 0
+        }
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: HTTPStatus, payload: Dict,
+                              headers: Dict[str, str], close: bool):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'close' if close else 'keep-alive'}"
+        ]
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+async def _run(server: ScoringServer):
+    await server.start()
+    print(f"Scoring service listening on http://{server.host}:{server.port} with {server.workers} workers",
+          file=sys.stderr)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    serving = asyncio.ensure_future(server.serve_forever())
+    await stop.wait()
+    serving.cancel()
+    await server.close()
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="HTTP phishing scoring service")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="analysis worker processes")
+    arg_parser.add_argument('--max-body-bytes', type=int, default=25 * 1024 * 1024, help="largest accepted request body")
+    arg_parser.add_argument('--max-batch', type=int, default=100, help="most messages accepted in one batch (at most --max-in-flight)")
+    arg_parser.add_argument('--max-in-flight', type=int, help="messages analyzed at once before answering 429 (default: 4 per worker)")
+    args = arg_parser.parse_args(argv)
+
+    server = ScoringServer(args.host, args.port, args.workers, args.max_body_bytes, args.max_batch, args.max_in_flight)
+    asyncio.run(_run(server))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""SMTP proxy: score each message inline and relay it downstream with verdict headers.
+
+Usage:
+    python smtp_proxy.py --listen-port 10025 --downstream-host mail.internal --downstream-port 25
+
+Every accepted message gets X-Phish-Score and X-Phish-Level headers from PhishingScorer
+before it is relayed. Scoring is bounded by --deadline; a message that cannot be scored in
+time is relayed with X-Phish-Level: UNSCORED so mail flow never stalls behind the analyzer.
+A job that missed its deadline keeps running, so at most --max-pending jobs may be queued or
+running at once; beyond that messages get 451 and the sending MTA retries later. If a worker
+process dies the pool is rebuilt and the message scored once more before it is relayed unscored.
+Any X-Phish-* headers supplied by the sender are stripped so verdicts cannot be forged.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import smtplib
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+from aiosmtpd.controller import Controller
+
+from utils import worker
+
+logger = logging.getLogger('smtp_proxy')
+
+VERDICT_HEADERS = (b'x-phish-score', b'x-phish-level')
+
+def add_verdict_headers(raw: bytes, score: Optional[float], level: str) -> bytes:
+    """Drop any existing verdict headers and prepend fresh ones"""
+    separator = raw.find(b'\r\n\r\n')
+    newline = b'\r\n'
+    if separator == -1 or (0 <= raw.find(b'\n\n') < separator):
+        separator = raw.find(b'\n\n')
+        newline = b'\n'
+    if separator == -1:
+        separator = len(raw)
+
+    kept = []
+    dropping = False
+    for line in raw[:separator].split(newline):
+        if line[:1] in (b' ', b'\t'):
+            # Folded continuation lines belong to the header above them
+            if not dropping:
+                kept.append(line)
+            continue
+        dropping = line.split(b':', 1)[0].strip().lower() in VERDICT_HEADERS
+        if not dropping:
+            kept.append(line)
+
+    verdict = []
+    if score is not None:
+        verdict.append(b'X-Phish-Score: ' + f'{score:.1f}'.encode('ascii'))
+    verdict.append(b'X-Phish-Level: ' + level.encode('ascii'))
+
+    return newline.join(verdict + kept) + raw[separator:]
+
+class PhishScoringHandler:
+    """aiosmtpd handler that scores DATA in a process pool and relays the result.
+
+    With new_executor, a pool broken by a dead worker is replaced and the message retried once.
+    """
+
+    def __init__(self, executor: ProcessPoolExecutor, downstream_host: str, downstream_port: int = 25,
+                 deadline: float = 5.0, relay_timeout: float = 30.0, max_pending: int = 16,
+                 new_executor: Callable[[], ProcessPoolExecutor] = None):
+        self.executor = executor
+        self.new_executor = new_executor
+        self._executor_lock = threading.Lock()
+        self.downstream_host = downstream_host
+        self.downstream_port = downstream_port
+        self.deadline = deadline
+        self.relay_timeout = relay_timeout
+        self.max_pending = max_pending
+        # Released from the pool's thread when a job ends, which may be long after its deadline
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self.stats = {'relayed': 0, 'unscored': 0, 'relay_failures': 0, 'deferred': 0, 'pool_restarts': 0}
+
+    def _replace_broken_pool(self, broken: ProcessPoolExecutor) -> bool:
+        """Swap in a fresh pool after a worker died; False when there is no way to build one"""
+        if self.new_executor is None:
+            return False
+        with self._executor_lock:
+            # Jobs that failed on the same broken pool only replace it once
+            if self.executor is broken:
+                self.stats['pool_restarts'] += 1
+                self.executor = self.new_executor()
+                broken.shutdown(wait=False)
+                logger.error("A scoring worker died, replaced the process pool")
+        return True
+
+    async def score(self, raw: bytes) -> Optional[Dict]:
+        """Score a message, giving up once the deadline passes; None when max_pending jobs are outstanding"""
+        if not self._pending.acquire(blocking=False):
+            return None
+        try:
+            for attempt in range(2):
+                # The slot went back when the job on the broken pool ended
+                if attempt and not self._pending.acquire(blocking=False):
+                    return None
+                executor = self.executor
+                try:
+                    job = executor.submit(worker.analyze, raw)
+                except BrokenProcessPool:
+                    self._pending.release()
+                    if not self._replace_broken_pool(executor):
+                        raise
+                    continue
+                except Exception:
+                    self._pending.release()
+                    raise
+                job.add_done_callback(lambda _job: self._pending.release())
+                try:
+                    # On timeout a job still queued is cancelled; one already running holds its slot until it ends
+                    result = await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.deadline)
+                except BrokenProcessPool:
+                    if not self._replace_broken_pool(executor) or attempt:
+                        raise
+                    continue
+                return {'score': result['overall_score'], 'level': result['threat_level']}
+            raise BrokenProcessPool("Scoring pool broke again after it was replaced")
+        except asyncio.TimeoutError:
+            logger.warning("Scoring exceeded the %.1fs deadline, relaying unscored", self.deadline)
+        except Exception:
+            logger.exception("Scoring failed, relaying unscored")
+        self.stats['unscored'] += 1
+        return {'score': None, 'level': 'UNSCORED'}
+
+    def relay(self, mail_from: str, rcpt_tos: List[str], data: bytes):
+        """Hand the message to the downstream MTA (blocking, run in a thread)"""
+        with smtplib.SMTP(self.downstream_host, self.downstream_port, timeout=self.relay_timeout) as client:
+            client.sendmail(mail_from, rcpt_tos, data)
+
+    async def handle_DATA(self, server, session, envelope) -> str:
+        raw = envelope.original_content or envelope.content
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8', errors='surrogateescape')
+
+        verdict = await self.score(raw)
+        if verdict is None:
+            logger.warning("%d scoring jobs outstanding, deferring message", self.max_pending)
+            self.stats['deferred'] += 1
+            return '451 4.3.2 Scoring queue full, try again later'
+        if verdict['score'] is None:
+            logger.warning("Relaying message from %s unscored (%d unscored so far)",
+                           envelope.mail_from, self.stats['unscored'])
+        scored = add_verdict_headers(raw, verdict['score'], verdict['level'])
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.relay, envelope.mail_from, envelope.rcpt_tos, scored
+            )
+        except (OSError, smtplib.SMTPException) as e:
+            logger.error("Relay to %s:%s failed: %s", self.downstream_host, self.downstream_port, e)
+            self.stats['relay_failures'] += 1
+            # Temporary failure so the sending MTA retries later
+            return '451 4.4.1 Downstream relay unavailable, try again later'
+
+        self.stats['relayed'] += 1
+        return '250 Message accepted for delivery'
+
+class SMTPProxy:
+    """Own the worker pool and the aiosmtpd controller for the scoring proxy"""
+
+    def __init__(self, listen_host: str = '127.0.0.1', listen_port: int = 10025,
+                 downstream_host: str = '127.0.0.1', downstream_port: int = 25,
+                 workers: int = None, deadline: float = 5.0, max_message_bytes: int = 50 * 1024 * 1024,
+                 max_pending: int = None):
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_message_bytes = max_message_bytes
+        self.handler = PhishScoringHandler(self._new_executor(), downstream_host, downstream_port, deadline,
+                                           max_pending=max_pending or self.workers * 4,
+                                           new_executor=self._replacement_executor)
+        self.controller = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """The pool in use, which changes when a broken one is replaced"""
+        return self.handler.executor
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=worker.init_worker)
+
+    def _replacement_executor(self) -> ProcessPoolExecutor:
+        # Warm-up tasks are queued ahead of the retried messages rather than waited for
+        executor = self._new_executor()
+        for _ in range(self.workers):
+            executor.submit(worker.warm_up)
+        return executor
+
+    def start(self):
+        """Warm every worker, then start accepting SMTP connections in a background thread"""
+        for future in [self.executor.submit(worker.warm_up) for _ in range(self.workers)]:
+            future.result()
+
+        self.controller = Controller(
+            self.handler, hostname=self.listen_host, port=self.listen_port,
+            data_size_limit=self.max_message_bytes, decode_data=False
+        )
+        self.controller.start()
+
+    def stop(self):
+        if self.controller is not None:
+            self.controller.stop()
+        self.executor.shutdown(wait=True)
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Inline phishing scoring SMTP proxy")
+    arg_parser.add_argument('--listen-host', default='127.0.0.1')
+    arg_parser.add_argument('--listen-port', type=int, default=10025)
+    arg_parser.add_argument('--downstream-host', required=True, help="MTA that receives scored mail")
+    arg_parser.add_argument('--downstream-port', type=int, default=25)
+    arg_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="analysis worker processes")
+    arg_parser.add_argument('--deadline', type=float, default=5.0, help="seconds allowed for scoring one message")
+    arg_parser.add_argument('--max-message-bytes', type=int, default=50 * 1024 * 1024)
+    arg_parser.add_argument('--max-pending', type=int, help="scoring jobs queued or running before answering 451 (default: 4 per worker)")
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    proxy = SMTPProxy(args.listen_host, args.listen_port, args.downstream_host, args.downstream_port,
+                      args.workers, args.deadline, args.max_message_bytes, args.max_pending)
+    proxy.start()
+    logger.info("Scoring proxy on %s:%s relaying to %s:%s",
+                args.listen_host, args.listen_port, args.downstream_host, args.downstream_port)
+
+    # The controller serves from its own thread; the main thread just waits for a stop signal
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    try:
+        while not stop.wait(1.0):
+            pass
+    finally:
+        proxy.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
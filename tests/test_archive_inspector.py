@@ -0,0 +1,39 @@
+import io
+import struct
+import zipfile
+import zlib
+
+import pytest
+
+from utils.archive_inspector import inspect_archive
+from utils.mime_payload import MIMEPayload
+
+# A 7z NUMBER of 2**60: a 0xFF lead byte and eight value bytes
+HUGE = b'\xff' + (2 ** 60).to_bytes(8, 'little')
+
+def _payload(data: bytes) -> MIMEPayload:
+    return MIMEPayload(data.decode('ascii', 'surrogateescape'), 'binary', len(data))
+
+def _seven_zip(header: bytes) -> bytes:
+    """A 7z file whose (uncompressed) header database is header"""
+    tail = struct.pack('<QQI', 0, len(header), zlib.crc32(header))
+    return b"7z\xbc\xaf'\x1c\x00\x04" + struct.pack('<I', zlib.crc32(tail)) + tail + header
+
+def test_zip_members_are_listed():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('docs/invoice.pdf.exe', b'MZ' * 100)
+        archive.writestr('readme.txt', b'hello')
+    data = buffer.getvalue()
+    listing = inspect_archive(_payload(data), 'zip')
+    assert listing['entries'] == ['docs/invoice.pdf.exe', 'readme.txt']
+    assert not listing['truncated']
+
+@pytest.mark.parametrize('header', [
+    b'\x01\x04\x06\x00' + HUGE + b'\x0a\x01\x00\x00\x00',  # pack streams with all digests defined
+    b'\x01\x04\x07\x0b' + HUGE + b'\x00',                  # folders
+    b'\x01\x04\x07\x0b\x01\x00' + HUGE,                    # coders in a folder
+    b'\x01\x05' + HUGE + b'\x00\x00',                      # files
+], ids=['pack-streams', 'folders', 'coders', 'files'])
+def test_hostile_7z_counts_are_unreadable_not_allocated(header):
+    assert inspect_archive(_payload(_seven_zip(header)), '7z') is None
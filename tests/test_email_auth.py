@@ -0,0 +1,141 @@
+import base64
+import hashlib
+import random
+import re
+
+import pytest
+
+from utils.dns_resolver import ZoneFileResolver
+from utils.email_auth import DIGEST_INFO_PREFIXES, DKIMVerifier, EmailAuthenticator, SPFEvaluator, split_message
+
+ZONE = """
+$ORIGIN example.com.
+@           TXT "v=spf1 ip4:192.0.2.0/24 a:mail.example.com/28 -all"
+mail        A   198.51.100.1
+broken      TXT "v=spf1 a/xx -all"
+wide        TXT "v=spf1 a:mail.example.com/33 -all"
+wide6       TXT "v=spf1 a:mail.example.com//129 -all"
+"""
+
+def _probable_prime(rng: random.Random, bits: int) -> int:
+    while True:
+        candidate = rng.getrandbits(bits) | (1 << (bits - 1)) | 1
+        if all(pow(base, candidate - 1, candidate) == 1 for base in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29)):
+            return candidate
+
+def _rsa_key(seed: int = 0):
+    """A deterministic 1024-bit RSA key: (n, e, d)"""
+    rng = random.Random(seed)
+    e = 65537
+    while True:
+        p, q = _probable_prime(rng, 512), _probable_prime(rng, 512)
+        phi = (p - 1) * (q - 1)
+        if p != q and phi % e:
+            return p * q, e, pow(e, -1, phi)
+
+def _der(tag: int, content: bytes) -> bytes:
+    length = len(content)
+    if length < 0x80:
+        return bytes([tag, length]) + content
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([tag, 0x80 | len(encoded)]) + encoded + content
+
+def _public_key(n: int, e: int) -> str:
+    """Bare RSAPublicKey DER, base64-encoded for a p= tag"""
+    def integer(value: int) -> bytes:
+        return _der(0x02, value.to_bytes(value.bit_length() // 8 + 1, 'big'))
+    return base64.b64encode(_der(0x30, integer(n) + integer(e))).decode('ascii')
+
+KEY = _rsa_key()
+
+MESSAGE = (b"From: Alice <alice@example.com>\r\n"
+           b"To: bob@example.org\r\n"
+           b"Subject: Quarterly  report\r\n"
+           b"\r\n"
+           b"Please find the figures below.  \r\n"
+           b"Regards,\r\n"
+           b"Alice\r\n")
+
+def _sign(raw: bytes, canonicalization: str, key=KEY) -> bytes:
+    """Prepend a DKIM-Signature for raw, signed by selector 'sel' of example.com"""
+    n, _e, d = key
+    header_canon, body_canon = canonicalization.split('/')
+    fields, body = split_message(raw)
+    body_hash = base64.b64encode(hashlib.sha256(DKIMVerifier._canonicalize_body(body, body_canon)).digest())
+    field = (b"DKIM-Signature: v=1; a=rsa-sha256; c=" + canonicalization.encode('ascii') +
+             b"; d=example.com; s=sel; h=from:to:subject; bh=" + body_hash + b"; b=")
+
+    signed = DKIMVerifier._select_headers(fields, 'from:to:subject')
+    data = b''.join(DKIMVerifier._canonicalize_header(signed_field, header_canon) for signed_field in signed)
+    data += DKIMVerifier._canonicalize_header(field + b'\r\n', header_canon).rstrip(b'\r\n')
+
+    key_bytes = (n.bit_length() + 7) // 8
+    digest_info = DIGEST_INFO_PREFIXES['sha256'] + hashlib.sha256(data).digest()
+    padded = b'\x00\x01' + b'\xff' * (key_bytes - len(digest_info) - 3) + b'\x00' + digest_info
+    signature = pow(int.from_bytes(padded, 'big'), d, n).to_bytes(key_bytes, 'big')
+    return field + base64.b64encode(signature) + b"\r\n" + raw
+
+def _verify(signed: bytes, key_record: str) -> dict:
+    resolver = ZoneFileResolver()
+    resolver.add('sel._domainkey.example.com', 'TXT', key_record)
+    fields, body = split_message(signed)
+    signature_field = next(field for name, field in fields if name == 'dkim-signature')
+    return DKIMVerifier(resolver).verify(signature_field, fields, body)
+
+@pytest.mark.parametrize('ip, sender, expected', [
+    ('192.0.2.55', 'alice@example.com', 'pass'),
+    ('198.51.100.9', 'alice@example.com', 'pass'),
+    ('203.0.113.7', 'alice@example.com', 'fail'),
+    ('203.0.113.7', 'alice@broken.example.com', 'permerror'),
+    ('203.0.113.7', 'alice@wide.example.com', 'permerror'),
+    ('2001:db8::1', 'alice@wide6.example.com', 'permerror'),
+    ('203.0.113.7', 'alice@example.net', 'none'),
+])
+def test_spf_results_from_zone_file(ip, sender, expected):
+    spf = SPFEvaluator(ZoneFileResolver(ZONE, 'example.com'))
+    assert spf.check(ip, sender)[0] == expected
+
+def test_malformed_spf_prefix_is_a_permerror_for_the_whole_message():
+    raw = (b"Received: from mx.broken.example.com (mx.broken.example.com [203.0.113.7]) by mx.example.org\r\n"
+           b"Return-Path: <alice@broken.example.com>\r\n"
+           b"From: alice@broken.example.com\r\n\r\nHello\r\n")
+    result = EmailAuthenticator(ZoneFileResolver(ZONE, 'example.com')).verify(raw)
+    assert result['spf']['result'] == 'permerror'
+
+@pytest.mark.parametrize('canonicalization', ['relaxed/relaxed', 'simple/simple'])
+def test_dkim_signature_verifies(canonicalization):
+    result = _verify(_sign(MESSAGE, canonicalization), f"v=DKIM1; k=rsa; p={_public_key(*KEY[:2])}")
+    assert result['result'] == 'pass', result['reason']
+
+@pytest.mark.parametrize('canonicalization, expected', [('relaxed/relaxed', 'pass'), ('simple/simple', 'fail')])
+def test_dkim_whitespace_changes_only_survive_relaxed(canonicalization, expected):
+    signed = _sign(MESSAGE, canonicalization)
+    reformatted = signed.replace(b"Subject: Quarterly  report", b"subject:Quarterly report") \
+                        .replace(b"below.  \r\n", b"below.\r\n")
+    assert _verify(reformatted, f"p={_public_key(*KEY[:2])}")['result'] == expected
+
+@pytest.mark.parametrize('canonicalization', ['relaxed/relaxed', 'simple/simple'])
+@pytest.mark.parametrize('old, new, reason', [
+    (b"Regards", b"Regard$", "Body hash does not match"),
+    (b"Quarterly", b"Quarterl1", "Signature does not verify"),
+])
+def test_tampered_dkim_message_fails(canonicalization, old, new, reason):
+    result = _verify(_sign(MESSAGE, canonicalization).replace(old, new), f"p={_public_key(*KEY[:2])}")
+    assert (result['result'], result['reason']) == ('fail', reason)
+
+def test_dkim_signature_from_another_key_fails():
+    result = _verify(_sign(MESSAGE, 'relaxed/relaxed', _rsa_key(1)), f"p={_public_key(*KEY[:2])}")
+    assert result['result'] == 'fail'
+
+@pytest.mark.parametrize('key_record', [
+    f"p={_public_key(0, 65537)}",
+    f"p={_public_key(KEY[0], 0)}",
+    "p=MAMCAQA=",  # SEQUENCE holding a lone INTEGER
+])
+def test_malformed_dkim_key_is_a_permerror(key_record):
+    assert _verify(_sign(MESSAGE, 'relaxed/relaxed'), key_record)['result'] == 'permerror'
+
+def test_empty_dkim_signature_is_a_permerror():
+    signed = re.sub(rb'; b=[A-Za-z0-9+/=]+\r\n', b'; b=\r\n', _sign(MESSAGE, 'relaxed/relaxed'), count=1)
+    for key_record in (f"p={_public_key(*KEY[:2])}", f"p={_public_key(0, 65537)}"):
+        assert _verify(signed, key_record)['result'] == 'permerror'
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from benchmarks.bench_enrichment import TYPE_MX, start_servers
+from utils.dns_resolver import SystemResolver
+from utils.enrichment import DomainEnricher, WhoisClient
+
+DOMAINS = ['alpha.com', 'beta.net', 'gamma.org', 'delta.co.uk']
+
+@pytest.fixture
+def servers():
+    # Answers are delayed so that lookups of the same domain overlap
+    return start_servers(DOMAINS, latency=0.05)
+
+def _enricher(dns_port: int, whois_port: int) -> DomainEnricher:
+    return DomainEnricher(SystemResolver(nameservers=['127.0.0.1'], port=dns_port),
+                          WhoisClient(port=whois_port, iana_server='127.0.0.1'))
+
+def test_overlapping_lookups_are_coalesced(servers):
+    dns, whois, dns_port, whois_port = servers
+    enricher = _enricher(dns_port, whois_port)
+    hosts = ['www.alpha.com', 'login.alpha.com', 'beta.net', 'mail.beta.net', 'gamma.org', 'shop.delta.co.uk']
+    barrier = threading.Barrier(4)
+    results = []
+
+    def enrich():
+        barrier.wait()
+        results.append(enricher.enrich_blocking(hosts))
+
+    threads = [threading.Thread(target=enrich) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    enricher.close()
+
+    assert enricher.lookups == len(DOMAINS)
+    assert 0 < enricher.coalesced <= 3 * len(DOMAINS)
+    assert enricher.whois.referral_lookups == 4  # com, net, org, uk
+    assert all(count == 1 for (_name, qtype), count in dns.queries.items() if qtype == TYPE_MX)
+    assert all(count == 1 for count in whois.queries.values())
+    assert all(result == results[0] for result in results)
+    assert results[0]['delta.co.uk']['mx'] == ['mx.delta.co.uk']
+    assert results[0]['alpha.com']['created']
+
+def test_repeated_lookups_are_served_from_cache(servers):
+    _dns, whois, dns_port, whois_port = servers
+    enricher = _enricher(dns_port, whois_port)
+    first = enricher.enrich_blocking(['alpha.com', 'unknown.com'])
+    second = enricher.enrich_blocking(['www.alpha.com', 'unknown.com'])
+    enricher.close()
+
+    assert enricher.lookups == 2
+    assert enricher.coalesced == 0
+    assert whois.queries['alpha.com'] == 1
+    assert first == second
+    assert (second['unknown.com']['accepts_mail'], second['unknown.com']['created']) == (False, None)
@@ -0,0 +1,37 @@
+import base64
+
+from utils.campaign_index import CampaignIndex
+from utils.pipeline import AnalysisPipeline
+
+BODY = ("Hello team,\n\nPlease find attached the invoice for the March consulting work. Payment is due "
+        "within thirty days of receipt. Let me know if you have any questions about the line items.\n\n"
+        "Best regards,\nDana\n")
+
+def _message(sender: str, attachment: str = None) -> str:
+    headers = f"From: Dana <{sender}>\nTo: ap@example.org\nSubject: March invoice\n"
+    if attachment is None:
+        return f"{headers}\n{BODY}"
+    payload = base64.b64encode(b'MZ' + b'\0' * 200).decode('ascii')
+    return (f"{headers}MIME-Version: 1.0\nContent-Type: multipart/mixed; boundary=XX\n\n"
+            f"--XX\nContent-Type: text/plain\n\n{BODY}\n"
+            f"--XX\nContent-Type: application/octet-stream\n"
+            f"Content-Disposition: attachment; filename=\"{attachment}\"\nContent-Transfer-Encoding: base64\n\n"
+            f"{payload}\n--XX--\n")
+
+def test_campaign_verdict_is_reused_for_the_same_sender_domain():
+    pipeline = AnalysisPipeline(campaigns=CampaignIndex())
+    first = pipeline.analyze(_message('dana@acme-consulting.com'))
+    repeat = pipeline.analyze(_message('billing@mail.acme-consulting.com'))
+    assert repeat['campaign']['reused_verdict']
+    assert repeat['overall_score'] == first['overall_score']
+
+def test_campaign_verdict_is_not_reused_across_senders_or_attachments():
+    pipeline = AnalysisPipeline(campaigns=CampaignIndex())
+    pipeline.analyze(_message('dana@acme-consulting.com'))
+    phishing = _message('billing@paypal-verify.tk', 'invoice.pdf.exe')
+    result = pipeline.analyze(phishing)
+
+    assert result['campaign']['size'] == 2
+    assert not result['campaign']['reused_verdict']
+    alone = AnalysisPipeline().analyze(phishing)
+    assert (result['overall_score'], result['threat_level']) == (alone['overall_score'], alone['threat_level'])
@@ -0,0 +1,77 @@
+import os
+import smtplib
+from concurrent.futures.process import BrokenProcessPool
+from email import message_from_bytes
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from benchmarks.bench_smtp_proxy import SinkHandler, free_port
+from smtp_proxy import SMTPProxy
+from utils.samples import SAMPLE_EMAILS
+
+PHISHING = SAMPLE_EMAILS["🚨 Critical - Obvious PayPal Scam"].encode('utf-8')
+CLEAN = SAMPLE_EMAILS["✅ Safe - Legitimate GitHub Notification"].encode('utf-8')
+
+@pytest.fixture
+def sink():
+    handler = SinkHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+@pytest.fixture
+def proxy(sink):
+    _handler, sink_port = sink
+    proxy = SMTPProxy('127.0.0.1', free_port(), '127.0.0.1', sink_port, workers=1, deadline=30)
+    proxy.start()
+    yield proxy
+    proxy.stop()
+
+def _send(proxy: SMTPProxy, raw: bytes):
+    with smtplib.SMTP('127.0.0.1', proxy.listen_port, timeout=60) as client:
+        client.sendmail('sender@example.com', ['rcpt@example.org'], raw)
+
+def _verdict(raw: bytes):
+    message = message_from_bytes(raw)
+    return message.get_all('X-Phish-Level'), message.get_all('X-Phish-Score')
+
+def test_messages_are_relayed_with_fresh_verdicts(sink, proxy):
+    handler, _port = sink
+    _send(proxy, b'X-Phish-Level: SAFE\r\nX-Phish-Score: 0.0\r\n' + PHISHING)
+    _send(proxy, CLEAN)
+
+    (phishing_level, phishing_score), (clean_level, clean_score) = map(_verdict, handler.messages)
+    assert clean_level == ['SAFE']
+    assert phishing_level != ['SAFE'] and len(phishing_level) == 1
+    assert float(phishing_score[0]) > float(clean_score[0])
+    assert proxy.handler.stats['relayed'] == 2
+    assert proxy.handler.stats['unscored'] == 0
+
+def test_unreachable_downstream_is_a_temporary_rejection():
+    proxy = SMTPProxy('127.0.0.1', free_port(), '127.0.0.1', free_port(), workers=1, deadline=30)
+    proxy.start()
+    try:
+        with pytest.raises(smtplib.SMTPDataError) as rejected:
+            _send(proxy, CLEAN)
+    finally:
+        proxy.stop()
+    assert rejected.value.smtp_code == 451
+    assert proxy.handler.stats['relay_failures'] == 1
+
+def test_dead_worker_pool_is_replaced_and_message_scored(sink, proxy):
+    handler, _port = sink
+    broken = proxy.executor
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result()
+
+    _send(proxy, PHISHING)
+    _send(proxy, CLEAN)
+
+    assert proxy.executor is not broken
+    assert proxy.handler.stats['pool_restarts'] == 1
+    assert proxy.handler.stats['unscored'] == 0
+    phishing_level, clean_level = (_verdict(raw)[0] for raw in handler.messages)
+    assert phishing_level not in (['SAFE'], ['UNSCORED'])
+    assert clean_level == ['SAFE']
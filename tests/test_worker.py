@@ -0,0 +1,37 @@
+import pytest
+
+from utils import worker
+from utils.campaign_index import CampaignIndex
+from utils.pipeline import AnalysisPipeline
+from utils.samples import SAMPLE_EMAILS
+
+MESSAGE = SAMPLE_EMAILS["🚨 Critical - Obvious PayPal Scam"].encode('utf-8')
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    # Restored afterwards, so the worker's module state does not leak into other tests
+    monkeypatch.setattr(worker, '_pipeline', None)
+    worker.init_worker(cache_path=str(tmp_path / 'verdicts.db'))
+    monkeypatch.setattr(worker._pipeline, 'campaigns', CampaignIndex())
+    return worker._pipeline
+
+def test_warm_up_leaves_the_worker_pipeline_untouched(pipeline):
+    worker.warm_up()
+    assert pipeline.cache.stats()['disk_size'] == 0
+    assert len(pipeline.campaigns) == 0
+
+def test_failed_message_does_not_rerun_the_batch(pipeline, monkeypatch):
+    run_analyzers = AnalysisPipeline.run_analyzers
+
+    def failing(self, components):
+        if components['subject'] == 'boom':
+            raise ValueError("analyzer failed")
+        return run_analyzers(self, components)
+
+    monkeypatch.setattr(AnalysisPipeline, 'run_analyzers', failing)
+    failing_message = b'From: a@example.com\nSubject: boom\n\nThis message makes an analyzer fail.\n'
+    results = worker.analyze_batch([MESSAGE, failing_message, b'Subject: hello\n\nA short note to say hello.\n'])
+
+    assert 'error' not in results[0] and 'error' not in results[2]
+    assert results[1] == {'error': "analyzer failed"}
+    assert pipeline.campaigns.stats()['messages'] == 3
@@ -0,0 +1,513 @@
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from utils.mime_payload import MIMEPayload
+
+# Hard limits per archive: entries listed, and archive bytes read to list them
+MAX_ENTRIES = 1000
+MAX_BYTES_READ = 1024 * 1024
+
+# ZIP end of central directory record, and its ZIP64 locator and record
+ZIP_EOCD = struct.Struct('<4sHHHHIIH')
+ZIP64_LOCATOR = struct.Struct('<4sIQI')
+ZIP64_EOCD = struct.Struct('<4sQHHIIQQQQ')
+ZIP_CENTRAL_HEADER = struct.Struct('<4sHHHHHHIIIHHHHHII')
+ZIP_EOCD_SIGNATURE = b'PK\x05\x06'
+ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_EOCD_SIGNATURE = b'PK\x06\x06'
+ZIP_CENTRAL_SIGNATURE = b'PK\x01\x02'
+# The record sits at the very end, after a comment of at most 64KB
+ZIP_EOCD_SEARCH = ZIP_EOCD.size + 0xFFFF
+
+RAR4_SIGNATURE = b'Rar!\x1a\x07\x00'
+RAR5_SIGNATURE = b'Rar!\x1a\x07\x01\x00'
+RAR4_BLOCK = struct.Struct('<HBHH')
+RAR4_FILE = struct.Struct('<IIBIIBBHI')
+# Larger headers only come from damaged or hostile archives
+RAR_MAX_HEADER = 64 * 1024
+
+SEVEN_ZIP_START = struct.Struct('<6sBBIQQI')
+SEVEN_ZIP_AES = b'\x06\xf1\x07\x01'
+
+class _Malformed(Exception):
+    """The archive structures do not parse"""
+
+class _BoundedReader:
+    """Reads from an attachment payload until MAX_BYTES_READ is spent"""
+
+    def __init__(self, payload: MIMEPayload):
+        self.payload = payload
+        self.size = payload.size
+        self.budget = MAX_BYTES_READ
+        self.exhausted = False
+
+    def read(self, offset: int, length: int) -> bytes:
+        if length > self.budget:
+            self.exhausted = True
+            length = self.budget
+        self.budget -= length
+        return self.payload.read(offset, length)
+
+def _listing(archive_format: str) -> Dict:
+    return {
+        'format': archive_format,
+        'entries': [],
+        'entry_count': 0,
+        'encrypted': False,
+        'headers_encrypted': False,
+        'compressed_size': 0,
+        'uncompressed_size': 0,
+        'overlapping_entries': False,
+        # The listing stopped short: a limit was hit or the names are compressed (7z)
+        'truncated': False,
+    }
+
+def inspect_archive(payload: MIMEPayload, file_type: str) -> Optional[Dict]:
+    """List a ZIP, RAR or 7z attachment from its directory structures alone.
+
+    Nothing is decompressed: ZIP is read from its central directory at the end of the
+    file, RAR by walking its block headers, 7z from its header database. The result is
+    JSON-safe; None when the archive structures do not parse.
+    """
+    inspectors = {'zip': _inspect_zip, 'rar': _inspect_rar, '7z': _inspect_7z}
+    if file_type not in inspectors:
+        return None
+    reader = _BoundedReader(payload)
+    listing = _listing(file_type)
+    try:
+        inspectors[file_type](reader, listing)
+    except _Malformed:
+        if not listing['entries'] and not listing['encrypted']:
+            return None
+        # Damaged after the first members: keep what was listed
+        listing['truncated'] = True
+    except (IndexError, struct.error):
+        # Cut off part way through: keep what was listed before it
+        listing['truncated'] = True
+    if reader.exhausted or len(listing['entries']) >= MAX_ENTRIES:
+        listing['truncated'] = True
+    listing['entry_count'] = max(listing['entry_count'], len(listing['entries']))
+    return listing
+
+def _add_entry(listing: Dict, name: str, compressed_size: int, uncompressed_size: int, encrypted: bool) -> bool:
+    """Record one member; False once MAX_ENTRIES are listed"""
+    if len(listing['entries']) >= MAX_ENTRIES:
+        return False
+    listing['entries'].append(name)
+    listing['compressed_size'] += compressed_size
+    listing['uncompressed_size'] += uncompressed_size
+    listing['encrypted'] = listing['encrypted'] or encrypted
+    return True
+
+def _inspect_zip(reader: _BoundedReader, listing: Dict):
+    tail_start = max(reader.size - ZIP_EOCD_SEARCH, 0)
+    tail = reader.read(tail_start, reader.size - tail_start)
+    position = tail.rfind(ZIP_EOCD_SIGNATURE)
+    while position >= 0 and len(tail) - position < ZIP_EOCD.size:
+        position = tail.rfind(ZIP_EOCD_SIGNATURE, 0, position)
+    if position < 0:
+        raise _Malformed()
+
+    _signature, _disk, _directory_disk, _disk_entries, entry_count, directory_size, _directory_offset, _comment = \
+        ZIP_EOCD.unpack_from(tail, position)
+    record_offset = tail_start + position
+    locator = position - ZIP64_LOCATOR.size
+    if locator >= 0 and tail[locator:locator + 4] == ZIP64_LOCATOR_SIGNATURE:
+        _signature, _disk, zip64_offset, _disks = ZIP64_LOCATOR.unpack_from(tail, locator)
+        record = reader.read(zip64_offset, ZIP64_EOCD.size)
+        if len(record) == ZIP64_EOCD.size and record[:4] == ZIP64_EOCD_SIGNATURE:
+            fields = ZIP64_EOCD.unpack(record)
+            entry_count, directory_size = fields[7], fields[8]
+            record_offset = zip64_offset
+
+    # Measured back from the record, so data prepended to the archive (self-extractors) does not matter
+    directory_start = record_offset - directory_size
+    if directory_start < 0:
+        raise _Malformed()
+    listing['entry_count'] = entry_count
+    if directory_start >= tail_start and record_offset <= tail_start + len(tail):
+        directory = tail[directory_start - tail_start:record_offset - tail_start]
+    else:
+        directory = reader.read(directory_start, directory_size)
+
+    local_offsets = set()
+    position = 0
+    while position + ZIP_CENTRAL_HEADER.size <= len(directory):
+        fields = ZIP_CENTRAL_HEADER.unpack_from(directory, position)
+        if fields[0] != ZIP_CENTRAL_SIGNATURE:
+            break
+        flags, compressed_size, uncompressed_size = fields[3], fields[8], fields[9]
+        name_length, extra_length, comment_length, local_offset = fields[10], fields[11], fields[12], fields[16]
+        name_start = position + ZIP_CENTRAL_HEADER.size
+        name = directory[name_start:name_start + name_length]
+        extra = directory[name_start + name_length:name_start + name_length + extra_length]
+        if 0xFFFFFFFF in (compressed_size, uncompressed_size, local_offset):
+            uncompressed_size, compressed_size, local_offset = _zip64_sizes(
+                extra, uncompressed_size, compressed_size, local_offset)
+
+        # Entries sharing one local header expand the same data many times over (overlapping zip bombs)
+        if local_offset in local_offsets:
+            listing['overlapping_entries'] = True
+        local_offsets.add(local_offset)
+        name = name.decode('utf-8' if flags & 0x800 else 'cp437', errors='replace')
+        if not _add_entry(listing, name, compressed_size, uncompressed_size, bool(flags & 0x1)):
+            return
+        position = name_start + name_length + extra_length + comment_length
+
+def _zip64_sizes(extra: bytes, uncompressed_size: int, compressed_size: int, local_offset: int) -> Tuple[int, int, int]:
+    """Replace the 0xFFFFFFFF placeholders with the values of the ZIP64 extra field"""
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, size = struct.unpack_from('<HH', extra, position)
+        if header_id == 0x0001:
+            values = iter(struct.unpack_from(f'<{min(size, 24) // 8}Q', extra, position + 4))
+            if uncompressed_size == 0xFFFFFFFF:
+                uncompressed_size = next(values, uncompressed_size)
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = next(values, compressed_size)
+            if local_offset == 0xFFFFFFFF:
+                local_offset = next(values, local_offset)
+            break
+        position += 4 + size
+    return uncompressed_size, compressed_size, local_offset
+
+def _inspect_rar(reader: _BoundedReader, listing: Dict):
+    signature = reader.read(0, len(RAR5_SIGNATURE))
+    if signature == RAR5_SIGNATURE:
+        _inspect_rar5(reader, listing)
+    elif signature.startswith(RAR4_SIGNATURE):
+        _inspect_rar4(reader, listing)
+    else:
+        raise _Malformed()
+
+def _vint(data: bytes, position: int) -> Tuple[int, int]:
+    """RAR5 variable-length integer: 7 bits per byte, high bit set on all but the last"""
+    value = 0
+    for shift in range(0, 70, 7):
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+    raise _Malformed()
+
+def _inspect_rar5(reader: _BoundedReader, listing: Dict):
+    position = len(RAR5_SIGNATURE)
+    while position < reader.size:
+        # CRC32, then the header size as a vint of up to 3 bytes (RAR_MAX_HEADER)
+        start = reader.read(position, 7)
+        header_size, header_start = _vint(start, 4)
+        if header_size == 0 or header_size > RAR_MAX_HEADER:
+            raise _Malformed()
+        block = start + reader.read(position + len(start), header_start + header_size - len(start))
+        if len(block) < header_start + header_size:
+            return
+        if zlib.crc32(block[4:header_start + header_size]) != struct.unpack_from('<I', block)[0]:
+            raise _Malformed()
+
+        header_type, cursor = _vint(block, header_start)
+        header_flags, cursor = _vint(block, cursor)
+        extra_size = data_size = 0
+        if header_flags & 0x1:
+            extra_size, cursor = _vint(block, cursor)
+        if header_flags & 0x2:
+            data_size, cursor = _vint(block, cursor)
+
+        if header_type == 4:
+            # Archive encryption header: every following header is encrypted, names included
+            listing['encrypted'] = listing['headers_encrypted'] = True
+            return
+        if header_type == 5:
+            return
+        if header_type == 2:
+            file_flags, cursor = _vint(block, cursor)
+            unpacked_size, cursor = _vint(block, cursor)
+            _attributes, cursor = _vint(block, cursor)
+            cursor += 4 * bool(file_flags & 0x2) + 4 * bool(file_flags & 0x4)
+            _compression, cursor = _vint(block, cursor)
+            _host_os, cursor = _vint(block, cursor)
+            name_length, cursor = _vint(block, cursor)
+            name = block[cursor:cursor + name_length].decode('utf-8', errors='replace')
+            encrypted = _rar5_encrypted(block, header_start + header_size - extra_size, header_start + header_size)
+            is_directory = file_flags & 0x1
+            if not is_directory and not _add_entry(listing, name, data_size,
+                                                   0 if file_flags & 0x8 else unpacked_size, encrypted):
+                return
+        position += header_start + header_size + data_size
+
+def _rar5_encrypted(block: bytes, start: int, end: int) -> bool:
+    """Whether a file header's extra area holds a file encryption record"""
+    while start < end:
+        size, cursor = _vint(block, start)
+        record_type, _cursor = _vint(block, cursor)
+        if record_type == 0x01:
+            return True
+        start = cursor + size
+    return False
+
+def _inspect_rar4(reader: _BoundedReader, listing: Dict):
+    position = len(RAR4_SIGNATURE)
+    while position + RAR4_BLOCK.size <= reader.size:
+        crc, block_type, flags, header_size = RAR4_BLOCK.unpack(reader.read(position, RAR4_BLOCK.size))
+        if header_size < RAR4_BLOCK.size:
+            raise _Malformed()
+        block = reader.read(position, header_size)
+        if len(block) < header_size:
+            return
+        # Comments and the old sub-blocks of RAR 1.5-2.x extend what the CRC covers, so only
+        # the archive and file headers without comments are checked
+        has_comment = flags & (0x02 if block_type == 0x73 else 0x08)
+        if block_type in (0x73, 0x74) and not has_comment and zlib.crc32(block[2:]) & 0xFFFF != crc:
+            raise _Malformed()
+
+        added_size = struct.unpack_from('<I', block, RAR4_BLOCK.size)[0] if flags & 0x8000 else 0
+        if block_type == 0x73 and flags & 0x0080:
+            # Archive header flag for encrypted block headers: names are not readable
+            listing['encrypted'] = listing['headers_encrypted'] = True
+            return
+        if block_type == 0x7B:
+            return
+        if block_type == 0x74:
+            packed_size, unpacked_size, _host, _crc, _time, _version, _method, name_length, _attributes = \
+                RAR4_FILE.unpack_from(block, RAR4_BLOCK.size)
+            name_start = RAR4_BLOCK.size + RAR4_FILE.size
+            if flags & 0x100:
+                high_packed, high_unpacked = struct.unpack_from('<II', block, name_start)
+                packed_size |= high_packed << 32
+                unpacked_size |= high_unpacked << 32
+                name_start += 8
+            name = _rar4_name(block[name_start:name_start + name_length])
+            added_size = packed_size
+            is_directory = flags & 0xE0 == 0xE0
+            if not is_directory and not _add_entry(listing, name, packed_size, unpacked_size, bool(flags & 0x4)):
+                return
+        position += header_size + added_size
+
+def _rar4_name(name: bytes) -> str:
+    # Unicode names are either UTF-8 or 'OEM name\0compressed UTF-16'; the OEM part keeps the extension
+    if b'\0' in name:
+        return name.split(b'\0', 1)[0].decode('cp437')
+    try:
+        return name.decode('utf-8')
+    except UnicodeDecodeError:
+        return name.decode('cp437')
+
+class _SevenZipHeader:
+    """Cursor over a 7z header database (7zFormat.txt), reading only what listing needs"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.position = 0
+
+    def byte(self) -> int:
+        value = self.data[self.position]
+        self.position += 1
+        return value
+
+    def take(self, length: int) -> bytes:
+        if self.position + length > len(self.data):
+            raise IndexError("7z header ends early")
+        value = self.data[self.position:self.position + length]
+        self.position += length
+        return value
+
+    def number(self) -> int:
+        """7z NUMBER: the leading one bits of the first byte count the extra bytes"""
+        first = self.byte()
+        mask = 0x80
+        value = 0
+        for index in range(8):
+            if not first & mask:
+                return value | ((first & (mask - 1)) << (8 * index))
+            value |= self.byte() << (8 * index)
+            mask >>= 1
+        return value
+
+    def count(self, limit: int = MAX_ENTRIES) -> int:
+        """A NUMBER that sizes a list or loop, checked before anything is allocated for it.
+
+        Each item takes at least one more header byte, so a count past the bytes left (or
+        past limit) comes from a hostile header rather than a real archive.
+        """
+        value = self.number()
+        if value > limit or value > len(self.data) - self.position:
+            raise _Malformed()
+        return value
+
+    def bits(self, count: int) -> List[bool]:
+        all_defined = self.byte()
+        left = len(self.data) - self.position
+        # All defined means a 4-byte digest per item follows; otherwise a bit per item does
+        if count > (left // 4 if all_defined else left * 8):
+            raise _Malformed()
+        if all_defined:
+            return [True] * count
+        field = self.take((count + 7) // 8)
+        return [bool(field[index >> 3] & (0x80 >> (index & 7))) for index in range(count)]
+
+    def skip_digests(self, count: int):
+        self.take(4 * sum(self.bits(count)))
+
+    def streams_info(self) -> Dict:
+        """Pack sizes, folder unpack sizes and whether any folder is AES-encrypted"""
+        info = {'packed': 0, 'unpacked': 0, 'encrypted': False}
+        folders = []
+        while True:
+            section = self.byte()
+            if section == 0x00:
+                return info
+            if section == 0x06:
+                self.number()
+                stream_count = self.count()
+                while True:
+                    field = self.byte()
+                    if field == 0x00:
+                        break
+                    if field == 0x09:
+                        info['packed'] = sum(self.number() for _ in range(stream_count))
+                    elif field == 0x0A:
+                        self.skip_digests(stream_count)
+                    else:
+                        raise _Malformed()
+            elif section == 0x07:
+                folders = self.unpack_info(info)
+            elif section == 0x08:
+                self.substreams_info(folders)
+            else:
+                raise _Malformed()
+
+    def unpack_info(self, info: Dict) -> List[Dict]:
+        if self.byte() != 0x0B:
+            raise _Malformed()
+        folder_count = self.count()
+        if self.byte() != 0:
+            # Folders stored in an additional stream, which would need decompressing
+            raise _Malformed()
+        folders = [self.folder(info) for _ in range(folder_count)]
+        if self.byte() != 0x0C:
+            raise _Malformed()
+        for folder in folders:
+            sizes = [self.number() for _ in range(folder['outputs'])]
+            # The folder's result is the one output no bind pair feeds into another coder
+            info['unpacked'] += sum(size for index, size in enumerate(sizes) if index not in folder['bound'])
+        while True:
+            field = self.byte()
+            if field == 0x00:
+                return folders
+            if field == 0x0A:
+                folder_crcs = self.bits(len(folders))
+                self.take(4 * sum(folder_crcs))
+                for folder, has_crc in zip(folders, folder_crcs):
+                    folder['crc'] = has_crc
+            else:
+                raise _Malformed()
+
+    def folder(self, info: Dict) -> Dict:
+        inputs = outputs = 0
+        for _ in range(self.count()):
+            flags = self.byte()
+            if self.take(flags & 0x0F) == SEVEN_ZIP_AES:
+                info['encrypted'] = True
+            if flags & 0x10:
+                inputs += self.count()
+                outputs += self.count()
+            else:
+                inputs += 1
+                outputs += 1
+            if flags & 0x20:
+                self.take(self.number())
+        bound = set()
+        for _ in range(outputs - 1):
+            self.number()
+            bound.add(self.number())
+        packed_streams = inputs - (outputs - 1)
+        if packed_streams > 1:
+            for _ in range(packed_streams):
+                self.number()
+        return {'outputs': outputs, 'bound': bound, 'crc': False}
+
+    def substreams_info(self, folders: List[Dict]):
+        counts = [1] * len(folders)
+        while True:
+            field = self.byte()
+            if field == 0x00:
+                return
+            if field == 0x0D:
+                # Files per solid folder, which can pass MAX_ENTRIES in a real archive
+                counts = [self.count(limit=len(self.data)) for _ in folders]
+            elif field == 0x09:
+                for count in counts:
+                    for _ in range(count - 1):
+                        self.number()
+            elif field == 0x0A:
+                self.skip_digests(sum(count for count, folder in zip(counts, folders)
+                                      if not (count == 1 and folder['crc'])))
+            else:
+                raise _Malformed()
+
+    def file_names(self, listing: Dict) -> List[str]:
+        # Real archives can list more than MAX_ENTRIES files; the listing itself stops there
+        file_count = self.count(limit=len(self.data))
+        names = []
+        while True:
+            field = self.byte()
+            if field == 0x00:
+                break
+            data = self.take(self.number())
+            if field == 0x11 and data[:1] == b'\x00':
+                names = data[1:].decode('utf-16-le', errors='replace').split('\x00')[:file_count]
+        listing['entry_count'] = file_count
+        return names
+
+def _inspect_7z(reader: _BoundedReader, listing: Dict):
+    start = reader.read(0, SEVEN_ZIP_START.size)
+    if len(start) < SEVEN_ZIP_START.size:
+        raise _Malformed()
+    _signature, _major, _minor, start_crc, next_offset, next_size, next_crc = SEVEN_ZIP_START.unpack(start)
+    if zlib.crc32(start[12:]) != start_crc:
+        raise _Malformed()
+    if next_size > reader.budget:
+        listing['truncated'] = True
+        return
+    data = reader.read(SEVEN_ZIP_START.size + next_offset, next_size)
+    if len(data) < next_size or zlib.crc32(data) != next_crc:
+        raise _Malformed()
+    if not data:
+        return
+
+    header = _SevenZipHeader(data)
+    kind = header.byte()
+    if kind == 0x17:
+        # Compressed header database: names need decompressing, but an AES coder still shows encryption
+        info = header.streams_info()
+        listing['encrypted'] = listing['headers_encrypted'] = info['encrypted']
+        listing['truncated'] = True
+        return
+    if kind != 0x01:
+        raise _Malformed()
+
+    info = {'packed': 0, 'unpacked': 0, 'encrypted': False}
+    names = []
+    while True:
+        section = header.byte()
+        if section == 0x00:
+            break
+        if section == 0x02:
+            while header.byte() != 0x00:
+                header.take(header.number())
+        elif section in (0x03, 0x04):
+            streams = header.streams_info()
+            if section == 0x04:
+                info = streams
+        elif section == 0x05:
+            names = header.file_names(listing)
+        else:
+            raise _Malformed()
+
+    for name in names:
+        if not _add_entry(listing, name, 0, 0, False):
+            break
+    listing['encrypted'] = info['encrypted']
+    listing['compressed_size'] = info['packed']
+    listing['uncompressed_size'] = info['unpacked']
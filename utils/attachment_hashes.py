@@ -0,0 +1,57 @@
+import hashlib
+from typing import Dict
+
+from utils.mime_payload import MIMEPayload
+
+# TLSH needs this much input before it produces a digest
+TLSH_MIN_SIZE = 50
+
+class AttachmentHasher:
+    """SHA-256 of an attachment, plus ssdeep and TLSH fuzzy hashes when asked for and installed.
+
+    Every hash is updated with the same decoded chunk as the payload is streamed, so an
+    attachment is decoded once and never held whole in memory.
+    """
+
+    def __init__(self, fuzzy: bool = False):
+        self._sha256 = hashlib.sha256()
+        self._fuzzy = {}
+        if fuzzy:
+            # Both are optional C extensions; whichever is missing is simply left out
+            try:
+                import ssdeep
+                self._fuzzy['ssdeep'] = ssdeep.Hash()
+            except ImportError:
+                pass
+            try:
+                import tlsh
+                self._fuzzy['tlsh'] = tlsh.Tlsh()
+            except ImportError:
+                pass
+        self.size = 0
+
+    def update(self, chunk: bytes):
+        self._sha256.update(chunk)
+        for fuzzy_hash in self._fuzzy.values():
+            fuzzy_hash.update(chunk)
+        self.size += len(chunk)
+
+    def hexdigests(self) -> Dict[str, str]:
+        digests = {'sha256': self._sha256.hexdigest()}
+        if 'ssdeep' in self._fuzzy:
+            digests['ssdeep'] = self._fuzzy['ssdeep'].digest()
+        if 'tlsh' in self._fuzzy and self.size >= TLSH_MIN_SIZE:
+            tlsh_hash = self._fuzzy['tlsh']
+            tlsh_hash.final()
+            digest = tlsh_hash.hexdigest()
+            # Input without enough variety has no TLSH digest
+            if digest and digest != 'TNULL':
+                digests['tlsh'] = digest
+        return digests
+
+def hash_payload(payload: MIMEPayload, fuzzy: bool = False) -> Dict[str, str]:
+    """Hash an attachment while streaming the decode of its payload"""
+    hasher = AttachmentHasher(fuzzy)
+    for chunk in payload.iter_decoded():
+        hasher.update(chunk)
+    return hasher.hexdigests()
@@ -0,0 +1,157 @@
+import hashlib
+import math
+import mmap
+import struct
+from typing import Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from utils.public_suffix import split_host
+
+MAGIC = b'PHBL'
+VERSION = 1
+
+# magic, version, hash count, bit count, entry count, digest of all entries
+HEADER = struct.Struct('<4sHHQQ32s')
+HEADER_SIZE = 64
+DIGEST_SIZE = 8
+
+# The two 64-bit Bloom hashes come from the digest bytes after the stored prefix
+BLOOM_HASHES = struct.Struct('<QQ')
+
+def normalize_domain(domain: str) -> str:
+    return domain.strip().lower().strip('.')
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL: lowercase scheme and host, no fragment, '/' for an empty path"""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    query = f"?{parts.query}" if parts.query else ''
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path or '/'}{query}"
+
+def entry_hash(kind: bytes, value: str) -> bytes:
+    """SHA-256 of a typed entry; b'd' for domains, b'u' for URLs"""
+    return hashlib.sha256(kind + b':' + value.encode('utf-8', errors='surrogatepass')).digest()
+
+def _bloom_positions(digest: bytes, hash_count: int, bit_count: int) -> List[int]:
+    """Bit positions by double hashing (Kirsch-Mitzenmacher) on two 64-bit slices of the digest"""
+    h1, h2 = BLOOM_HASHES.unpack_from(digest, DIGEST_SIZE)
+    h2 |= 1
+    return [(h1 + i * h2) % bit_count for i in range(hash_count)]
+
+class Blocklist:
+    """Known-bad URLs and domains in a memory-mapped Bloom filter with an exact fallback.
+
+    The file holds a Bloom filter followed by the sorted 64-bit digests of every entry.
+    A lookup probes the filter first, which answers most clean URLs in a few bit tests,
+    and binary-searches the digests only for positives, so filter false positives never
+    surface as findings. The file is mapped read-only: forked workers share its pages,
+    and resident memory stays flat however large the feed is.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.hash_count, self.bit_count, self.entry_count, checksum = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a blocklist file (version {VERSION})")
+        self.checksum = checksum.hex()
+        self._bloom_offset = HEADER_SIZE
+        self._digest_offset = HEADER_SIZE + self._bloom_bytes(self.bit_count)
+
+    @staticmethod
+    def _bloom_bytes(bit_count: int) -> int:
+        # Padded to whole digests so the sorted array stays aligned
+        return -(-bit_count // (8 * DIGEST_SIZE)) * DIGEST_SIZE
+
+    @classmethod
+    def build(cls, path: str, domains: Iterable[str] = (), urls: Iterable[str] = (),
+              false_positive_rate: float = 0.001) -> int:
+        """Write a blocklist file for the given domains and URLs; returns the entry count"""
+        digests = set()
+        for domain in domains:
+            domain = normalize_domain(domain)
+            if domain:
+                digests.add(entry_hash(b'd', domain))
+        for url in urls:
+            url = url.strip()
+            if url:
+                digests.add(entry_hash(b'u', normalize_url(url)))
+        digests = sorted(digests)
+
+        entry_count = len(digests)
+        bit_count = max(64, math.ceil(-max(entry_count, 1) * math.log(false_positive_rate) / math.log(2) ** 2))
+        hash_count = max(1, round(bit_count / max(entry_count, 1) * math.log(2)))
+        bloom = bytearray(cls._bloom_bytes(bit_count))
+        checksum = hashlib.sha256()
+        for digest in digests:
+            for position in _bloom_positions(digest, hash_count, bit_count):
+                bloom[position >> 3] |= 1 << (position & 7)
+            checksum.update(digest)
+
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, hash_count, bit_count, entry_count, checksum.digest()).ljust(HEADER_SIZE, b'\0'))
+            f.write(bloom)
+            for digest in digests:
+                f.write(digest[:DIGEST_SIZE])
+        return entry_count
+
+    def _contains(self, digest: bytes) -> bool:
+        data = self._map
+        offset = self._bloom_offset
+        bit_count = self.bit_count
+        h1, h2 = BLOOM_HASHES.unpack_from(digest, DIGEST_SIZE)
+        h2 |= 1
+        # Same positions as _bloom_positions, generated lazily: most misses stop at the first probe
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % bit_count
+            if not data[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+
+        # Possible hit: confirm against the sorted digest array
+        key = digest[:DIGEST_SIZE]
+        low, high = 0, self.entry_count
+        base = self._digest_offset
+        while low < high:
+            middle = (low + high) // 2
+            start = base + middle * DIGEST_SIZE
+            found = data[start:start + DIGEST_SIZE]
+            if found == key:
+                return True
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def contains_url(self, url: str) -> bool:
+        return self._contains(entry_hash(b'u', normalize_url(url)))
+
+    def match_domain(self, host: str) -> Optional[str]:
+        """The listed domain host falls under, checking the host and its parents up to the registrable domain"""
+        host = normalize_domain(host)
+        if not host:
+            return None
+        _subdomain, registrable, _suffix = split_host(host)
+        labels = host.split('.')
+        # A listed public suffix would block everything under it, so stop at the registrable domain
+        depth = len(labels) - (registrable.count('.') + 1) if registrable else 0
+        for start in range(depth + 1):
+            candidate = '.'.join(labels[start:])
+            if self._contains(entry_hash(b'd', candidate)):
+                return candidate
+        return None
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
@@ -0,0 +1,212 @@
+import json
+import random
+import threading
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from utils import patterns
+
+# Mersenne prime for the universal hash h(x) = (a * x + b) mod P
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = 0xFFFFFFFF
+
+# Words at least this long that contain a digit are treated as tracking tokens
+TOKEN_MIN_LENGTH = 12
+
+class CampaignIndex:
+    """Group near-duplicate messages into campaigns with MinHash signatures and LSH banding.
+
+    A message is shingled into overlapping word n-grams of its normalized body plus its URL
+    hosts and paths, and summarized as a one-permutation MinHash signature. The signature is cut into bands;
+    two messages sharing any band become candidates, and the candidate whose signature agrees
+    most is accepted as the same campaign when the estimated Jaccard similarity reaches the
+    threshold. Only one representative signature is kept per campaign, in a flat array.
+
+    The verdict of a campaign's first scored message is kept with a context string naming
+    what the signature does not cover (sender domain, attachments, authentication), and is
+    only handed out again for a message with the same context.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.7,
+                 shingle_size: int = 4, seed: int = 1, reuse_verdicts: bool = True):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.reuse_verdicts = reuse_verdicts
+
+        rng = random.Random(seed)
+        self._a = rng.randrange(1, MERSENNE_PRIME)
+        self._b = rng.randrange(0, MERSENNE_PRIME)
+        # Fixed probe order per bin for filling empty bins during densification
+        self._probes = [rng.sample(range(num_perm), num_perm) for _ in range(num_perm)]
+
+        # Campaign data lives in flat arrays indexed by campaign id
+        self._signatures = array('I')
+        self._sizes = array('I')
+        self._verdicts: List[Optional[str]] = []
+        self._contexts: List[Optional[str]] = []
+        # One dict per band: band hash -> campaign id (a bare int until a second id arrives)
+        self._buckets: List[Dict[int, object]] = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def normalize_text(self, text: str) -> List[str]:
+        """Lowercase words with numbers and tracking tokens folded to placeholders"""
+        text = patterns.TEXT_URL.sub(' ', text)
+        words = []
+        for word in patterns.WORD.findall(text.lower()):
+            if len(word) >= TOKEN_MIN_LENGTH and any(char.isdigit() for char in word):
+                word = '*'
+            else:
+                word = patterns.DIGIT_RUN.sub('0', word)
+            words.append(word)
+        return words
+
+    def shingles(self, text: str, html: str = '', urls: Iterable[str] = ()) -> set:
+        """Hashed body word n-grams plus URL host/path features"""
+        if not text.strip() and html:
+            text = patterns.HTML_TAG.sub(' ', html)
+
+        words = self.normalize_text(text)
+        size = self.shingle_size
+        features = {' '.join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1 if words else 0))}
+
+        for url in urls:
+            try:
+                parts = urlsplit(url)
+            except ValueError:
+                continue
+            path = '/'.join(
+                '*' if len(segment) >= TOKEN_MIN_LENGTH and any(char.isdigit() for char in segment)
+                else patterns.DIGIT_RUN.sub('0', segment)
+                for segment in parts.path.lower().split('/')
+            )
+            features.add('url:' + parts.netloc.lower() + path)
+
+        return {zlib.crc32(feature.encode('utf-8', errors='surrogatepass')) for feature in features}
+
+    def signature(self, shingles: set) -> Optional[array]:
+        """One-permutation MinHash signature of a shingle set, or None for an empty message.
+
+        Each shingle is hashed once and lands in one of num_perm bins that keeps its minimum,
+        which costs O(shingles) instead of O(shingles * num_perm). Bins left empty copy the
+        value of the first non-empty bin in their own fixed probe order (optimal densification),
+        so two similar sets still agree bin by bin.
+        """
+        if not shingles:
+            return None
+        num_perm = self.num_perm
+        a, b, prime = self._a, self._b, MERSENNE_PRIME
+        bins = [None] * num_perm
+        for x in shingles:
+            hashed = (a * x + b) % prime
+            index = hashed % num_perm
+            value = (hashed // num_perm) & MAX_HASH
+            current = bins[index]
+            if current is None or value < current:
+                bins[index] = value
+
+        if None in bins:
+            filled = list(bins)
+            for index, value in enumerate(bins):
+                if value is None:
+                    for probe in self._probes[index]:
+                        if bins[probe] is not None:
+                            filled[index] = bins[probe]
+                            break
+            bins = filled
+        return array('I', bins)
+
+    def _band_keys(self, signature: array) -> List[int]:
+        rows = self.rows
+        return [hash(tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def _similarity(self, signature: array, campaign_id: int) -> float:
+        """Estimated Jaccard similarity: the fraction of agreeing MinHash values"""
+        start = campaign_id * self.num_perm
+        stored = self._signatures[start:start + self.num_perm]
+        return sum(1 for mine, theirs in zip(signature, stored) if mine == theirs) / self.num_perm
+
+    def assign(self, signature: array) -> Tuple[int, int, float]:
+        """Put a message in its campaign, creating one if needed.
+
+        Returns (campaign id, campaign size including this message, similarity to the campaign).
+        """
+        keys = self._band_keys(signature)
+        with self._lock:
+            candidates = set()
+            for bucket, key in zip(self._buckets, keys):
+                found = bucket.get(key)
+                if found is None:
+                    continue
+                if isinstance(found, int):
+                    candidates.add(found)
+                else:
+                    candidates.update(found)
+
+            best_id, best_similarity = -1, 0.0
+            for candidate in candidates:
+                similarity = self._similarity(signature, candidate)
+                if similarity > best_similarity:
+                    best_id, best_similarity = candidate, similarity
+
+            if best_id >= 0 and best_similarity >= self.threshold:
+                self._sizes[best_id] += 1
+                return best_id, self._sizes[best_id], best_similarity
+
+            campaign_id = len(self._sizes)
+            self._signatures.extend(signature)
+            self._sizes.append(1)
+            self._verdicts.append(None)
+            self._contexts.append(None)
+            for bucket, key in zip(self._buckets, keys):
+                existing = bucket.get(key)
+                if existing is None:
+                    bucket[key] = campaign_id
+                elif isinstance(existing, int):
+                    bucket[key] = [existing, campaign_id]
+                else:
+                    existing.append(campaign_id)
+            return campaign_id, 1, 1.0
+
+    def classify(self, text: str, html: str = '', urls: Iterable[str] = ()) -> Optional[Tuple[int, int, float]]:
+        """Shingle, sign and assign a message; None when there is nothing to compare"""
+        signature = self.signature(self.shingles(text, html, urls))
+        return self.assign(signature) if signature is not None else None
+
+    def size(self, campaign_id: int) -> int:
+        return self._sizes[campaign_id]
+
+    def verdict(self, campaign_id: int, context: str = '') -> Optional[Dict]:
+        """The scored result recorded for a campaign, as a fresh copy, if it was scored in this context"""
+        with self._lock:
+            encoded = self._verdicts[campaign_id]
+            if encoded is None or self._contexts[campaign_id] != context:
+                return None
+        return json.loads(encoded)
+
+    def set_verdict(self, campaign_id: int, result: Dict, context: str = ''):
+        """Record the scored result of a campaign's first analyzed message"""
+        with self._lock:
+            if self._verdicts[campaign_id] is None:
+                self._verdicts[campaign_id] = json.dumps(result, default=str)
+                self._contexts[campaign_id] = context
+
+    def stats(self) -> Dict:
+        with self._lock:
+            campaigns = len(self._sizes)
+            messages = sum(self._sizes)
+            return {
+                'campaigns': campaigns,
+                'messages': messages,
+                'largest_campaign': max(self._sizes) if campaigns else 0,
+                'signature_bytes': self._signatures.itemsize * len(self._signatures)
+            }
+
+    def __len__(self) -> int:
+        return len(self._sizes)
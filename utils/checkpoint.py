@@ -0,0 +1,85 @@
+import json
+import os
+from typing import Dict, Optional, Set
+
+class Checkpoint:
+    """Progress of a batch scan, saved durably so a restarted run can continue where it stopped.
+
+    Progress is the set of messages already scored, named by keys that stay put when the
+    source changes between runs: the Maildir key, the .eml path relative to the directory,
+    or the byte offset of an mbox message's From_ line. Keys are appended to a journal next
+    to the checkpoint ('<path>.keys'). Each save fsyncs the journal and records its length,
+    so keys written after the last save, whose results were truncated from the output, are
+    dropped on resume. The checkpoint itself is written to a temporary file, fsynced, renamed
+    over the old one and the directory fsynced, so a crash leaves either the old or the new
+    checkpoint, never a torn one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.journal_path = f"{path}.keys"
+        self._journal = None
+
+    def load(self) -> Optional[Dict]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def start(self, state: Optional[Dict] = None) -> Set[str]:
+        """Open the journal after the keys state records and return those keys"""
+        self.close()
+        recorded = state['keys_offset'] if state else 0
+        try:
+            self._journal = open(self.journal_path, 'r+b')
+        except FileNotFoundError:
+            if recorded:
+                raise ValueError(f"Checkpoint {self.path} has lost its key journal {self.journal_path}") from None
+            self._journal = open(self.journal_path, 'w+b')
+        data = self._journal.read(recorded)
+        if len(data) < recorded:
+            raise ValueError(f"Key journal {self.journal_path} is shorter than checkpoint {self.path} records")
+        self._journal.truncate(recorded)
+        self._journal.seek(recorded)
+        return {json.loads(line) for line in data.splitlines()}
+
+    def record(self, key: str):
+        """Note a scored message; durable with the next save"""
+        if self._journal is None:
+            self.start()
+        self._journal.write(json.dumps(key).encode('utf-8') + b'\n')
+
+    def save(self, state: Dict):
+        if self._journal is None:
+            self.start()
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        state = {**state, 'keys_offset': self._journal.tell()}
+
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self._sync_directory()
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _sync_directory(self):
+        """Make the rename itself durable"""
+        try:
+            directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(directory)
+        except OSError:
+            # Some filesystems do not support fsync on directories
+            pass
+        finally:
+            os.close(directory)
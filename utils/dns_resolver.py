@@ -0,0 +1,214 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from utils.cache import LRUCache
+
+class DNSError(Exception):
+    """A temporary DNS failure (timeout, SERVFAIL); callers should treat it as 'try again later'"""
+
+class Resolver:
+    """Answer (name, record type) queries with a list of record strings and a TTL.
+
+    TXT answers join their character-strings, MX answers read '<preference> <host>',
+    A/AAAA answers are address strings. Names are compared without a trailing dot.
+    A name with no records answers ([], ttl); a failed lookup raises DNSError.
+    """
+
+    def resolve(self, name: str, rdtype: str) -> Tuple[List[str], int]:
+        raise NotImplementedError
+
+    def query(self, name: str, rdtype: str) -> List[str]:
+        return self.resolve(name, rdtype)[0]
+
+class ZoneFileResolver(Resolver):
+    """Serve answers from a BIND-style zone file, for offline use and tests.
+
+    Supports $ORIGIN and $TTL, '@', relative names, omitted owner names, ';' comments,
+    quoted TXT strings and parenthesised records spanning several lines.
+    """
+
+    DEFAULT_TTL = 3600
+    _TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|(\S+)')
+
+    def __init__(self, text: str = '', origin: str = '.'):
+        self.records: Dict[Tuple[str, str], List[str]] = {}
+        self.ttls: Dict[Tuple[str, str], int] = {}
+        if text:
+            self.load(text, origin)
+
+    @classmethod
+    def from_file(cls, path: str, origin: str = '.') -> 'ZoneFileResolver':
+        with open(path, encoding='utf-8') as f:
+            return cls(f.read(), origin)
+
+    def add(self, name: str, rdtype: str, value: str, ttl: int = DEFAULT_TTL):
+        key = (name.lower().rstrip('.'), rdtype.upper())
+        self.records.setdefault(key, []).append(value)
+        self.ttls[key] = min(self.ttls.get(key, ttl), ttl)
+
+    def load(self, text: str, origin: str = '.'):
+        """Parse zone file text into the record table"""
+        origin = origin.rstrip('.').lower()
+        default_ttl = self.DEFAULT_TTL
+        owner = origin
+
+        for line in self._logical_lines(text):
+            tokens = [(match.group(1) is not None, match.group(1) if match.group(1) is not None else match.group(2))
+                      for match in self._TOKEN.finditer(line)]
+            if not tokens:
+                continue
+
+            first = tokens[0][1]
+            if first.upper() == '$ORIGIN':
+                origin = tokens[1][1].rstrip('.').lower()
+                continue
+            if first.upper() == '$TTL':
+                default_ttl = int(tokens[1][1])
+                continue
+
+            # A line starting with whitespace continues the previous owner name
+            if not line[:1].isspace():
+                owner = self._absolute(first, origin)
+                tokens = tokens[1:]
+
+            ttl = default_ttl
+            while tokens and not tokens[0][0]:
+                word = tokens[0][1].upper()
+                if word.isdigit():
+                    ttl = int(word)
+                elif word in ('IN', 'CH', 'HS'):
+                    pass
+                else:
+                    break
+                tokens = tokens[1:]
+            if not tokens:
+                continue
+
+            rdtype = tokens[0][1].upper()
+            data = tokens[1:]
+            if rdtype == 'TXT':
+                value = ''.join(self._unescape(text) if quoted else text for quoted, text in data)
+            elif rdtype in ('MX', 'SRV'):
+                preference = ' '.join(text for _quoted, text in data[:-1])
+                value = f"{preference} {self._absolute(data[-1][1], origin)}".strip()
+            elif rdtype in ('CNAME', 'NS', 'PTR'):
+                value = self._absolute(data[0][1], origin)
+            else:
+                value = ' '.join(text for _quoted, text in data)
+            self.add(owner, rdtype, value, ttl)
+
+    @staticmethod
+    def _logical_lines(text: str):
+        """Strip comments and join parenthesised records onto one line"""
+        buffered = ''
+        depth = 0
+        for raw_line in text.splitlines():
+            line, in_quote = [], False
+            for char in raw_line:
+                if char == '"':
+                    in_quote = not in_quote
+                elif char == ';' and not in_quote:
+                    break
+                elif char in '()' and not in_quote:
+                    depth += 1 if char == '(' else -1
+                    char = ' '
+                line.append(char)
+            buffered += ''.join(line) if not buffered else ' ' + ''.join(line).strip()
+            if depth <= 0:
+                if buffered.strip():
+                    yield buffered
+                buffered, depth = '', 0
+        if buffered.strip():
+            yield buffered
+
+    @staticmethod
+    def _unescape(text: str) -> str:
+        return re.sub(r'\\(.)', r'\1', text)
+
+    @staticmethod
+    def _absolute(name: str, origin: str) -> str:
+        if name == '@':
+            return origin
+        if name.endswith('.'):
+            return name.rstrip('.').lower()
+        return f"{name}.{origin}".lower() if origin else name.lower()
+
+    def resolve(self, name: str, rdtype: str) -> Tuple[List[str], int]:
+        key = (name.lower().rstrip('.'), rdtype.upper())
+        records = self.records.get(key)
+        if records is None:
+            return [], self.DEFAULT_TTL
+        return list(records), self.ttls[key]
+
+class SystemResolver(Resolver):
+    """Query real DNS through dnspython"""
+
+    def __init__(self, timeout: float = 3.0, nameservers: Optional[List[str]] = None, port: int = 53,
+                 negative_ttl: int = 300):
+        # Imported on first use so the rest of the pipeline never pays for it
+        import dns.resolver
+        self._dns = dns
+        self._resolver = dns.resolver.Resolver(configure=not nameservers)
+        self._resolver.lifetime = timeout
+        if nameservers:
+            self._resolver.nameservers = nameservers
+        self._resolver.port = port
+        self.negative_ttl = negative_ttl
+
+    def resolve(self, name: str, rdtype: str) -> Tuple[List[str], int]:
+        dns = self._dns
+        try:
+            answer = self._resolver.resolve(name, rdtype)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return [], self.negative_ttl
+        except (dns.resolver.NoNameservers, dns.exception.Timeout) as e:
+            raise DNSError(f"{name} {rdtype}: {e}")
+        except dns.exception.DNSException as e:
+            raise DNSError(f"{name} {rdtype}: {e}")
+
+        records = []
+        for rdata in answer:
+            if rdtype.upper() == 'TXT':
+                records.append(b''.join(rdata.strings).decode('utf-8', errors='replace'))
+            elif rdtype.upper() == 'MX':
+                records.append(f"{rdata.preference} {rdata.exchange.to_text().rstrip('.').lower()}")
+            else:
+                records.append(rdata.to_text().rstrip('.'))
+        return records, answer.rrset.ttl
+
+class CachingResolver(Resolver):
+    """LRU cache in front of another resolver that keeps every answer for its own TTL"""
+
+    _MISSING = object()
+
+    def __init__(self, backend: Resolver, max_size: int = 100000, min_ttl: int = 60,
+                 max_ttl: int = 86400, error_ttl: int = 30):
+        self.backend = backend
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.error_ttl = error_ttl
+        self._cache = LRUCache(max_size=max_size)
+
+    def resolve(self, name: str, rdtype: str) -> Tuple[List[str], int]:
+        key = (name.lower().rstrip('.'), rdtype.upper())
+        cached = self._cache.get(key, self._MISSING)
+        if cached is not self._MISSING:
+            if isinstance(cached, DNSError):
+                raise cached
+            return cached
+
+        try:
+            records, ttl = self.backend.resolve(*key)
+        except DNSError as e:
+            # Briefly remember failures so a dead nameserver is not hammered per message
+            self._cache.set(key, e, ttl=self.error_ttl)
+            raise
+        ttl = max(self.min_ttl, min(ttl, self.max_ttl))
+        self._cache.set(key, (records, ttl), ttl=ttl)
+        return records, ttl
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+    def clear(self):
+        self._cache.clear()
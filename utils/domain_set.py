@@ -0,0 +1,99 @@
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+class DomainSet:
+    """Set of domains matched by exact label suffix, built to hold feeds of 100k+ entries.
+
+    Entries form a reversed-label trie whose nodes are hashed by their full suffix: 'bit.ly'
+    adds the nodes 'ly' (interior) and 'bit.ly' (entry). A host is matched by walking its
+    suffixes from the top-level label down, one dict lookup per label, and stops as soon
+    as a suffix is not a node. 'bit.ly' therefore matches 'bit.ly' and 'x.bit.ly' but
+    never 'notbit.ly', and 'tk' (or '.tk') matches every host under the tk TLD.
+    """
+
+    def __init__(self, domains: Iterable[str] = ()):
+        # Suffix -> True for entries, False for interior nodes
+        self._nodes: Dict[str, bool] = {}
+        self._count = 0
+        self._fingerprint: Optional[str] = None
+        self.update(domains)
+
+    @classmethod
+    def from_file(cls, path: str, extra_domains: Iterable[str] = ()) -> 'DomainSet':
+        """Build a set from a file with one domain per line, plus any extra domains"""
+        domains = cls(extra_domains)
+        domains.update(cls.read_domains(path))
+        return domains
+
+    @staticmethod
+    def read_domains(path: str) -> List[str]:
+        """Read one domain per line, skipping blank lines and # comments.
+
+        Hosts-file lines ('0.0.0.0 example.com') are accepted too; the last field is used.
+        """
+        domains = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                fields = line.split('#', 1)[0].split()
+                if fields:
+                    domains.append(fields[-1])
+        return domains
+
+    @staticmethod
+    def normalize(domain: str) -> str:
+        return domain.strip().lower().strip('.')
+
+    def add(self, domain: str):
+        """Add one domain or TLD; every host under it will match"""
+        domain = self.normalize(domain)
+        if not domain or self._nodes.get(domain):
+            return
+        nodes = self._nodes
+        position = domain.rfind('.')
+        while position >= 0:
+            nodes.setdefault(domain[position + 1:], False)
+            position = domain.rfind('.', 0, position)
+        nodes[domain] = True
+        self._count += 1
+        self._fingerprint = None
+
+    def update(self, domains: Iterable[str]):
+        for domain in domains:
+            self.add(domain)
+
+    def match(self, host: str) -> Optional[str]:
+        """The entry host falls under (the shortest, if several do), or None"""
+        if not host:
+            return None
+        host = host.lower().rstrip('.')
+        nodes = self._nodes
+        position = host.rfind('.')
+        while True:
+            suffix = host[position + 1:]
+            state = nodes.get(suffix)
+            if state is None:
+                return None
+            if state:
+                return suffix
+            if position < 0:
+                return None
+            position = host.rfind('.', 0, position)
+
+    def __contains__(self, host: str) -> bool:
+        return self.match(host) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """Entries in the order they were added"""
+        return (suffix for suffix, is_entry in self._nodes.items() if is_entry)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def fingerprint(self) -> str:
+        """Stable digest of the entries, for versioning results computed against them"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for domain in sorted(self):
+                digest.update(domain.encode('utf-8') + b'\n')
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
@@ -0,0 +1,574 @@
+import base64
+import hashlib
+import ipaddress
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils import patterns
+from utils.dns_resolver import DNSError, Resolver
+from utils.public_suffix import registrable_domain
+
+# DER-encoded DigestInfo prefixes for PKCS#1 v1.5 signatures (RFC 8017, section 9.2)
+DIGEST_INFO_PREFIXES = {
+    'sha256': bytes.fromhex('3031300d060960864801650304020105000420'),
+    'sha1': bytes.fromhex('3021300906052b0e03021a05000414')
+}
+
+# Hops from these ranges are internal relays, not the client that delivered the message
+INTERNAL_NETWORKS = [ipaddress.ip_network(network) for network in (
+    '10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '100.64.0.0/10', '127.0.0.0/8', '169.254.0.0/16',
+    '::1/128', 'fc00::/7', 'fe80::/10'
+)]
+
+class SPFPermError(Exception):
+    """The SPF record is broken or exceeds the lookup limits (result 'permerror')"""
+
+def split_message(raw: bytes) -> Tuple[List[Tuple[str, bytes]], bytes]:
+    """Split a raw message into (header name, raw header field) pairs and the body.
+
+    Line endings are normalized to CRLF, as DKIM canonicalization requires. Each raw field
+    keeps its name, folding and trailing CRLF exactly as received.
+    """
+    if b'\r\n' not in raw:
+        raw = raw.replace(b'\n', b'\r\n')
+
+    separator = raw.find(b'\r\n\r\n')
+    if separator == -1:
+        head, body = raw, b''
+    else:
+        head, body = raw[:separator + 2], raw[separator + 4:]
+
+    lines = head.split(b'\r\n')
+    if not lines[-1]:
+        lines.pop()
+
+    fields: List[Tuple[str, bytes]] = []
+    for line in lines:
+        if line[:1] in (b' ', b'\t') and fields:
+            name, field = fields[-1]
+            fields[-1] = (name, field + line + b'\r\n')
+        elif b':' in line:
+            name = line.split(b':', 1)[0].strip().decode('ascii', errors='replace').lower()
+            fields.append((name, line + b'\r\n'))
+    return fields, body
+
+def header_value(field: bytes) -> str:
+    """Unfolded text value of a raw header field"""
+    value = field.split(b':', 1)[1]
+    return patterns.FOLDING_WHITESPACE.sub(rb'\1', value).strip().decode('utf-8', errors='replace')
+
+def address_domain(value: str) -> str:
+    """Domain of the first address in a From/Return-Path style header value"""
+    match = patterns.ANGLE_ADDRESS.search(value)
+    address = match.group(1) if match else value
+    return address.rpartition('@')[2].strip().strip('>').lower().rstrip('.')
+
+def organizational_domain(domain: str) -> str:
+    """Organizational domain (RFC 7489, section 3.2): the registrable domain per the Public Suffix List"""
+    domain = domain.lower().rstrip('.')
+    return registrable_domain(domain) or domain
+
+def received_client(fields: List[Tuple[str, bytes]]) -> Tuple[Optional[str], str]:
+    """Find the connecting client IP and HELO name from the Received chain.
+
+    Received headers are read newest first; hops from INTERNAL_NETWORKS are internal
+    relays, so the first other address is the one that handed the message to the
+    receiving organization, and the one SPF is checked against.
+    """
+    for name, field in fields:
+        if name != 'received':
+            continue
+        value = header_value(field)
+        clause = patterns.RECEIVED_FROM_CLAUSE.search(value)
+        if not clause:
+            continue
+        for candidate in patterns.BRACKETED_IP.findall(clause.group(2)) or patterns.BRACKETED_IP.findall(clause.group(1)):
+            try:
+                ip = ipaddress.ip_address(candidate)
+            except ValueError:
+                continue
+            if not ip.is_unspecified and not any(ip in network for network in INTERNAL_NETWORKS):
+                return str(ip), clause.group(1).strip('[]()').lower()
+    return None, ''
+
+class SPFEvaluator:
+    """Evaluate SPF (RFC 7208) check_host() against a resolver.
+
+    The 'ptr' mechanism is deprecated and never matches here; 'exp' is ignored.
+    """
+
+    MAX_LOOKUPS = 10
+    MAX_VOID_LOOKUPS = 2
+    MAX_MX_NAMES = 10
+    QUALIFIERS = {'+': 'pass', '-': 'fail', '~': 'softfail', '?': 'neutral'}
+
+    def __init__(self, resolver: Resolver):
+        self.resolver = resolver
+        self._lookups = 0
+        self._void_lookups = 0
+
+    def check(self, ip: str, sender: str, helo: str = '') -> Tuple[str, str]:
+        """Return (result, explanation) for a client IP and MAIL FROM address"""
+        try:
+            client = ipaddress.ip_address(ip)
+        except ValueError:
+            return 'none', f"Invalid client address {ip!r}"
+
+        if '@' not in sender:
+            sender = f"postmaster@{sender or helo}"
+        local, _, domain = sender.rpartition('@')
+        context = {'s': f"{local or 'postmaster'}@{domain}", 'l': local or 'postmaster', 'o': domain,
+                   'h': helo or domain, 'ip': client}
+
+        self._lookups = 0
+        self._void_lookups = 0
+        try:
+            return self._check_host(domain.lower().rstrip('.'), context)
+        except SPFPermError as e:
+            return 'permerror', str(e)
+        except DNSError as e:
+            return 'temperror', str(e)
+
+    def _count_lookup(self):
+        self._lookups += 1
+        if self._lookups > self.MAX_LOOKUPS:
+            raise SPFPermError("Too many DNS lookups")
+
+    def _query(self, name: str, rdtype: str) -> List[str]:
+        records = self.resolver.query(name, rdtype)
+        if not records:
+            self._void_lookups += 1
+            if self._void_lookups > self.MAX_VOID_LOOKUPS:
+                raise SPFPermError("Too many void DNS lookups")
+        return records
+
+    def _check_host(self, domain: str, context: Dict) -> Tuple[str, str]:
+        labels = domain.split('.')
+        if not domain or len(labels) < 2 or any(not label or len(label) > 63 for label in labels):
+            return 'none', f"Invalid domain {domain!r}"
+
+        records = [record for record in self.resolver.query(domain, 'TXT')
+                   if record.lower() == 'v=spf1' or record.lower().startswith('v=spf1 ')]
+        if not records:
+            return 'none', f"No SPF record for {domain}"
+        if len(records) > 1:
+            raise SPFPermError(f"Multiple SPF records for {domain}")
+
+        redirect = None
+        for term in records[0].split()[1:]:
+            modifier = patterns.SPF_MODIFIER.match(term)
+            if modifier:
+                if modifier.group(1).lower() == 'redirect':
+                    redirect = modifier.group(2)
+                continue
+
+            qualifier = term[0] if term[0] in self.QUALIFIERS else '+'
+            mechanism = term[1:] if term[0] in self.QUALIFIERS else term
+            if self._matches(mechanism, domain, context):
+                return self.QUALIFIERS[qualifier], f"{domain} matched {term}"
+
+        if redirect is not None:
+            self._count_lookup()
+            target = self._expand(redirect, domain, context)
+            result = self._check_host(target, context)
+            if result[0] == 'none':
+                raise SPFPermError(f"redirect target {target} has no SPF record")
+            return result
+
+        return 'neutral', f"No mechanism matched in {domain}"
+
+    def _matches(self, mechanism: str, domain: str, context: Dict) -> bool:
+        name, argument = mechanism, ''
+        for index, char in enumerate(mechanism):
+            if char in ':/':
+                name, argument = mechanism[:index], mechanism[index:]
+                break
+        name = name.lower()
+        ip = context['ip']
+
+        if name == 'all':
+            return True
+
+        if name in ('ip4', 'ip6'):
+            try:
+                network = ipaddress.ip_network(argument.lstrip(':'), strict=False)
+            except ValueError:
+                raise SPFPermError(f"Invalid network in {mechanism}")
+            return network.version == ip.version and ip in network
+
+        if name == 'include':
+            self._count_lookup()
+            target = self._expand(argument.lstrip(':'), domain, context)
+            result, explanation = self._check_host(target, context)
+            if result == 'pass':
+                return True
+            if result in ('fail', 'softfail', 'neutral'):
+                return False
+            if result == 'temperror':
+                raise DNSError(explanation)
+            raise SPFPermError(f"include:{target} returned {result}")
+
+        if name in ('a', 'mx'):
+            self._count_lookup()
+            target, prefix4, prefix6 = self._domain_and_cidr(argument, domain, context)
+            hosts = [target]
+            if name == 'mx':
+                hosts = [record.split()[-1] for record in self._query(target, 'MX')]
+                if len(hosts) > self.MAX_MX_NAMES:
+                    raise SPFPermError(f"{target} has more than {self.MAX_MX_NAMES} MX records")
+            prefix = prefix4 if ip.version == 4 else prefix6
+            rdtype = 'A' if ip.version == 4 else 'AAAA'
+            for host in hosts:
+                for address in self._query(host, rdtype):
+                    try:
+                        if ip in ipaddress.ip_network(f"{address}/{prefix}", strict=False):
+                            return True
+                    except ValueError:
+                        continue
+            return False
+
+        if name == 'exists':
+            self._count_lookup()
+            return bool(self._query(self._expand(argument.lstrip(':'), domain, context), 'A'))
+
+        if name == 'ptr':
+            self._count_lookup()
+            return False
+
+        raise SPFPermError(f"Unknown mechanism {mechanism!r}")
+
+    def _domain_and_cidr(self, argument: str, domain: str, context: Dict) -> Tuple[str, int, int]:
+        """Split an a/mx argument like ':example.com/24//64' into its parts"""
+        prefix4, prefix6 = 32, 128
+        if '//' in argument:
+            argument, prefix6_text = argument.split('//', 1)
+            prefix6 = self._prefix(prefix6_text, 128)
+        if '/' in argument:
+            argument, prefix4_text = argument.split('/', 1)
+            prefix4 = self._prefix(prefix4_text, 32)
+        target = self._expand(argument.lstrip(':'), domain, context) if argument.lstrip(':') else domain
+        return target, prefix4, prefix6
+
+    @staticmethod
+    def _prefix(text: str, maximum: int) -> int:
+        if not text.isascii() or not text.isdigit() or int(text) > maximum:
+            raise SPFPermError(f"Invalid CIDR length /{text}")
+        return int(text)
+
+    def _expand(self, spec: str, domain: str, context: Dict) -> str:
+        """Expand SPF macros (RFC 7208, section 7)"""
+        ip = context['ip']
+
+        def replace(match) -> str:
+            token = match.group(0)
+            if token == '%%':
+                return '%'
+            if token == '%_':
+                return ' '
+            if token == '%-':
+                return '%20'
+
+            letter, digits, reverse, delimiters = match.groups()
+            if letter == 'i':
+                value = str(ip) if ip.version == 4 else '.'.join(ip.exploded.replace(':', ''))
+            elif letter == 'v':
+                value = 'in-addr' if ip.version == 4 else 'ip6'
+            elif letter == 'd':
+                value = domain
+            elif letter == 'p':
+                value = 'unknown'
+            else:
+                value = context.get(letter, '')
+
+            parts = [value]
+            for delimiter in delimiters or '.':
+                parts = [piece for part in parts for piece in part.split(delimiter)]
+            if reverse:
+                parts.reverse()
+            if digits:
+                parts = parts[-int(digits):] if int(digits) else parts
+            return '.'.join(parts)
+
+        return patterns.SPF_MACRO.sub(replace, spec).rstrip('.').lower()
+
+class DKIMVerifier:
+    """Verify DKIM-Signature headers (RFC 6376) with rsa-sha256 and rsa-sha1"""
+
+    def __init__(self, resolver: Resolver, check_expiry: bool = True):
+        self.resolver = resolver
+        self.check_expiry = check_expiry
+
+    def verify_all(self, fields: List[Tuple[str, bytes]], body: bytes) -> List[Dict]:
+        """Verify every DKIM-Signature in the message"""
+        results = []
+        for name, field in fields:
+            if name == 'dkim-signature':
+                results.append(self.verify(field, fields, body))
+        return results
+
+    def verify(self, signature_field: bytes, fields: List[Tuple[str, bytes]], body: bytes) -> Dict:
+        tags = self._parse_tags(header_value(signature_field))
+        domain = tags.get('d', '').lower()
+        result = {'domain': domain, 'selector': tags.get('s', ''), 'result': 'permerror', 'reason': ''}
+
+        missing = [tag for tag in ('v', 'a', 'b', 'bh', 'd', 'h', 's') if tag not in tags]
+        if missing:
+            result['reason'] = f"Missing tags: {', '.join(missing)}"
+            return result
+
+        algorithm = tags['a'].lower()
+        if algorithm not in ('rsa-sha256', 'rsa-sha1'):
+            result['result'] = 'neutral'
+            result['reason'] = f"Unsupported algorithm {algorithm}"
+            return result
+        digest_name = algorithm.split('-')[1]
+
+        if self.check_expiry and tags.get('x', '').isdigit() and int(tags['x']) < time.time():
+            result['reason'] = "Signature expired"
+            return result
+
+        header_canon, _, body_canon = tags.get('c', 'simple/simple').lower().partition('/')
+        body_canon = body_canon or 'simple'
+
+        # Body hash
+        canonical_body = self._canonicalize_body(body, body_canon)
+        if tags.get('l', '').isdigit():
+            canonical_body = canonical_body[:int(tags['l'])]
+        body_hash = hashlib.new(digest_name, canonical_body).digest()
+        try:
+            expected_body_hash = base64.b64decode(''.join(tags['bh'].split()))
+        except ValueError:
+            result['reason'] = "Malformed bh= tag"
+            return result
+        if body_hash != expected_body_hash:
+            result['result'] = 'fail'
+            result['reason'] = "Body hash does not match"
+            return result
+
+        # Public key
+        try:
+            key_records = self.resolver.query(f"{tags['s']}._domainkey.{domain}", 'TXT')
+        except DNSError as e:
+            result['result'] = 'temperror'
+            result['reason'] = str(e)
+            return result
+        if not key_records:
+            result['reason'] = "No public key record"
+            return result
+        key_tags = self._parse_tags(key_records[0])
+        if not key_tags.get('p'):
+            result['reason'] = "Public key revoked"
+            return result
+        try:
+            modulus, exponent = self._parse_rsa_key(base64.b64decode(''.join(key_tags['p'].split())))
+            signature = base64.b64decode(''.join(tags['b'].split()))
+        except ValueError as e:
+            result['reason'] = f"Malformed key or signature: {e}"
+            return result
+        if modulus < 2 or exponent < 1:
+            result['reason'] = "Malformed key: invalid RSA modulus or exponent"
+            return result
+        if not signature:
+            result['reason'] = "Empty b= tag"
+            return result
+
+        # Header hash over the signed headers plus this signature with b= emptied
+        signed = self._select_headers(fields, tags['h'])
+        data = b''.join(self._canonicalize_header(field, header_canon) for field in signed)
+        name, value = signature_field.split(b':', 1)
+        unsigned_field = name + b':' + patterns.DKIM_SIGNATURE_B_TAG.sub(rb'\1', value)
+        data += self._canonicalize_header(unsigned_field, header_canon).rstrip(b'\r\n')
+
+        if self._rsa_verify(hashlib.new(digest_name, data).digest(), digest_name, signature, modulus, exponent):
+            result['result'] = 'pass'
+        else:
+            result['result'] = 'fail'
+            result['reason'] = "Signature does not verify"
+        return result
+
+    @staticmethod
+    def _parse_tags(value: str) -> Dict[str, str]:
+        tags = {}
+        for item in value.split(';'):
+            if '=' in item:
+                tag, _, tag_value = item.partition('=')
+                tags[tag.strip().lower()] = ''.join(tag_value.split()) if tag.strip().lower() in ('b', 'bh', 'p') \
+                    else tag_value.strip()
+        return tags
+
+    @staticmethod
+    def _select_headers(fields: List[Tuple[str, bytes]], signed_names: str) -> List[bytes]:
+        """Pick signed header instances from the bottom up; missing ones sign as empty"""
+        remaining: Dict[str, List[bytes]] = {}
+        for name, field in fields:
+            remaining.setdefault(name, []).append(field)
+        selected = []
+        for name in signed_names.split(':'):
+            instances = remaining.get(name.strip().lower())
+            if instances:
+                selected.append(instances.pop())
+        return selected
+
+    @staticmethod
+    def _canonicalize_header(field: bytes, method: str) -> bytes:
+        if method != 'relaxed':
+            return field
+        name, value = field.split(b':', 1)
+        value = patterns.FOLDING_WHITESPACE.sub(rb'\1', value.rstrip(b'\r\n'))
+        value = patterns.WHITESPACE_RUN.sub(b' ', value).strip(b' \t')
+        return name.strip().lower() + b':' + value + b'\r\n'
+
+    @staticmethod
+    def _canonicalize_body(body: bytes, method: str) -> bytes:
+        if method == 'relaxed':
+            body = patterns.TRAILING_WHITESPACE.sub(b'\r\n', body)
+            body = patterns.WHITESPACE_RUN.sub(b' ', body)
+            if body.endswith((b' ', b'\t')):
+                body = body.rstrip(b' \t')
+        while body.endswith(b'\r\n\r\n'):
+            body = body[:-2]
+        if body and not body.endswith(b'\r\n'):
+            body += b'\r\n'
+        if method == 'relaxed':
+            # An empty body canonicalizes to nothing at all under relaxed
+            return b'' if body == b'\r\n' else body
+        return body or b'\r\n'
+
+    @staticmethod
+    def _parse_rsa_key(der: bytes) -> Tuple[int, int]:
+        """Read (n, e) from a SubjectPublicKeyInfo or bare RSAPublicKey DER structure"""
+        def read(data: bytes, offset: int) -> Tuple[int, bytes, int]:
+            tag = data[offset]
+            length = data[offset + 1]
+            offset += 2
+            if length & 0x80:
+                count = length & 0x7F
+                length = int.from_bytes(data[offset:offset + count], 'big')
+                offset += count
+            return tag, data[offset:offset + length], offset + length
+
+        try:
+            tag, sequence, _ = read(der, 0)
+            if tag != 0x30:
+                raise ValueError("expected a SEQUENCE")
+            tag, first, after = read(sequence, 0)
+            if tag == 0x30:
+                # SubjectPublicKeyInfo: algorithm identifier, then the key in a BIT STRING
+                tag, bit_string, _ = read(sequence, after)
+                if tag != 0x03:
+                    raise ValueError("expected a BIT STRING")
+                tag, sequence, _ = read(bit_string[1:], 0)
+                tag, first, after = read(sequence, 0)
+            modulus = int.from_bytes(first, 'big')
+            _tag, exponent, _ = read(sequence, after)
+            return modulus, int.from_bytes(exponent, 'big')
+        except IndexError:
+            raise ValueError("truncated key")
+
+    @staticmethod
+    def _rsa_verify(digest: bytes, digest_name: str, signature: bytes, modulus: int, exponent: int) -> bool:
+        """RSASSA-PKCS1-v1_5 verification"""
+        key_bytes = (modulus.bit_length() + 7) // 8
+        if modulus < 2 or not signature or len(signature) != key_bytes:
+            return False
+        value = int.from_bytes(signature, 'big')
+        if value >= modulus:
+            return False
+        decrypted = pow(value, exponent, modulus).to_bytes(key_bytes, 'big')
+        digest_info = DIGEST_INFO_PREFIXES[digest_name] + digest
+        padding = key_bytes - len(digest_info) - 3
+        if padding < 8:
+            return False
+        return decrypted == b'\x00\x01' + b'\xff' * padding + b'\x00' + digest_info
+
+class EmailAuthenticator:
+    """Check SPF, DKIM and DMARC for a raw message without contacting the sending server"""
+
+    def __init__(self, resolver: Resolver, check_dkim_expiry: bool = True):
+        self.resolver = resolver
+        self.spf = SPFEvaluator(resolver)
+        self.dkim = DKIMVerifier(resolver, check_expiry=check_dkim_expiry)
+
+    def verify(self, raw: bytes) -> Dict:
+        fields, body = split_message(bytes(raw))
+        headers = {}
+        for name, field in fields:
+            headers.setdefault(name, header_value(field))
+
+        from_domain = address_domain(headers.get('from', ''))
+        mail_from = headers.get('return-path', '')
+        match = patterns.ANGLE_ADDRESS.search(mail_from)
+        mail_from = (match.group(1) if match else mail_from).strip()
+
+        ip, helo = received_client(fields)
+        if ip is None:
+            spf = {'result': 'none', 'reason': "No public client address in Received headers",
+                   'domain': address_domain(mail_from) if mail_from else ''}
+        else:
+            spf_result, reason = self.spf.check(ip, mail_from or helo, helo)
+            spf = {'result': spf_result, 'reason': reason, 'ip': ip, 'helo': helo,
+                   'domain': address_domain(mail_from) if '@' in mail_from else (mail_from or helo)}
+
+        signatures = self.dkim.verify_all(fields, body)
+        dkim = {
+            'result': self._best_dkim_result(signatures),
+            'signatures': signatures
+        }
+
+        dmarc = self._check_dmarc(from_domain, spf, signatures)
+        return {'from_domain': from_domain, 'spf': spf, 'dkim': dkim, 'dmarc': dmarc}
+
+    @staticmethod
+    def _best_dkim_result(signatures: List[Dict]) -> str:
+        if not signatures:
+            return 'none'
+        for result in ('pass', 'fail', 'temperror', 'neutral', 'permerror'):
+            if any(signature['result'] == result for signature in signatures):
+                return result
+        return 'none'
+
+    def _dmarc_record(self, from_domain: str) -> Tuple[Optional[Dict[str, str]], bool]:
+        """Fetch the DMARC policy for the From domain, falling back to its organizational domain"""
+        organizational = organizational_domain(from_domain)
+        for domain in dict.fromkeys((from_domain, organizational)):
+            records = [record for record in self.resolver.query(f"_dmarc.{domain}", 'TXT')
+                       if record.replace(' ', '').lower().startswith('v=dmarc1')]
+            if len(records) == 1:
+                tags = {}
+                for item in records[0].split(';'):
+                    if '=' in item:
+                        tag, _, value = item.partition('=')
+                        tags[tag.strip().lower()] = value.strip()
+                return tags, domain != from_domain
+        return None, False
+
+    def _check_dmarc(self, from_domain: str, spf: Dict, signatures: List[Dict]) -> Dict:
+        if not from_domain:
+            return {'result': 'none', 'reason': "No From domain"}
+        try:
+            record, inherited = self._dmarc_record(from_domain)
+        except DNSError as e:
+            return {'result': 'temperror', 'reason': str(e)}
+        if record is None:
+            return {'result': 'none', 'reason': f"No DMARC record for {from_domain}"}
+
+        policy = record.get('sp', record.get('p', 'none')) if inherited else record.get('p', 'none')
+        from_org = organizational_domain(from_domain)
+
+        def aligned(domain: str, mode: str) -> bool:
+            domain = domain.lower().rstrip('.')
+            if mode == 's':
+                return domain == from_domain
+            return organizational_domain(domain) == from_org
+
+        spf_aligned = spf['result'] == 'pass' and aligned(spf.get('domain', ''), record.get('aspf', 'r'))
+        dkim_aligned = any(signature['result'] == 'pass' and aligned(signature['domain'], record.get('adkim', 'r'))
+                           for signature in signatures)
+
+        return {
+            'result': 'pass' if spf_aligned or dkim_aligned else 'fail',
+            'policy': policy.lower(),
+            'spf_aligned': spf_aligned,
+            'dkim_aligned': dkim_aligned,
+            'reason': '' if spf_aligned or dkim_aligned else "Neither SPF nor DKIM passed in alignment with From"
+        }
@@ -1,22 +1,43 @@
-import re
 import email
 from email import policy
+from email.feedparser import BytesFeedParser
+from email.message import EmailMessage
 from email.parser import BytesParser
-from bs4 import BeautifulSoup
-from typing import Dict, List
+from typing import BinaryIO, Dict, List, Tuple, Union
+from utils import patterns
+from utils.archive_inspector import inspect_archive
+from utils.attachment_hashes import hash_payload
+from utils.file_signature import detect_type
+from utils.mime_payload import MIMEPayload
+
+EmailContent = Union[str, bytes, bytearray, memoryview, BinaryIO]
 
 class EmailParser:
     """Parse email content and extract relevant information"""
     
-    def __init__(self, email_content: str, is_file: bool = False):
+    # Size of the slices fed to the bytes parser
+    FEED_CHUNK_SIZE = 64 * 1024
+    
+    # Add ssdeep and TLSH hashes (where installed) to every attachment's SHA-256
+    FUZZY_HASHES = False
+    
+    def __init__(self, email_content: EmailContent, is_file: bool = False):
         self.raw_content = email_content
         self.is_file = is_file
         self.parsed_email = None
+        self._parts = None
+        self._urls = None
         self.parse()
     
     def parse(self):
         """Parse the email content"""
-        if self.is_file:
+        if isinstance(self.raw_content, (bytes, bytearray, memoryview)):
+            # Parse raw message bytes without decoding them up front
+            self.parsed_email = self._parse_buffer(self.raw_content)
+        elif hasattr(self.raw_content, 'read'):
+            # Parse a binary file object in chunks
+            self.parsed_email = self._parse_stream(self.raw_content)
+        elif self.is_file:
             # Parse .eml file
             self.parsed_email = BytesParser(policy=policy.default).parsebytes(
                 self.raw_content.encode()
@@ -27,13 +48,107 @@ class EmailParser:
                 self.raw_content,
                 policy=policy.default
             )
+        
+        self._parts = self._walk_parts()
+    
+    def _parse_buffer(self, buffer) -> EmailMessage:
+        """Parse a bytes-like object by feeding it in slices"""
+        feed_parser = BytesFeedParser(policy=policy.default)
+        view = memoryview(buffer).cast('B')
+        
+        # Slicing the memoryview is zero-copy, only one chunk is materialized at a time
+        for start in range(0, len(view), self.FEED_CHUNK_SIZE):
+            feed_parser.feed(view[start:start + self.FEED_CHUNK_SIZE].tobytes())
+        
+        return feed_parser.close()
+    
+    def _parse_stream(self, stream: BinaryIO) -> EmailMessage:
+        """Parse a binary file object without reading it into memory first"""
+        feed_parser = BytesFeedParser(policy=policy.default)
+        
+        while True:
+            chunk = stream.read(self.FEED_CHUNK_SIZE)
+            if not chunk:
+                break
+            feed_parser.feed(chunk)
+        
+        return feed_parser.close()
+    
+    def _walk_parts(self) -> Dict:
+        """Walk the MIME tree once and cache bodies and attachment metadata"""
+        parts = {
+            'text_parts': [],
+            'html_parts': [],
+            'attachments': []
+        }
+        is_multipart = self.parsed_email.is_multipart()
+        
+        for part in self.parsed_email.walk():
+            content_type = part.get_content_type()
+            
+            if content_type == 'text/plain':
+                parts['text_parts'].append(part.get_content())
+            elif content_type == 'text/html':
+                parts['html_parts'].append(part.get_content())
+            
+            if is_multipart and part.get_content_disposition() == 'attachment':
+                filename = part.get_filename()
+                if filename:
+                    encoded_size, size = self._payload_sizes(part)
+                    payload = MIMEPayload.from_part(part, size)
+                    # Sniffed from the first few KB only, whatever the attachment's size
+                    detected_type = detect_type(payload) if payload is not None else None
+                    attachment = {
+                        'filename': filename,
+                        'content_type': content_type,
+                        'size': size,
+                        'encoded_size': encoded_size,
+                        'detected_type': detected_type
+                    }
+                    if detected_type in ('zip', 'rar', '7z'):
+                        # Member names and flags from the archive directory, nothing is extracted
+                        attachment['archive'] = inspect_archive(payload, detected_type)
+                    if payload is not None:
+                        # Hashed chunk by chunk as the payload is decoded, never as a whole copy
+                        attachment.update(hash_payload(payload, self.FUZZY_HASHES))
+                    parts['attachments'].append(attachment)
+        
+        return parts
+    
+    @staticmethod
+    def _payload_sizes(part) -> Tuple[int, int]:
+        """Get encoded and decoded payload sizes without decoding the payload"""
+        payload = part.get_payload()
+        if not isinstance(payload, str):
+            # Attached messages (message/rfc822) carry a list of sub-messages
+            encoded_size = sum(len(str(sub)) for sub in payload)
+            return encoded_size, encoded_size
+        
+        encoded_size = len(payload)
+        encoding = part.get('Content-Transfer-Encoding', '').strip().lower()
+        
+        if encoding == 'base64':
+            # Every 4 base64 characters carry 3 bytes, minus any trailing padding
+            chars = encoded_size - payload.count('\n') - payload.count('\r') - payload.count(' ')
+            padding = payload[-8:].rstrip().count('=')
+            return encoded_size, max(chars * 3 // 4 - padding, 0)
+        
+        if encoding == 'quoted-printable':
+            # An '=XX' escape shrinks by two characters, and a soft line break disappears
+            # entirely: three characters for '=\r\n', two for '=\n'
+            soft_crlf = payload.count('=\r\n')
+            soft_lf = payload.count('=\n')
+            escapes = payload.count('=') - soft_crlf - soft_lf
+            return encoded_size, max(encoded_size - 2 * escapes - 3 * soft_crlf - 2 * soft_lf, 0)
+        
+        return encoded_size, encoded_size
     
     def get_sender(self) -> Dict[str, str]:
         """Extract sender information"""
         from_header = self.parsed_email.get('From', '')
         
         # Extract name and email
-        match = re.search(r'(.+?)\s*<(.+?)>', from_header)
+        match = patterns.SENDER_NAME_ADDRESS.search(from_header)
         if match:
             return {
                 'name': match.group(1).strip().strip('"'),
@@ -53,65 +168,38 @@ class EmailParser:
     
     def get_body(self) -> Dict[str, str]:
         """Extract email body (text and HTML)"""
-        text_body = ""
-        html_body = ""
-        
-        if self.parsed_email.is_multipart():
-            for part in self.parsed_email.walk():
-                content_type = part.get_content_type()
-                
-                if content_type == 'text/plain':
-                    text_body = part.get_content()
-                elif content_type == 'text/html':
-                    html_body = part.get_content()
-        else:
-            content_type = self.parsed_email.get_content_type()
-            if content_type == 'text/plain':
-                text_body = self.parsed_email.get_content()
-            elif content_type == 'text/html':
-                html_body = self.parsed_email.get_content()
-        
+        # The last part of each type wins, matching the order of the MIME tree
         return {
-            'text': text_body,
-            'html': html_body
+            'text': self._parts['text_parts'][-1] if self._parts['text_parts'] else "",
+            'html': self._parts['html_parts'][-1] if self._parts['html_parts'] else ""
         }
     
     def extract_urls(self) -> List[str]:
         """Extract all URLs from email body"""
+        if self._urls is not None:
+            return list(self._urls)
+        
         urls = []
         body = self.get_body()
         
         # Extract from text body
         if body['text']:
-            urls.extend(re.findall(
-                r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
-                body['text']
-            ))
+            urls.extend(patterns.TEXT_URL.findall(body['text']))
         
         # Extract from HTML body
         if body['html']:
+            # Imported here so plain-text mail never pays for loading BeautifulSoup
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(body['html'], 'html.parser')
             for link in soup.find_all('a', href=True):
                 urls.append(link['href'])
         
-        return list(set(urls))  # Remove duplicates
+        self._urls = list(set(urls))  # Remove duplicates
+        return list(self._urls)
     
     def get_attachments(self) -> List[Dict[str, str]]:
         """Extract attachment information"""
-        attachments = []
-        
-        if self.parsed_email.is_multipart():
-            for part in self.parsed_email.walk():
-                if part.get_content_disposition() == 'attachment':
-                    filename = part.get_filename()
-                    if filename:
-                        attachments.append({
-                            'filename': filename,
-                            'content_type': part.get_content_type(),
-                            'size': len(part.get_content())
-                        })
-        
-        return attachments
+        return [dict(attachment) for attachment in self._parts['attachments']]
     
     def get_headers(self) -> Dict[str, str]:
         """Extract important email headers"""
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.cache import LRUCache
+from utils.dns_resolver import DNSError, Resolver
+from utils.public_suffix import registrable_domain
+
+# WHOIS lines that carry the registration date, across the common registry formats
+CREATION_DATE_LINE = re.compile(
+    r'^\s*(?:creation date|created(?: on)?|registered(?: on)?|registration (?:date|time)|'
+    r'domain registration date|domain name commencement date)\s*:\s*(.+?)\s*$',
+    re.IGNORECASE | re.MULTILINE
+)
+REFERRAL_LINE = re.compile(r'^\s*(?:refer|whois)\s*:\s*(\S+)\s*$', re.IGNORECASE | re.MULTILINE)
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%b-%Y', '%Y.%m.%d', '%d.%m.%Y', '%Y/%m/%d', '%d/%m/%Y',
+                '%Y-%m-%d %H:%M:%S', '%d-%b-%Y %H:%M:%S', '%Y%m%d')
+
+def parse_whois_date(value: str) -> Optional[datetime]:
+    """Parse a WHOIS date in any of the formats registries commonly use"""
+    value = value.strip()
+    candidates = [value, value.split()[0] if value.split() else value]
+    for candidate in candidates:
+        try:
+            parsed = datetime.fromisoformat(candidate.replace('Z', '+00:00'))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, date_format).replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+    return None
+
+class WhoisClient:
+    """Minimal asyncio WHOIS (RFC 3912) client.
+
+    Without a fixed server, the registry for each TLD is found through iana_server and
+    remembered; concurrent queries under one TLD share a single referral lookup. Passing
+    server/port pins every query to one host, e.g. a local test server.
+    """
+
+    IANA_SERVER = 'whois.iana.org'
+    MAX_RESPONSE_BYTES = 256 * 1024
+
+    def __init__(self, server: Optional[str] = None, port: int = 43, timeout: float = 10.0,
+                 iana_server: str = IANA_SERVER):
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+        self.iana_server = iana_server
+        self.referral_lookups = 0
+        self._tld_servers: Dict[str, Optional[str]] = {}
+        self._tld_lookups: Dict[str, asyncio.Future] = {}
+
+    async def _ask(self, server: str, query: str) -> str:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(server, self.port), self.timeout)
+        try:
+            writer.write(query.encode('idna') + b'\r\n')
+            await writer.drain()
+            # The server answers and closes the connection
+            chunks, received = [], 0
+            while received < self.MAX_RESPONSE_BYTES:
+                data = await asyncio.wait_for(reader.read(self.MAX_RESPONSE_BYTES - received), self.timeout)
+                if not data:
+                    break
+                chunks.append(data)
+                received += len(data)
+            return b''.join(chunks).decode('utf-8', errors='replace')
+        finally:
+            writer.close()
+
+    async def _server_for(self, domain: str) -> Optional[str]:
+        if self.server is not None:
+            return self.server
+        tld = domain.rsplit('.', 1)[-1]
+        if tld in self._tld_servers:
+            return self._tld_servers[tld]
+
+        pending = self._tld_lookups.get(tld)
+        if pending is None:
+            pending = self._tld_lookups[tld] = asyncio.ensure_future(self._referral(tld))
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            # A failed referral is asked again by the next query rather than remembered
+            if pending.done() and self._tld_lookups.get(tld) is pending:
+                del self._tld_lookups[tld]
+
+    async def _referral(self, tld: str) -> Optional[str]:
+        self.referral_lookups += 1
+        referral = REFERRAL_LINE.search(await self._ask(self.iana_server, tld))
+        self._tld_servers[tld] = referral.group(1) if referral else None
+        return self._tld_servers[tld]
+
+    async def creation_date(self, domain: str) -> Optional[datetime]:
+        """Registration date of a domain, or None if the registry does not publish one"""
+        server = await self._server_for(domain)
+        if server is None:
+            return None
+        match = CREATION_DATE_LINE.search(await self._ask(server, domain))
+        return parse_whois_date(match.group(1)) if match else None
+
+class DomainEnricher:
+    """Look up MX records and registration age for domains, concurrently and at most once.
+
+    Domains are reduced to their registrable domain and deduplicated. A domain already being
+    looked up is awaited rather than queried again, at most max_concurrency lookups run at
+    once, and results are kept for ttl seconds in memory and, with cache_path, in SQLite.
+    enrich_blocking() runs every call on one event loop in a background thread, so the
+    coalescing and the limit hold across batches and concurrent synchronous callers.
+    """
+
+    def __init__(self, resolver: Resolver = None, whois: WhoisClient = None, max_concurrency: int = 16,
+                 ttl: float = 86400, error_ttl: float = 300, max_size: int = 100000,
+                 cache_path: Optional[str] = None):
+        self.resolver = resolver
+        self.whois = whois
+        self.max_concurrency = max_concurrency
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._memory = LRUCache(max_size=max_size)
+        self.lookups = 0
+        self.coalesced = 0
+
+        # Created per event loop, since asyncio primitives cannot be shared across loops
+        self._loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        # The loop enrich_blocking() runs on, started with the first call
+        self._background: Optional[asyncio.AbstractEventLoop] = None
+        self._background_thread: Optional[threading.Thread] = None
+        self._background_lock = threading.Lock()
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if cache_path is not None:
+            self._open(cache_path)
+
+    def _open(self, path: str):
+        import sqlite3  # Only needed for the on-disk tier
+
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS domains (domain TEXT PRIMARY KEY, info TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM domains WHERE expires <= ?", (time.time(),))
+
+    @staticmethod
+    def registrable(host: str) -> Optional[str]:
+        """Registrable domain for a URL host or mail domain; None for IP literals and public suffixes"""
+        host = host.lower().strip().rsplit('@', 1)[-1]
+        if host.startswith('['):
+            return None
+        return registrable_domain(host.split(':', 1)[0])
+
+    async def enrich(self, domains: Iterable[str]) -> Dict[str, Dict]:
+        """Enrich every distinct registrable domain, keyed by registrable domain"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._in_flight = {}
+
+        unique = sorted({registrable for registrable in map(self.registrable, domains) if registrable})
+        infos = await asyncio.gather(*[self._lookup(domain) for domain in unique])
+        return {domain: self._with_age(info) for domain, info in zip(unique, infos)}
+
+    def enrich_blocking(self, domains: Iterable[str]) -> Dict[str, Dict]:
+        """enrich() for synchronous callers without a running event loop"""
+        return asyncio.run_coroutine_threadsafe(self.enrich(domains), self._background_loop()).result()
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._background_lock:
+            if self._background is None:
+                self._background = asyncio.new_event_loop()
+                self._background_thread = threading.Thread(target=self._background.run_forever,
+                                                           name='domain-enricher', daemon=True)
+                self._background_thread.start()
+            return self._background
+
+    async def _lookup(self, domain: str) -> Dict:
+        cached = self._cached(domain)
+        if cached is not None:
+            return cached
+
+        pending = self._in_flight.get(domain)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.ensure_future(self._fetch(domain))
+        self._in_flight[domain] = future
+        try:
+            return await future
+        finally:
+            self._in_flight.pop(domain, None)
+
+    async def _fetch(self, domain: str) -> Dict:
+        async with self._semaphore:
+            self.lookups += 1
+            (mail, mail_error), (created, whois_error) = await asyncio.gather(
+                self._fetch_mail(domain), self._fetch_created(domain)
+            )
+
+        info = {
+            'domain': domain,
+            'mx': mail[0] if mail else None,
+            'accepts_mail': mail[1] if mail else None,
+            'created': created.date().isoformat() if created else None,
+            'errors': [error for error in (mail_error, whois_error) if error]
+        }
+        self._store(domain, info, self.error_ttl if info['errors'] else self.ttl)
+        return info
+
+    async def _fetch_mail(self, domain: str) -> Tuple[Optional[Tuple[List[str], bool]], Optional[str]]:
+        """MX hosts and whether the domain can receive mail at all (RFC 5321 implicit MX, RFC 7505 null MX)"""
+        if self.resolver is None:
+            return None, None
+        loop = asyncio.get_running_loop()
+        try:
+            records = await loop.run_in_executor(None, self.resolver.query, domain, 'MX')
+            hosts = [parts[1].rstrip('.') if len(parts) > 1 else '' for parts in (record.split() for record in records)]
+            if records and not any(hosts):
+                return ([], False), None
+            hosts = [host for host in hosts if host]
+            if hosts:
+                return (hosts, True), None
+            addresses = await loop.run_in_executor(None, self.resolver.query, domain, 'A')
+            return ([], bool(addresses)), None
+        except DNSError as e:
+            return None, f"dns: {e}"
+
+    async def _fetch_created(self, domain: str) -> Tuple[Optional[datetime], Optional[str]]:
+        if self.whois is None:
+            return None, None
+        try:
+            return await self.whois.creation_date(domain), None
+        except (OSError, asyncio.TimeoutError, UnicodeError) as e:
+            return None, f"whois: {e or type(e).__name__}"
+
+    def _cached(self, domain: str) -> Optional[Dict]:
+        info = self._memory.get(domain)
+        if info is None and self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT info, expires FROM domains WHERE domain = ? AND expires > ?", (domain, time.time())
+                ).fetchone()
+            if row is not None:
+                info = json.loads(row[0])
+                self._memory.set(domain, info, ttl=row[1] - time.time())
+        return info
+
+    def _store(self, domain: str, info: Dict, ttl: float):
+        self._memory.set(domain, info, ttl=ttl)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("INSERT OR REPLACE INTO domains (domain, info, expires) VALUES (?, ?, ?)",
+                                 (domain, json.dumps(info), time.time() + ttl))
+
+    @staticmethod
+    def _with_age(info: Dict) -> Dict:
+        """Copy of a cached result with the domain age worked out for today"""
+        info = dict(info)
+        if info.get('created'):
+            created = datetime.fromisoformat(info['created']).replace(tzinfo=timezone.utc)
+            info['age_days'] = (datetime.now(timezone.utc) - created).days
+        else:
+            info['age_days'] = None
+        return info
+
+    def stats(self) -> Dict:
+        return {'lookups': self.lookups, 'coalesced': self.coalesced, 'memory': self._memory.stats()}
+
+    def close(self):
+        with self._background_lock:
+            if self._background is not None:
+                self._background.call_soon_threadsafe(self._background.stop)
+                self._background_thread.join()
+                self._background.close()
+                self._background = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,117 @@
+import re
+from typing import Optional
+
+from utils.mime_payload import MIMEPayload
+
+# Bytes read from the start of an attachment; every signature below offset 0 fits in it
+SNIFF_SIZE = 4096
+
+# (offset, magic bytes, file type), most specific first. Types are the keys of
+# AttachmentAnalyzer.FILE_TYPE_EXTENSIONS.
+SIGNATURES = [
+    (0, b'MZ', 'pe'),
+    (0, b'\x7fELF', 'elf'),
+    (0, b'L\x00\x00\x00\x01\x14\x02\x00\x00\x00\x00\x00\xc0\x00\x00\x00\x00\x00\x00F', 'lnk'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'ole2'),
+    (0, b'PK\x03\x04', 'zip'),
+    (0, b'PK\x05\x06', 'zip'),  # Empty archive
+    (0, b'PK\x07\x08', 'zip'),  # Spanned archive
+    (0, b'Rar!\x1a\x07\x00', 'rar'),
+    (0, b'Rar!\x1a\x07\x01\x00', 'rar'),
+    (0, b'7z\xbc\xaf\x27\x1c', '7z'),
+    (0, b'%PDF-', 'pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'\xff\xd8\xff', 'jpeg'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    # ISO 9660 volume descriptors follow 32KB of system area
+    (0x8001, b'CD001', 'iso'),
+]
+
+# HTML has no magic number: match an optional BOM and whitespace, then an opening tag
+HTML_SIGNATURE = rb'(?:\xef\xbb\xbf)?\s*(?i:<!doctype\s+html|<html|<head|<body|<script|<iframe|<svg)'
+
+# Every offset-0 signature in one anchored alternation; the matching group names the type
+_HEAD_TYPES = [file_type for offset, _magic, file_type in SIGNATURES if offset == 0] + ['html']
+_HEAD_PATTERN = re.compile(b'|'.join(
+    [b'(' + re.escape(magic) + b')' for offset, magic, _file_type in SIGNATURES if offset == 0]
+    + [b'(' + HTML_SIGNATURE + b')']
+))
+_OFFSET_SIGNATURES = [signature for signature in SIGNATURES if signature[0] > 0]
+
+# Readable names for findings
+FILE_TYPE_DESCRIPTIONS = {
+    'pe': 'a Windows executable',
+    'elf': 'a Linux executable',
+    'lnk': 'a Windows shortcut',
+    'ole2': 'a legacy Office document',
+    'zip': 'a ZIP archive',
+    'ooxml': 'an Office document',
+    'rar': 'a RAR archive',
+    '7z': 'a 7-Zip archive',
+    'iso': 'a disk image',
+    'html': 'an HTML page',
+    'pdf': 'a PDF document',
+    'png': 'a PNG image',
+    'jpeg': 'a JPEG image',
+    'gif': 'a GIF image',
+}
+
+# Entries of an OOXML package (.docx, .xlsx, .pptx) that a plain ZIP does not have
+OOXML_MARKERS = (b'[Content_Types].xml', b'_rels/.rels')
+
+# libmagic MIME types mapped onto the types above, for content the table does not know
+MAGIC_MIME_TYPES = {
+    'application/x-dosexec': 'pe',
+    'application/x-msdownload': 'pe',
+    'application/x-executable': 'elf',
+    'application/x-sharedlib': 'elf',
+    'application/x-ms-shortcut': 'lnk',
+    'application/x-iso9660-image': 'iso',
+    'text/html': 'html',
+}
+
+_magic = None
+
+def _libmagic():
+    """python-magic when it and libmagic are installed, False otherwise"""
+    global _magic
+    if _magic is None:
+        try:
+            import magic
+            magic.from_buffer(b'', mime=True)
+            _magic = magic
+        except Exception:
+            # Missing module, or the module without its shared library
+            _magic = False
+    return _magic
+
+def sniff(head: bytes) -> Optional[str]:
+    """File type from the first bytes of a file, None when no signature matches"""
+    match = _HEAD_PATTERN.match(head)
+    if match is None:
+        return None
+    file_type = _HEAD_TYPES[match.lastindex - 1]
+    if file_type == 'zip' and any(marker in head for marker in OOXML_MARKERS):
+        return 'ooxml'
+    return file_type
+
+def detect_type(payload: MIMEPayload, use_libmagic: bool = True) -> Optional[str]:
+    """File type of an attachment, read from at most SNIFF_SIZE bytes plus one probe per offset signature"""
+    head = payload.head(SNIFF_SIZE)
+    file_type = sniff(head)
+    if file_type is not None:
+        return file_type
+
+    for offset, magic, signature_type in _OFFSET_SIGNATURES:
+        if payload.size >= offset + len(magic) and payload.read(offset, len(magic)) == magic:
+            return signature_type
+
+    if use_libmagic and head:
+        magic = _libmagic()
+        if magic:
+            try:
+                return MAGIC_MIME_TYPES.get(magic.from_buffer(head, mime=True))
+            except Exception:
+                return None
+    return None
@@ -0,0 +1,106 @@
+import hashlib
+import mmap
+import struct
+from typing import Iterable
+
+MAGIC = b'PHHL'
+VERSION = 1
+
+# magic, version, digest size, entry count, digest of all entries
+HEADER = struct.Struct('<4sHHQ32s')
+HEADER_SIZE = 64
+DIGEST_SIZE = 32
+
+# Entries are bucketed by their first two bytes; the table holds each bucket's end index
+FANOUT_BUCKETS = 1 << 16
+FANOUT = struct.Struct(f'<{FANOUT_BUCKETS}I')
+BUCKET_BOUNDS = struct.Struct('<II')
+
+def parse_sha256(value: str) -> bytes:
+    """Raw digest from a hex SHA-256, or from a 'sha256sum' line"""
+    fields = value.split()
+    digest = bytes.fromhex(fields[0]) if fields else b''
+    if len(digest) != DIGEST_SIZE:
+        raise ValueError(f"Not a SHA-256 digest: {value!r}")
+    return digest
+
+class HashBlocklist:
+    """Known-bad attachment SHA-256 digests in a memory-mapped sorted array.
+
+    The digests are stored whole and sorted, behind a fan-out table of 65536 bucket
+    boundaries indexed by the first two digest bytes (like a git pack index). A lookup
+    reads two table entries and binary-searches one bucket, which holds about 80 digests
+    per five million entries, so it touches a handful of pages however large the list is.
+    Matches are exact. The file is mapped read-only, so forked workers share its pages.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, digest_size, self.entry_count, checksum = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or digest_size != DIGEST_SIZE:
+            self.close()
+            raise ValueError(f"{path} is not a hash blocklist file (version {VERSION})")
+        self.checksum = checksum.hex()
+        self._fanout_offset = HEADER_SIZE
+        self._digest_offset = HEADER_SIZE + FANOUT.size
+
+    @classmethod
+    def build(cls, path: str, digests: Iterable[bytes]) -> int:
+        """Write a hash blocklist file for the given raw SHA-256 digests; returns the entry count"""
+        digests = sorted(set(digests))
+        fanout = [0] * FANOUT_BUCKETS
+        for digest in digests:
+            fanout[int.from_bytes(digest[:2], 'big')] += 1
+        total = 0
+        for bucket in range(FANOUT_BUCKETS):
+            total += fanout[bucket]
+            fanout[bucket] = total
+
+        checksum = hashlib.sha256()
+        for digest in digests:
+            checksum.update(digest)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, DIGEST_SIZE, len(digests), checksum.digest()).ljust(HEADER_SIZE, b'\0'))
+            f.write(FANOUT.pack(*fanout))
+            f.write(b''.join(digests))
+        return len(digests)
+
+    def __contains__(self, digest: bytes) -> bool:
+        if len(digest) != DIGEST_SIZE:
+            return False
+        data = self._map
+        bucket = int.from_bytes(digest[:2], 'big')
+        if bucket:
+            low, high = BUCKET_BOUNDS.unpack_from(data, self._fanout_offset + (bucket - 1) * 4)
+        else:
+            low, high = 0, struct.unpack_from('<I', data, self._fanout_offset)[0]
+
+        base = self._digest_offset
+        while low < high:
+            middle = (low + high) // 2
+            start = base + middle * DIGEST_SIZE
+            found = data[start:start + DIGEST_SIZE]
+            if found == digest:
+                return True
+            if found < digest:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def contains_sha256(self, hex_digest: str) -> bool:
+        try:
+            return bytes.fromhex(hex_digest) in self
+        except ValueError:
+            return False
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
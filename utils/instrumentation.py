@@ -0,0 +1,166 @@
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, TextIO
+
+# Latency bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class StageEvent:
+    """Timing, input sizes and finding count recorded for one stage of one message"""
+
+    __slots__ = ('stage', 'seconds', 'sizes', 'findings', 'timestamp')
+
+    def __init__(self, stage: str, seconds: float, sizes: Dict[str, int], findings: Optional[int]):
+        self.stage = stage
+        self.seconds = seconds
+        self.sizes = sizes
+        self.findings = findings
+        self.timestamp = time.time()
+
+    def to_dict(self) -> Dict:
+        return {
+            'stage': self.stage,
+            'seconds': round(self.seconds, 6),
+            'sizes': self.sizes,
+            'findings': self.findings,
+            'timestamp': self.timestamp
+        }
+
+class HistogramSink:
+    """Aggregate stage events in memory as latency histograms and size counters"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._stages: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, event: StageEvent):
+        with self._lock:
+            stats = self._stages.get(event.stage)
+            if stats is None:
+                stats = self._stages[event.stage] = {
+                    'count': 0,
+                    'seconds_sum': 0.0,
+                    'seconds_max': 0.0,
+                    'bucket_counts': [0] * (len(self.buckets) + 1),
+                    'sizes': {},
+                    'findings': 0
+                }
+
+            stats['count'] += 1
+            stats['seconds_sum'] += event.seconds
+            stats['seconds_max'] = max(stats['seconds_max'], event.seconds)
+            stats['bucket_counts'][self._bucket_index(event.seconds)] += 1
+            for name, value in event.sizes.items():
+                stats['sizes'][name] = stats['sizes'].get(name, 0) + value
+            if event.findings:
+                stats['findings'] += event.findings
+
+    def _bucket_index(self, seconds: float) -> int:
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                return index
+        return len(self.buckets)
+
+    def quantile(self, stage: str, fraction: float) -> Optional[float]:
+        """Estimate a latency quantile as the upper bound of the bucket containing it"""
+        with self._lock:
+            stats = self._stages.get(stage)
+            if not stats:
+                return None
+            target = fraction * stats['count']
+            seen = 0
+            for index, count in enumerate(stats['bucket_counts']):
+                seen += count
+                if seen >= target:
+                    return self.buckets[index] if index < len(self.buckets) else stats['seconds_max']
+            return stats['seconds_max']
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-stage counts, mean latency, estimated p50/p99 and size totals"""
+        with self._lock:
+            stages = {name: dict(stats, sizes=dict(stats['sizes'])) for name, stats in self._stages.items()}
+
+        for name, stats in stages.items():
+            stats['mean_seconds'] = stats['seconds_sum'] / stats['count']
+            stats['p50_seconds'] = self.quantile(name, 0.50)
+            stats['p99_seconds'] = self.quantile(name, 0.99)
+            del stats['bucket_counts']
+        return stages
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+class PrometheusSink(HistogramSink):
+    """Histogram sink that renders the Prometheus text exposition format"""
+
+    def __init__(self, namespace: str = 'phish', buckets=DEFAULT_BUCKETS):
+        super().__init__(buckets)
+        self.namespace = namespace
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format (version 0.0.4)"""
+        prefix = self.namespace
+        with self._lock:
+            stages = {name: dict(stats, sizes=dict(stats['sizes']), bucket_counts=list(stats['bucket_counts']))
+                      for name, stats in sorted(self._stages.items())}
+
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Time spent in each analysis stage.",
+            f"# TYPE {prefix}_stage_duration_seconds histogram"
+        ]
+        for name, stats in stages.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, stats['bucket_counts']):
+                cumulative += count
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {stats["seconds_sum"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {stats["count"]}')
+
+        lines.append(f"# HELP {prefix}_stage_input_total Input sizes seen by each stage (bytes or items).")
+        lines.append(f"# TYPE {prefix}_stage_input_total counter")
+        for name, stats in stages.items():
+            for size_name, value in sorted(stats['sizes'].items()):
+                lines.append(f'{prefix}_stage_input_total{{stage="{name}",input="{size_name}"}} {value}')
+
+        lines.append(f"# HELP {prefix}_stage_findings_total Findings reported by each stage.")
+        lines.append(f"# TYPE {prefix}_stage_findings_total counter")
+        for name, stats in stages.items():
+            lines.append(f'{prefix}_stage_findings_total{{stage="{name}"}} {stats["findings"]}')
+
+        return '\n'.join(lines) + '\n'
+
+class JSONLogSink:
+    """Write every stage event as one JSON line to a stream or logger"""
+
+    def __init__(self, stream: TextIO = None, logger: logging.Logger = None):
+        self.stream = stream if stream is not None or logger is not None else sys.stderr
+        self.logger = logger
+        self._lock = threading.Lock()
+
+    def record(self, event: StageEvent):
+        line = json.dumps(event.to_dict())
+        if self.logger is not None:
+            self.logger.info(line)
+        else:
+            with self._lock:
+                self.stream.write(line + '\n')
+
+class Instrumentation:
+    """Fan stage events out to one or more sinks"""
+
+    def __init__(self, *sinks):
+        self.sinks: List = list(sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def record(self, stage: str, seconds: float, sizes: Dict[str, int] = None, findings: Optional[int] = None):
+        event = StageEvent(stage, seconds, sizes or {}, findings)
+        for sink in self.sinks:
+            sink.record(event)
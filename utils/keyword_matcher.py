@@ -0,0 +1,93 @@
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds many keywords in a single pass over the text"""
+
+    def __init__(self, keyword_lists: Dict[str, Iterable[str]] = None):
+        # State 0 is the root; each state has goto transitions, a failure link and outputs
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+        self._built = False
+
+        for category, keywords in (keyword_lists or {}).items():
+            for keyword in keywords:
+                self.add(keyword, category)
+
+        if keyword_lists:
+            self.build()
+
+    def add(self, keyword: str, category: str):
+        """Add a keyword under a category (the automaton must be rebuilt afterwards)"""
+        if not keyword:
+            return
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+
+        if (keyword, category) not in self._output[state]:
+            self._output[state].append((keyword, category))
+        self._built = False
+
+    def build(self):
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+
+                # A state also reports every keyword that ends at its failure state
+                for match in self._output[self._fail[next_state]]:
+                    if match not in self._output[next_state]:
+                        self._output[next_state].append(match)
+
+        self._built = True
+
+    def find_all(self, text: str) -> List[Tuple[int, str, str]]:
+        """Return (offset, keyword, category) for every keyword occurrence in text"""
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        root = goto[0]
+        matches = []
+        state = 0
+
+        for index, char in enumerate(text):
+            if state == 0 and char not in root:
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword, category in output[state]:
+                matches.append((index - len(keyword) + 1, keyword, category))
+
+        return matches
+
+    def find_categories(self, text: str) -> Dict[str, Dict[str, int]]:
+        """Map each category to the keywords found and the offset of their first occurrence"""
+        found: Dict[str, Dict[str, int]] = {}
+        for offset, keyword, category in self.find_all(text):
+            found.setdefault(category, {}).setdefault(keyword, offset)
+        return found
@@ -0,0 +1,151 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Iterator, List, Optional, Tuple
+
+INDEX_MAGIC = b'PHMX'
+INDEX_VERSION = 1
+
+# magic, version, size of the mbox when indexed, its mtime in ns
+INDEX_HEADER = struct.Struct('<4sHQQ')
+
+FROM_LINE = b'From '
+NEWLINE = 10
+
+class MboxReader:
+    """Random access to the messages of a large mbox file through mmap and a byte-offset index.
+
+    The index is an array('Q') of the offsets of every 'From ' line, found with mmap.find
+    rather than by reading the file line by line. It is saved next to the mbox (or at
+    index_path) and reused while the file is unchanged; when the mbox has only grown, just
+    the appended part is scanned. Messages are returned as memoryview slices of the mapping,
+    so nothing is copied until the parser reads it. Message boundaries and contents match
+    mailbox.mbox, which drops the From_ line and the blank line before the next one.
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None, persist_index: bool = True):
+        self.path = path
+        self.index_path = index_path or path + '.idx'
+        self._file = open(path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self.size = stat.st_size
+        self._mtime_ns = stat.st_mtime_ns
+        # mmap refuses empty files, and an empty mbox has nothing to map
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.offsets = self._load_index()
+        if self.offsets is None:
+            self.offsets = self._build_index()
+            if persist_index:
+                self._save_index()
+
+    def _load_index(self) -> Optional[array]:
+        """Read a saved index, extending it when the mbox has grown since"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                magic, version, indexed_size, mtime_ns = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                offsets = array('Q')
+                offsets.frombytes(f.read())
+        except (OSError, struct.error, ValueError):
+            return None
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or indexed_size > self.size:
+            return None
+        if indexed_size == self.size:
+            return offsets if mtime_ns == self._mtime_ns else None
+
+        # Appended to (the usual way an mbox changes): keep the index if its last message is still in place
+        if offsets and self._map[offsets[-1]:offsets[-1] + len(FROM_LINE)] != FROM_LINE:
+            return None
+        resume = max(offsets[-1] + 1 if offsets else 0, indexed_size - len(FROM_LINE))
+        offsets.extend(self._scan(resume))
+        self._save_index(offsets)
+        return offsets
+
+    def _scan(self, position: int) -> Iterator[int]:
+        """Offsets of the 'From ' lines at or after position"""
+        data = self._map
+        if position == 0 and data[:len(FROM_LINE)] == FROM_LINE:
+            yield 0
+        marker = b'\n' + FROM_LINE
+        found = data.find(marker, max(position - 1, 0))
+        while found >= 0:
+            yield found + 1
+            found = data.find(marker, found + 1)
+
+    def _build_index(self) -> array:
+        return array('Q', self._scan(0))
+
+    def _save_index(self, offsets: Optional[array] = None):
+        offsets = self.offsets if offsets is None else offsets
+        temporary = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.size, self._mtime_ns))
+                f.write(offsets.tobytes())
+            # Renamed into place so concurrent readers never see a partial index
+            os.replace(temporary, self.index_path)
+        except OSError:
+            # A read-only mailbox directory just means indexing again next time
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def bounds(self, number: int) -> Tuple[int, int]:
+        """(start, stop) byte offsets of a message's contents, without its From_ line"""
+        data = self._map
+        start = self.offsets[number]
+        stop = self.offsets[number + 1] if number + 1 < len(self.offsets) else self.size
+        # A blank line before the next From_ line (or the end of file) is a separator, not content
+        if stop - 2 >= start and data[stop - 1] == NEWLINE and data[stop - 2] == NEWLINE:
+            stop -= 1
+        line_end = data.find(b'\n', start, stop)
+        return (line_end + 1 if line_end >= 0 else stop), stop
+
+    def __getitem__(self, number: int) -> memoryview:
+        """Zero-copy view of message number's bytes"""
+        if number < 0:
+            number += len(self.offsets)
+        start, stop = self.bounds(number)
+        return memoryview(self._map)[start:stop]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        for number in range(len(self.offsets)):
+            yield self[number]
+
+    def iter_range(self, first: int, last: int) -> Iterator[Tuple[int, memoryview]]:
+        """(message number, view) for messages first..last-1"""
+        for number in range(max(first, 0), min(last, len(self.offsets))):
+            yield number, self[number]
+
+    def iter_offsets(self, start: int, end: int) -> Iterator[Tuple[int, memoryview]]:
+        """(message number, view) for messages whose From_ line starts in [start, end)"""
+        return self.iter_range(bisect_left(self.offsets, start), bisect_left(self.offsets, end))
+
+    def split(self, parts: int) -> List[Tuple[int, int]]:
+        """Cut the file into about parts byte ranges of similar size, each starting at a message"""
+        if not self.offsets:
+            return []
+        step = max(self.size // max(parts, 1), 1)
+        starts = sorted({self.offsets[min(bisect_left(self.offsets, position), len(self.offsets) - 1)]
+                         for position in range(0, self.size, step)})
+        return list(zip(starts, starts[1:] + [self.size]))
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            try:
+                self._map.close()
+            except BufferError:
+                # Views handed out are still alive; the mapping goes when they do
+                pass
+        self._file.close()
+
+    def __enter__(self) -> 'MboxReader':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
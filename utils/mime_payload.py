@@ -0,0 +1,164 @@
+import binascii
+from typing import Iterator, Optional
+
+# Encodings whose payload string maps one character to one byte
+RAW_ENCODINGS = ('', '7bit', '8bit', 'binary')
+
+# Furthest into a payload that is decoded from the start when random access is not possible
+SEQUENTIAL_LIMIT = 256 * 1024
+
+# Most quoted-printable characters decoded to reach SEQUENTIAL_LIMIT bytes
+QP_SPAN_LIMIT = SEQUENTIAL_LIMIT * 4
+
+# Encoded characters stripped of line breaks per step of a sequential read
+STEP_SIZE = 16 * 1024
+
+# Encoded characters decoded per chunk when streaming a whole payload
+STREAM_CHUNK_SIZE = 256 * 1024
+
+class MIMEPayload:
+    """Bounded reads of a MIME part's decoded bytes, straight from its encoded payload.
+
+    Only the characters that cover the requested range are decoded, so reading the first
+    few KB of a 20MB base64 attachment costs the same as reading them from a 20KB one.
+    Base64 bodies are written in lines of one fixed length, which maps a decoded offset to
+    a position in the payload; bodies that break that layout are decoded from the start,
+    up to SEQUENTIAL_LIMIT. Callers validate what they read (magic numbers, checksums), so
+    a payload whose layout only looks regular yields data that fails validation rather
+    than a wrong verdict.
+    """
+
+    def __init__(self, payload: str, encoding: str, size: int):
+        self.payload = payload
+        self.encoding = encoding.strip().lower()
+        self.size = size
+        self._layout = None
+
+    @classmethod
+    def from_part(cls, part, size: int) -> Optional['MIMEPayload']:
+        """Reader for a leaf part, None for attached messages and other multipart payloads"""
+        payload = part.get_payload()
+        if not isinstance(payload, str):
+            return None
+        return cls(payload, part.get('Content-Transfer-Encoding', ''), size)
+
+    def head(self, length: int) -> bytes:
+        return self.read(0, length)
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Up to length decoded bytes starting at offset; short (or empty) when out of reach"""
+        if offset < 0 or length <= 0 or offset >= self.size:
+            return b''
+        length = min(length, self.size - offset)
+        if self.encoding == 'base64':
+            return self._read_base64(offset, length)
+        if self.encoding == 'quoted-printable':
+            return self._read_quoted_printable(offset, length)
+        if self.encoding in RAW_ENCODINGS:
+            return self.payload[offset:offset + length].encode('utf-8', errors='surrogateescape')
+        return b''
+
+    def iter_decoded(self) -> Iterator[bytes]:
+        """The whole decoded payload, one chunk at a time; the decoded bytes are never held at once"""
+        payload = self.payload
+        if self.encoding == 'base64':
+            carry = ''
+            for position in range(0, len(payload), STREAM_CHUNK_SIZE):
+                text = carry + ''.join(payload[position:position + STREAM_CHUNK_SIZE].split())
+                # Quads split across chunks wait for the next one
+                whole = len(text) - len(text) % 4
+                carry = text[whole:]
+                if whole:
+                    try:
+                        yield binascii.a2b_base64(text[:whole])
+                    except binascii.Error:
+                        return
+        elif self.encoding == 'quoted-printable':
+            start = 0
+            while start < len(payload):
+                # Cut after a line break so no escape or soft break is split
+                end = payload.find('\n', start + STREAM_CHUNK_SIZE) + 1 or len(payload)
+                yield binascii.a2b_qp(payload[start:end].encode('utf-8', errors='surrogateescape'))
+                start = end
+        elif self.encoding in RAW_ENCODINGS:
+            for position in range(0, len(payload), STREAM_CHUNK_SIZE):
+                yield payload[position:position + STREAM_CHUNK_SIZE].encode('utf-8', errors='surrogateescape')
+
+    def _read_base64(self, offset: int, length: int) -> bytes:
+        # Every 4 characters decode to 3 bytes, so read whole quads around the range
+        first_quad = offset // 3
+        quad_count = -(-(offset + length) // 3) - first_quad
+        text = self._base64_chars(first_quad * 4, quad_count * 4)
+        if not text:
+            return b''
+        try:
+            data = binascii.a2b_base64(text[:len(text) - len(text) % 4])
+        except binascii.Error:
+            return b''
+        skip = offset - first_quad * 3
+        return data[skip:skip + length]
+
+    def _base64_chars(self, start: int, count: int) -> str:
+        """count base64 characters from character start, line breaks removed"""
+        layout = self._line_layout()
+        if layout is not None:
+            line_length, stride = layout
+            line_start = (start // line_length) * stride
+            physical = line_start + start % line_length
+            # Line breaks must sit where the layout puts them, or the offset mapping is off
+            if line_start == 0 or self.payload[line_start - 1:line_start] == '\n':
+                end = ((start + count) // line_length + 1) * stride
+                text = ''.join(self.payload[physical:end].split())[:count]
+                if len(text) == count or end >= len(self.payload):
+                    return text
+        if start + count > SEQUENTIAL_LIMIT:
+            return ''
+        return self._sequential_chars(start, count)
+
+    def _line_layout(self):
+        """(characters per line, characters per line including its line break), or None"""
+        if self._layout is None:
+            payload = self.payload
+            line_end = payload.find('\n')
+            if line_end < 0:
+                line_length = len(payload.strip())
+                stride = line_length
+            else:
+                line_length = len(payload[:line_end].rstrip('\r'))
+                stride = line_end + 1
+            # A leading blank line or a line that splits quads breaks the mapping
+            regular = line_length > 0 and line_length % 4 == 0 and not payload[:1].isspace()
+            self._layout = (line_length, stride) if regular else False
+        return self._layout or None
+
+    def _sequential_chars(self, start: int, count: int) -> str:
+        pieces = []
+        collected = 0
+        for position in range(0, len(self.payload), STEP_SIZE):
+            piece = ''.join(self.payload[position:position + STEP_SIZE].split())
+            pieces.append(piece)
+            collected += len(piece)
+            if collected >= start + count:
+                break
+        return ''.join(pieces)[start:start + count]
+
+    def _read_quoted_printable(self, offset: int, length: int) -> bytes:
+        if offset + length > SEQUENTIAL_LIMIT:
+            return b''
+        # An escape is three characters for one byte and soft line breaks add a few percent,
+        # so QP_SPAN_LIMIT characters always cover SEQUENTIAL_LIMIT bytes of a conforming body
+        limit = min(len(self.payload), QP_SPAN_LIMIT)
+        end = min((offset + length) * 3, limit)
+        while True:
+            # Cut after a line break so no escape or soft break is split
+            cut = self.payload.find('\n', end, limit) + 1 or limit
+            encoded = self.payload[:cut].encode('utf-8', errors='surrogateescape')
+            if cut < len(self.payload) and not encoded.endswith(b'\n'):
+                # Cut inside a line that has no break in reach: drop an escape split by the cut
+                split = encoded.rfind(b'=', len(encoded) - 2)
+                if split >= 0:
+                    encoded = encoded[:split]
+            decoded = binascii.a2b_qp(encoded)
+            if len(decoded) >= offset + length or cut >= limit:
+                return decoded[offset:offset + length]
+            end = min(cut * 2, limit)
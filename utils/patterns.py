@@ -0,0 +1,37 @@
+import re
+
+# Email parsing
+SENDER_NAME_ADDRESS = re.compile(r'(.+?)\s*<(.+?)>')
+TEXT_URL = re.compile(
+    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+)
+
+# URL analysis
+IPV4_ADDRESS = re.compile(r'^(\d{1,3}\.){3}\d{1,3}$')
+HEX_ESCAPE = re.compile(r'%[0-9A-Fa-f]{2}')
+DOMAIN_TOKEN_SEPARATOR = re.compile(r'[^a-z0-9]+')
+
+# Content analysis
+EXCESSIVE_PUNCTUATION = re.compile(r'[!?]{2,}')
+CAPS_WORD = re.compile(r'\b[A-Z]{5,}\b')
+ASCII_LETTER = re.compile(r'[a-zA-Z]')
+ASCII_UPPERCASE = re.compile(r'[A-Z]')
+
+# Sender analysis: letters followed by a long digit run, or the other way round
+RANDOM_LOCAL_PART = re.compile(r'[a-z]{2,}\d{4,}|\d{4,}[a-z]{2,}')
+
+# Campaign clustering
+HTML_TAG = re.compile(r'<[^>]+>')
+WORD = re.compile(r'\w+')
+DIGIT_RUN = re.compile(r'\d+')
+
+# Sender authentication
+RECEIVED_FROM_CLAUSE = re.compile(r'\bfrom\s+(\S+)(.*?)(?:\bby\b|;|$)', re.IGNORECASE | re.DOTALL)
+BRACKETED_IP = re.compile(r'\[(?:IPv6:)?([0-9A-Fa-f:.]+)\]')
+ANGLE_ADDRESS = re.compile(r'<([^<>]*)>')
+FOLDING_WHITESPACE = re.compile(rb'[ \t]*\r\n([ \t])')
+WHITESPACE_RUN = re.compile(rb'[ \t]+')
+TRAILING_WHITESPACE = re.compile(rb'[ \t]+\r\n')
+SPF_MODIFIER = re.compile(r'^([a-zA-Z][a-zA-Z0-9_.-]*)=(.*)$')
+SPF_MACRO = re.compile(r'%\{([slodiphcrtv])(\d*)(r?)([.\-+,/_=]*)\}|%%|%_|%-')
+DKIM_SIGNATURE_B_TAG = re.compile(rb'((?:^|;)[ \t\r\n]*b[ \t\r\n]*=)[^;]*')
@@ -0,0 +1,237 @@
+import json
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+from utils.email_parser import EmailContent, EmailParser
+from analyzers.url_analyzer import URLAnalyzer
+from analyzers.content_analyzer import ContentAnalyzer
+from analyzers.sender_analyzer import SenderAnalyzer
+from analyzers.attachment_analyzer import AttachmentAnalyzer
+from utils.campaign_index import CampaignIndex
+from utils.email_auth import EmailAuthenticator
+from utils.instrumentation import Instrumentation
+from utils.public_suffix import registrable_domain
+from utils.result_cache import ResultCache, message_key
+from utils.scoring import PhishingScorer
+
+if TYPE_CHECKING:
+    # utils.enrichment pulls in asyncio, which only enriching pipelines should pay for
+    from utils.enrichment import DomainEnricher
+
+class AnalysisPipeline:
+    """Run the full parse -> analyze -> score chain without any UI dependencies"""
+
+    def __init__(self, instrumentation: Instrumentation = None, cache: ResultCache = None,
+                 campaigns: CampaignIndex = None, authenticator: EmailAuthenticator = None,
+                 enricher: 'DomainEnricher' = None):
+        self.scorer = PhishingScorer()
+        self.instrumentation = instrumentation
+        self.cache = cache
+        self.campaigns = campaigns
+        self.authenticator = authenticator
+        self.enricher = enricher
+
+    def _run_stage(self, stage: str, func: Callable, sizes: Dict[str, int] = None):
+        """Run one stage, timing it only when instrumentation is enabled"""
+        if self.instrumentation is None:
+            return func()
+
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+
+        findings = None
+        if isinstance(result, dict):
+            found = result.get('findings', result.get('all_findings'))
+            findings = len(found) if found is not None else None
+        self.instrumentation.record(stage, elapsed, sizes, findings)
+        return result
+
+    def parse(self, email_content: EmailContent, is_file: bool = False) -> EmailParser:
+        """Parse raw email content"""
+        sizes = None
+        if self.instrumentation is not None and hasattr(email_content, '__len__'):
+            sizes = {'message_bytes': len(email_content)}
+        return self._run_stage('parse', lambda: EmailParser(email_content, is_file=is_file), sizes)
+
+    def extract(self, parser: EmailParser) -> Dict:
+        """Extract the components the analyzers work on"""
+        return {
+            'sender': parser.get_sender(),
+            'subject': parser.get_subject(),
+            'body': parser.get_body(),
+            'urls': parser.extract_urls(),
+            'attachments': parser.get_attachments(),
+            'headers': parser.get_headers()
+        }
+
+    def run_analyzers(self, components: Dict) -> Dict:
+        """Run every analyzer against extracted email components"""
+        body = components['body']
+        urls = components['urls']
+        attachments = components['attachments']
+
+        # Input sizes are only worth computing when someone is recording them
+        instrumented = self.instrumentation is not None
+
+        domain_info = components.get('domain_info')
+
+        url_analysis = self._run_stage(
+            'url',
+            lambda: URLAnalyzer(urls, domain_info).analyze(),
+            {'url_count': len(urls)} if instrumented else None
+        )
+        content_analysis = self._run_stage(
+            'content',
+            lambda: ContentAnalyzer(components['subject'], body['text'], body['html']).analyze(),
+            # Bytes as UTF-8 rather than characters, so non-Latin bodies compare with attachment_bytes
+            {'body_bytes': len(body['text'].encode('utf-8', errors='surrogatepass'))
+                           + len(body['html'].encode('utf-8', errors='surrogatepass'))} if instrumented else None
+        )
+        sender_analysis = self._run_stage(
+            'sender',
+            lambda: SenderAnalyzer(components['sender'], components['headers'].get('reply_to', ''),
+                                   components.get('authentication'), domain_info).analyze()
+        )
+        attachment_analysis = self._run_stage(
+            'attachment',
+            lambda: AttachmentAnalyzer(attachments).analyze(),
+            {'attachment_count': len(attachments),
+             'attachment_bytes': sum(attachment.get('size', 0) for attachment in attachments)} if instrumented else None
+        )
+
+        return {
+            'url_analysis': url_analysis,
+            'content_analysis': content_analysis,
+            'sender_analysis': sender_analysis,
+            'attachment_analysis': attachment_analysis
+        }
+
+    def prepare(self, email_content: EmailContent, is_file: bool = False) -> Dict:
+        """Parse a message and extract its components, with authentication results when enabled"""
+        if self.authenticator is not None:
+            # SPF/DKIM need the exact bytes as received, so a stream is read in full here
+            if hasattr(email_content, 'read'):
+                email_content = email_content.read()
+            raw = email_content.encode('utf-8', errors='surrogateescape') if isinstance(email_content, str) \
+                else bytes(email_content)
+
+        parser = self.parse(email_content, is_file=is_file)
+        components = self._run_stage('extract', lambda: self.extract(parser))
+        if self.authenticator is not None:
+            components['authentication'] = self._run_stage('auth', lambda: self.authenticator.verify(raw))
+        return components
+
+    def enrich(self, batch: List[Dict]):
+        """Attach domain age and MX data to every message in a batch with one round of lookups"""
+        from utils.enrichment import DomainEnricher
+
+        hosts_per_message = [self._domain_hosts(components) for components in batch]
+        found = self._run_stage(
+            'enrich', lambda: self.enricher.enrich_blocking(set().union(*hosts_per_message))
+        )
+        for components, hosts in zip(batch, hosts_per_message):
+            # Keyed by host as the analyzers see it, so they need no domain logic of their own
+            components['domain_info'] = {
+                host: found[registrable] for host in hosts
+                for registrable in [DomainEnricher.registrable(host)] if registrable in found
+            }
+
+    @staticmethod
+    def _domain_hosts(components: Dict) -> set:
+        hosts = set()
+        for url in components['urls']:
+            try:
+                hosts.add(urlparse(url).netloc.lower())
+            except ValueError:
+                continue
+        sender_email = components['sender'].get('email', '')
+        if '@' in sender_email:
+            hosts.add(sender_email.split('@')[-1].lower())
+        return hosts
+
+    def analyze(self, email_content: EmailContent, is_file: bool = False) -> Dict:
+        """Analyze a single email and return the scored result"""
+        components = self.prepare(email_content, is_file=is_file)
+        if self.enricher is not None:
+            self.enrich([components])
+        return self.evaluate(components)
+
+    def analyze_batch(self, messages: Iterable[EmailContent]) -> List[Dict]:
+        """Analyze several emails, looking up each distinct domain in the batch only once"""
+        batch = [self.prepare(email_content) for email_content in messages]
+        if self.enricher is not None and batch:
+            self.enrich(batch)
+        return [self.evaluate(components) for components in batch]
+
+    def evaluate(self, components: Dict) -> Dict:
+        """Score prepared components, consulting the campaign index and result cache"""
+        # Cluster first so exact repeats still count towards their campaign's size
+        campaign = None
+        if self.campaigns is not None:
+            body = components['body']
+            campaign = self._run_stage(
+                'campaign', lambda: self.campaigns.classify(body['text'], body['html'], components['urls'])
+            )
+
+        # Identical messages (campaign copies, Streamlit reruns) reuse the stored verdict
+        key = message_key(components) if self.cache is not None else None
+        results = self.cache.get(key) if key is not None else None
+
+        reused = False
+        if results is None:
+            results, reused = self._score(components, campaign)
+            # A borrowed verdict is only an estimate, so it never goes into the exact-match cache
+            if key is not None and not reused:
+                self.cache.set(key, results)
+
+        if campaign is not None:
+            campaign_id, size, similarity = campaign
+            results['campaign'] = {
+                'id': campaign_id,
+                'size': size,
+                'similarity': round(similarity, 3),
+                'reused_verdict': reused
+            }
+
+        return results
+
+    def _score(self, components: Dict, campaign: Optional[Tuple[int, int, float]]) -> Tuple[Dict, bool]:
+        """Score extracted components, reusing the campaign verdict for near-duplicates"""
+        results = None
+        context = self._campaign_context(components) if campaign is not None else ''
+        if campaign is not None and campaign[1] > 1 and self.campaigns.reuse_verdicts:
+            results = self.campaigns.verdict(campaign[0], context)
+
+        reused = results is not None
+        if not reused:
+            analysis_results = self.run_analyzers(components)
+            results = self._run_stage('score', lambda: self.scorer.calculate_overall_score(analysis_results))
+            if campaign is not None:
+                self.campaigns.set_verdict(campaign[0], results, context)
+
+        # Keep the extracted email details alongside the verdict
+        results['email'] = {
+            'sender': components['sender'],
+            'subject': components['subject'],
+            'urls': components['urls'],
+            'attachments': components['attachments']
+        }
+        if 'authentication' in components:
+            results['email']['authentication'] = components['authentication']
+        if 'domain_info' in components:
+            results['email']['domains'] = components['domain_info']
+        return results, reused
+
+    @staticmethod
+    def _campaign_context(components: Dict) -> str:
+        """The parts of a message the campaign signature ignores but the verdict depends on"""
+        sender_email = components['sender'].get('email', '')
+        sender_domain = sender_email.rpartition('@')[2].lower().rstrip('.')
+        authentication = components.get('authentication') or {}
+        return json.dumps({
+            'sender': registrable_domain(sender_domain) or sender_domain,
+            'attachments': sorted([str(attachment.get('sha256')), str(attachment.get('filename', '')).lower()]
+                                  for attachment in components['attachments']),
+            'authentication': [authentication.get(check, {}).get('result') for check in ('spf', 'dkim', 'dmarc')]
+        }, sort_keys=True)
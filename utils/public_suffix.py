@@ -0,0 +1,138 @@
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from utils.cache import LRUCache
+
+# Bundled copy of https://publicsuffix.org/list/public_suffix_list.dat (MPL 2.0)
+BUNDLED_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public_suffix_list.dat')
+
+# Trie node key marking that the labels leading to the node form a rule
+_RULE = None
+
+class PublicSuffixList:
+    """Public Suffix List compiled into a trie of reversed labels.
+
+    'example.co.uk' is looked up as uk -> co -> example, so finding the public suffix, and
+    from it the registrable domain, costs one dict lookup per label. Wildcard rules live
+    under a '*' child and exception rules under a '!label' key of their parent node.
+    Results are memoized per host, since the same hosts recur message after message.
+    """
+
+    def __init__(self, rules: Iterable[str] = (), cache_size: int = 100000):
+        self._root: Dict = {}
+        self.rule_count = 0
+        self._cache = LRUCache(max_size=cache_size)
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def from_file(cls, path: str = BUNDLED_LIST, include_private: bool = True,
+                  cache_size: int = 100000) -> 'PublicSuffixList':
+        """Load a list in publicsuffix.org format; include_private keeps rules such as github.io"""
+        psl = cls(cache_size=cache_size)
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('// ===BEGIN PRIVATE DOMAINS===') and not include_private:
+                    break
+                rule = line.split(None, 1)[0] if line.strip() else ''
+                if rule and not rule.startswith('//'):
+                    psl.add(rule)
+        return psl
+
+    def add(self, rule: str):
+        """Add one rule, in Unicode or punycode form; IDN rules are indexed under both"""
+        rule = rule.strip().lower()
+        self._add_labels(rule)
+        if not rule.isascii():
+            try:
+                self._add_labels('.'.join(self._to_ascii(label) for label in rule.split('.')))
+            except UnicodeError:
+                pass
+        self._cache.clear()
+
+    @staticmethod
+    def _to_ascii(label: str) -> str:
+        if label.isascii():
+            return label
+        prefix = '!' if label.startswith('!') else ''
+        return prefix + label[len(prefix):].encode('idna').decode('ascii')
+
+    def _add_labels(self, rule: str):
+        labels = rule.split('.')
+        exception = labels[0].startswith('!')
+        node = self._root
+        for label in reversed(labels[1:] if exception else labels):
+            node = node.setdefault(label, {})
+        if exception:
+            node['!' + labels[0][1:]] = True
+        else:
+            node[_RULE] = True
+        self.rule_count += 1
+
+    def _suffix_length(self, labels: list) -> int:
+        """Number of trailing labels that make up the public suffix"""
+        # The implicit '*' rule: an unlisted TLD is a public suffix on its own
+        length = 1
+        node = self._root
+        for depth, label in enumerate(reversed(labels)):
+            if ('!' + label) in node:
+                # Exception rules win, and exclude their own leftmost label
+                return depth
+            wildcard = node.get('*')
+            if wildcard is not None and _RULE in wildcard:
+                length = depth + 1
+            node = node.get(label)
+            if node is None:
+                break
+            if _RULE in node:
+                length = depth + 1
+        return length
+
+    def split(self, host: str) -> Tuple[str, Optional[str], str]:
+        """Split a host into (subdomain, registrable domain, public suffix).
+
+        'a.b.example.co.uk' gives ('a.b', 'example.co.uk', 'co.uk'). A host that is itself a
+        public suffix has no registrable domain: 'co.uk' gives ('', None, 'co.uk'), and an
+        IP address gives ('', None, '').
+        """
+        host = host.lower().rstrip('.')
+        return self._cache.get_or_compute(host, lambda: self._split(host))
+
+    def _split(self, host: str) -> Tuple[str, Optional[str], str]:
+        labels = host.split('.')
+        # IP literals and malformed names have no suffix to speak of
+        if '' in labels or ':' in host or labels[-1].isdigit():
+            return '', None, ''
+        length = self._suffix_length(labels)
+        if len(labels) <= length:
+            return '', None, host
+        return ('.'.join(labels[:-length - 1]), '.'.join(labels[-length - 1:]),
+                '.'.join(labels[-length:]))
+
+    def registrable_domain(self, host: str) -> Optional[str]:
+        """The domain a registrant controls ('example.co.uk' for 'www.example.co.uk')"""
+        return self.split(host)[1]
+
+    def public_suffix(self, host: str) -> str:
+        return self.split(host)[2]
+
+    def stats(self) -> Dict:
+        return {'rules': self.rule_count, 'cache': self._cache.stats()}
+
+# Bundled list, compiled on first use
+_default: Optional[PublicSuffixList] = None
+
+def default_list() -> PublicSuffixList:
+    """The bundled Public Suffix List, loaded once per process"""
+    global _default
+    if _default is None:
+        _default = PublicSuffixList.from_file()
+    return _default
+
+def split_host(host: str) -> Tuple[str, Optional[str], str]:
+    """(subdomain, registrable domain, public suffix) of a host, using the bundled list"""
+    return default_list().split(host)
+
+def registrable_domain(host: str) -> Optional[str]:
+    """Registrable domain of a host using the bundled list, or None if the host is a public suffix"""
+    return default_list().split(host)[1]
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional
+
+from utils.cache import LRUCache
+from utils.domain_set import DomainSet
+
+# Bump whenever analyzer or scoring logic changes in a way the rule lists below don't capture
+RULESET_REVISION = 7
+
+def _canonical(value):
+    """Turn rule data into something json.dumps renders the same way every time"""
+    if isinstance(value, DomainSet):
+        # Feeds can hold 100k+ domains, so they are represented by their digest
+        return value.fingerprint()
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (set, frozenset)):
+        return sorted(_canonical(item) for item in value)
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+def ruleset_version() -> str:
+    """Fingerprint every keyword list, domain list and weight that influences a verdict"""
+    from analyzers.url_analyzer import URLAnalyzer
+    from analyzers.content_analyzer import ContentAnalyzer
+    from analyzers.sender_analyzer import SenderAnalyzer
+    from analyzers.attachment_analyzer import AttachmentAnalyzer
+    from utils.scoring import PhishingScorer
+
+    rules = {'revision': RULESET_REVISION, 'weights': PhishingScorer().weights}
+    for analyzer in (URLAnalyzer, ContentAnalyzer, SenderAnalyzer, AttachmentAnalyzer):
+        rules[analyzer.__name__] = {
+            name: _canonical(value) for name, value in vars(analyzer).items()
+            if name.isupper() and isinstance(value, (list, tuple, set, frozenset, dict, DomainSet))
+        }
+
+    # A brand list loaded from file replaces the built-in typosquatting targets
+    index = URLAnalyzer.__dict__.get('_typosquat_index')
+    if index is not None:
+        rules['brand_domains'] = sorted(index.brand_domains)
+    blocklist = URLAnalyzer.__dict__.get('_blocklist')
+    if blocklist is not None:
+        rules['blocklist'] = blocklist.checksum
+    hash_blocklist = AttachmentAnalyzer.__dict__.get('_hash_blocklist')
+    if hash_blocklist is not None:
+        rules['hash_blocklist'] = hash_blocklist.checksum
+
+    encoded = json.dumps(rules, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+def _normalize_body(text: str) -> str:
+    """Normalize line endings and trailing whitespace, which never change a verdict"""
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+def message_key(components: Dict) -> str:
+    """Hash exactly the extracted parts the analyzers look at"""
+    sender = components['sender']
+    body = components['body']
+    canonical = {
+        'from': str(sender.get('raw', '')),
+        'reply_to': str(components['headers'].get('reply_to', '')),
+        'subject': str(components['subject']),
+        'text': _normalize_body(body['text']),
+        'html': _normalize_body(body['html']),
+        'urls': components['urls'],
+        'attachments': [[attachment.get('filename', ''), attachment.get('size', 0),
+                         attachment.get('content_type', ''), attachment.get('detected_type'),
+                         attachment.get('archive'), attachment.get('sha256')]
+                        for attachment in components['attachments']]
+    }
+    # SPF/DKIM/DMARC verdicts depend on the delivery path, not just the content
+    if 'authentication' in components:
+        canonical['authentication'] = components['authentication']
+    # Domain ages move every day, so enriched verdicts naturally expire from the cache
+    if 'domain_info' in components:
+        canonical['domain_info'] = components['domain_info']
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+class ResultCache:
+    """Two-tier verdict cache: an in-memory LRU in front of an optional SQLite file.
+
+    Entries are keyed on message_key() and tagged with the ruleset version they were computed
+    under, so changing a keyword list, brand list or weight invalidates every stored verdict.
+    """
+
+    def __init__(self, max_size: int = 10000, path: Optional[str] = None, ruleset: Optional[str] = None):
+        self.ruleset = ruleset or ruleset_version()
+        self._memory = LRUCache(max_size=max_size)
+        self.path = path
+        self.disk_hits = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        if path is not None:
+            self._open(path)
+
+    def _open(self, path: str):
+        import sqlite3  # Only needed for the on-disk tier
+
+        # Several scan workers may share one file, so use WAL and wait out their writes
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, ruleset TEXT NOT NULL, result TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM results WHERE ruleset != ?", (self.ruleset,))
+
+    def refresh_ruleset(self):
+        """Recompute the ruleset version after rule lists change at runtime"""
+        ruleset = ruleset_version()
+        if ruleset != self.ruleset:
+            self.ruleset = ruleset
+            self._memory.clear()
+            if self._db is not None:
+                with self._db_lock:
+                    self._db.execute("DELETE FROM results WHERE ruleset != ?", (ruleset,))
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a fresh copy of the cached result, or None"""
+        encoded = self._memory.get(key)
+        if encoded is None and self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT result FROM results WHERE key = ? AND ruleset = ?", (key, self.ruleset)
+                ).fetchone()
+            if row is not None:
+                encoded = row[0]
+                self.disk_hits += 1
+                self._memory.set(key, encoded)
+        # Results are stored serialized so callers can never mutate a cached verdict
+        return json.loads(encoded) if encoded is not None else None
+
+    def set(self, key: str, result: Dict):
+        encoded = json.dumps(result, default=str)
+        self._memory.set(key, encoded)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, ruleset, result, created) VALUES (?, ?, ?, ?)",
+                    (key, self.ruleset, encoded, time.time())
+                )
+
+    def clear(self):
+        self._memory.clear()
+        self.disk_hits = 0
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM results")
+
+    def stats(self) -> Dict:
+        stats = {'ruleset': self.ruleset, 'memory': self._memory.stats(), 'disk_hits': self.disk_hits}
+        if self._db is not None:
+            with self._db_lock:
+                stats['disk_size'] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return stats
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,87 @@
+import json
+import os
+from typing import Dict, Optional, TextIO
+
+class JSONLWriter:
+    """Write one JSON line per result to a file or text stream.
+
+    With a file, sync() flushes and fsyncs it and returns the byte offset reached, and
+    resume_at truncates whatever a crashed run wrote after its last checkpoint, so no
+    result is ever written twice. Resuming into a file that is missing or shorter than
+    resume_at raises, since the results it should hold would otherwise be lost silently.
+    """
+
+    def __init__(self, path: Optional[str] = None, stream: Optional[TextIO] = None,
+                 resume_at: Optional[int] = None):
+        self.path = path
+        self._stream = stream
+        self._file = None
+        if path is not None:
+            if resume_at is not None:
+                try:
+                    self._file = open(path, 'r+b')
+                except FileNotFoundError:
+                    raise FileNotFoundError(f"Cannot resume: output {path} from the checkpointed run is missing") from None
+                if os.fstat(self._file.fileno()).st_size < resume_at:
+                    self._file.close()
+                    raise ValueError(f"Cannot resume: output {path} is shorter than the checkpoint records")
+                self._file.truncate(resume_at)
+                self._file.seek(resume_at)
+            else:
+                self._file = open(path, 'wb')
+
+    def write(self, result: Dict):
+        line = json.dumps(result, default=str) + '\n'
+        if self._file is not None:
+            self._file.write(line.encode('utf-8', errors='surrogatepass'))
+        else:
+            self._stream.write(line)
+
+    def sync(self) -> Optional[int]:
+        """Make everything written so far durable; returns the file offset (None for streams)"""
+        if self._file is None:
+            self._stream.flush()
+            return None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+class SQLiteWriter:
+    """Write results to a SQLite table keyed by message id.
+
+    Rows are upserted with INSERT OR REPLACE, so results a crashed run wrote after its last
+    checkpoint are simply overwritten when they are scored again.
+    """
+
+    def __init__(self, path: str):
+        import sqlite3  # Only needed for SQLite output
+
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, result TEXT NOT NULL)")
+        self._db.execute("BEGIN")
+
+    def write(self, result: Dict):
+        self._db.execute("INSERT OR REPLACE INTO results (id, result) VALUES (?, ?)",
+                         (str(result.get('id')), json.dumps(result, default=str)))
+
+    def sync(self) -> Optional[int]:
+        """Commit the open transaction"""
+        self._db.execute("COMMIT")
+        self._db.execute("BEGIN")
+        return None
+
+    def close(self):
+        self._db.execute("COMMIT")
+        self._db.close()
+
+def open_writer(path: str, resume_at: Optional[int] = None):
+    """SQLite output for .db/.sqlite paths, JSON lines otherwise"""
+    if os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteWriter(path)
+    return JSONLWriter(path, resume_at=resume_at)
@@ -0,0 +1,53 @@
+# Sample emails shown in the app and used as templates for benchmark corpora
+SAMPLE_EMAILS = {
+    "🚨 Critical - Obvious PayPal Scam": """From: security@paypal-verify.tk
+To: victim@email.com
+Subject: URGENT: Account Suspended - Verify Now!!!
+
+Dear Customer,
+
+Your PayPal account has been SUSPENDED due to unusual activity detected. You have 24 HOURS to verify your information or your account will be PERMANENTLY CLOSED.
+
+CLICK HERE IMMEDIATELY: http://bit.ly/paypal-verify-urgent
+
+You must provide:
+- Full Name
+- Password
+- Credit Card Number
+- SSN
+
+Failure to comply will result in account termination.
+
+PayPal Security Team
+DO NOT REPLY TO THIS EMAIL""",
+    
+    "⚠️ High Risk - Sophisticated Spear Phishing": """From: IT Support <it.support@gmail.com>
+To: employee@company.com
+Subject: Password Reset Required
+
+Hi,
+
+As part of our security upgrade, all employees must reset their passwords by end of day. Please click the link below to update your credentials:
+
+https://company-portal-secure.xyz/reset
+
+This is mandatory for all staff. Contact IT if you have issues.
+
+Best regards,
+IT Department""",
+    
+    "✅ Safe - Legitimate GitHub Notification": """From: notifications@github.com
+To: developer@email.com
+Subject: [GitHub] New pull request on your repository
+
+Hello,
+
+A new pull request has been opened on your repository "awesome-project":
+
+Pull Request #42: Fix authentication bug
+View on GitHub: https://github.com/user/awesome-project/pull/42
+
+Thanks,
+GitHub Team"""
+}
+
@@ -0,0 +1,229 @@
+from typing import Dict, Iterable, List, Optional
+from utils import patterns
+from utils.public_suffix import registrable_domain, split_host
+
+# Characters attackers swap in for the letters they resemble
+HOMOGLYPHS = {
+    '0': 'o', '1': 'l', '3': 'e', '4': 'a', '5': 's',
+    '7': 't', '8': 'b', '@': 'a', '$': 's', '!': 'i'
+}
+
+# Multi-character sequences that render like a single letter
+HOMOGLYPH_SEQUENCES = [('rn', 'm'), ('vv', 'w'), ('cl', 'd')]
+
+# Letter pairs that are easy to confuse visually
+CONFUSABLE_PAIRS = {frozenset(pair) for pair in [('l', 'i'), ('o', 'q'), ('u', 'v'), ('g', 'q')]}
+
+QWERTY_ROWS = ['1234567890-', 'qwertyuiop', 'asdfghjkl', 'zxcvbnm']
+
+def _keyboard_neighbors() -> Dict[str, set]:
+    """Map every key to the keys physically adjacent to it on a QWERTY keyboard"""
+    positions = {}
+    for row_index, row in enumerate(QWERTY_ROWS):
+        for col_index, key in enumerate(row):
+            positions[key] = (row_index, col_index)
+
+    neighbors = {key: set() for key in positions}
+    for key, (row, col) in positions.items():
+        for other, (other_row, other_col) in positions.items():
+            if other != key and abs(row - other_row) <= 1 and abs(col - other_col) <= 1:
+                neighbors[key].add(other)
+    return neighbors
+
+KEYBOARD_NEIGHBORS = _keyboard_neighbors()
+
+class TyposquatIndex:
+    """Symmetric-delete index for finding lookalikes of a large list of brand domains"""
+
+    # Cost of a substitution between adjacent keys, homoglyphs or confusable letters
+    CHEAP_EDIT_COST = 0.5
+
+    def __init__(self, brand_domains: Iterable[str], max_deletes: int = 1):
+        self.max_deletes = max_deletes
+        self.brand_domains = set()
+        self._labels: List[str] = []
+        self._brand_for_label: Dict[str, str] = {}
+        self._normalized: Dict[str, int] = {}
+        self._deletes: Dict[str, object] = {}
+
+        for domain in brand_domains:
+            self.add(domain)
+
+    @classmethod
+    def from_file(cls, path: str, extra_domains: Iterable[str] = (), max_deletes: int = 1) -> 'TyposquatIndex':
+        """Build an index from a file with one brand domain per line"""
+        return cls(list(extra_domains) + cls.read_domains(path), max_deletes=max_deletes)
+
+    @staticmethod
+    def read_domains(path: str) -> List[str]:
+        """Read one domain per line, skipping blank lines and # comments"""
+        domains = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip().lower()
+                if line:
+                    domains.append(line)
+        return domains
+
+    @staticmethod
+    def domain_label(domain: str) -> str:
+        """Get the label compared for typosquatting: the registrable domain minus its public suffix"""
+        subdomain, registrable, suffix = split_host(domain)
+        if registrable is None:
+            return ''
+        return registrable[:-len(suffix) - 1]
+
+    @staticmethod
+    def normalize(label: str) -> str:
+        """Fold homoglyphs so 'paypa1' and 'rnicrosoft' collapse onto their targets"""
+        for sequence, letter in HOMOGLYPH_SEQUENCES:
+            label = label.replace(sequence, letter)
+        return ''.join(HOMOGLYPHS.get(char, char) for char in label)
+
+    def add(self, domain: str):
+        """Add a brand domain to the index"""
+        domain = domain.strip().lower()
+        label = self.domain_label(domain)
+        self.brand_domains.add(domain)
+        if not label or label in self._brand_for_label:
+            return
+
+        self._brand_for_label[label] = domain
+        label_id = len(self._labels)
+        self._labels.append(label)
+
+        normalized = self.normalize(label)
+        self._normalized.setdefault(normalized, label_id)
+        for variant in self._delete_variants(normalized):
+            self._add_delete(variant, label_id)
+
+    def _add_delete(self, variant: str, label_id: int):
+        """Store a label id under a delete variant (a bare int until a second id arrives)"""
+        existing = self._deletes.get(variant)
+        if existing is None:
+            self._deletes[variant] = label_id
+        elif isinstance(existing, int):
+            if existing != label_id:
+                self._deletes[variant] = [existing, label_id]
+        elif label_id not in existing:
+            existing.append(label_id)
+
+    def _delete_variants(self, word: str) -> set:
+        """Every string reachable from word by deleting up to max_deletes characters"""
+        variants = {word}
+        frontier = {word}
+        for _ in range(self.max_deletes):
+            next_frontier = set()
+            for item in frontier:
+                if len(item) <= 1:
+                    continue
+                for i in range(len(item)):
+                    next_frontier.add(item[:i] + item[i + 1:])
+            variants |= next_frontier
+            frontier = next_frontier
+        return variants
+
+    def lookup(self, domain: str) -> Optional[str]:
+        """Return the brand domain this domain imitates, or None"""
+        domain = domain.strip().lower()
+        # Any host under a brand's own registrable domain is the brand itself
+        if domain in self.brand_domains or registrable_domain(domain) in self.brand_domains:
+            return None
+
+        label = self.domain_label(domain)
+        if not label:
+            return None
+
+        # Same brand name on a different TLD (paypal.tk)
+        if label in self._brand_for_label:
+            return self._brand_for_label[label]
+
+        # Brand name embedded as a token (paypal-verify, secure-paypal)
+        for token in patterns.DOMAIN_TOKEN_SEPARATOR.split(label):
+            if token != label and len(token) >= 4 and token in self._brand_for_label:
+                return self._brand_for_label[token]
+
+        # Pure homoglyph substitution (paypa1, g00gle, rnicrosoft)
+        normalized = self.normalize(label)
+        label_id = self._normalized.get(normalized)
+        if label_id is not None and len(normalized) >= 4:
+            return self._brand_for_label[self._labels[label_id]]
+
+        # Small edits: candidates share a delete variant, then verify the weighted distance
+        best = None
+        best_distance = None
+        for candidate_id in self._candidates(normalized):
+            candidate = self._labels[candidate_id]
+            allowed = self._allowed_distance(candidate)
+            if allowed == 0:
+                continue
+            distance = self.distance(label, candidate, allowed)
+            if distance <= allowed and (best_distance is None or distance < best_distance):
+                best = candidate
+                best_distance = distance
+
+        return self._brand_for_label[best] if best else None
+
+    def _candidates(self, normalized: str) -> set:
+        """Collect label ids sharing at least one delete variant with the input"""
+        candidates = set()
+        for variant in self._delete_variants(normalized):
+            found = self._deletes.get(variant)
+            if found is None:
+                continue
+            if isinstance(found, int):
+                candidates.add(found)
+            else:
+                candidates.update(found)
+        return candidates
+
+    @staticmethod
+    def _allowed_distance(brand_label: str) -> float:
+        """Short brand names only tolerate cheap edits to keep false positives down"""
+        if len(brand_label) < 4:
+            return 0
+        if len(brand_label) < 6:
+            return TyposquatIndex.CHEAP_EDIT_COST
+        return 1.0
+
+    @classmethod
+    def substitution_cost(cls, a: str, b: str) -> float:
+        """Cost of replacing a with b, cheaper for adjacent keys and lookalike characters"""
+        if a == b:
+            return 0.0
+        if b in KEYBOARD_NEIGHBORS.get(a, ()) or HOMOGLYPHS.get(a) == b or HOMOGLYPHS.get(b) == a:
+            return cls.CHEAP_EDIT_COST
+        if frozenset((a, b)) in CONFUSABLE_PAIRS:
+            return cls.CHEAP_EDIT_COST
+        return 1.0
+
+    @classmethod
+    def distance(cls, source: str, target: str, limit: float = None) -> float:
+        """Weighted Damerau-Levenshtein (optimal string alignment) distance"""
+        if limit is not None and abs(len(source) - len(target)) > limit:
+            return float('inf')
+
+        previous_previous = None
+        previous = [float(j) for j in range(len(target) + 1)]
+
+        for i in range(1, len(source) + 1):
+            current = [float(i)] + [0.0] * len(target)
+            for j in range(1, len(target) + 1):
+                current[j] = min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + cls.substitution_cost(source[i - 1], target[j - 1])
+                )
+                # Swapped neighbouring characters count as a single cheap edit
+                if (i > 1 and j > 1 and source[i - 1] == target[j - 2]
+                        and source[i - 2] == target[j - 1] and source[i - 1] != target[j - 1]):
+                    current[j] = min(current[j], previous_previous[j - 2] + cls.CHEAP_EDIT_COST)
+
+            if limit is not None and min(current) > limit:
+                return float('inf')
+            previous_previous, previous = previous, current
+
+        return previous[len(target)]
+
+    def __len__(self) -> int:
+        return len(self.brand_domains)
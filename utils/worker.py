@@ -0,0 +1,120 @@
+import os
+from typing import Dict, List, Optional
+
+from utils.pipeline import AnalysisPipeline
+from utils.result_cache import ResultCache
+from utils.samples import SAMPLE_EMAILS
+
+# Per-process pipeline, built once by the pool initializer
+_pipeline = None
+
+def init_worker(brand_domains: str = None, cache_path: str = None, verify_auth: bool = False,
+                zone_file: str = None, enrich: bool = False, enrich_cache: str = None,
+                shorteners: str = None, free_providers: str = None, blocklist: str = None,
+                hash_blocklist: str = None, fuzzy_hashes: bool = False):
+    """Pool initializer: build the analysis pipeline once per worker process.
+
+    Every worker keeps an in-memory verdict cache; cache_path adds a SQLite tier shared by all
+    workers and later runs. verify_auth checks SPF/DKIM/DMARC against live DNS, or against
+    zone_file when one is given. enrich adds domain age and MX checks; enrich_cache keeps
+    those lookups in a SQLite file shared by all workers and later runs. shorteners and
+    free_providers add domain feeds to the built-in URL shortener and free provider lists.
+    blocklist and hash_blocklist map files from build_blocklist.py, whose pages all workers
+    share. fuzzy_hashes adds ssdeep and TLSH hashes to every attachment's SHA-256.
+    """
+    global _pipeline
+    if brand_domains:
+        from analyzers.url_analyzer import URLAnalyzer
+        URLAnalyzer.load_brand_domains(brand_domains)
+    if shorteners:
+        from analyzers.url_analyzer import URLAnalyzer
+        URLAnalyzer.load_url_shorteners(shorteners)
+    if blocklist:
+        from analyzers.url_analyzer import URLAnalyzer
+        URLAnalyzer.load_blocklist(blocklist)
+    if hash_blocklist:
+        from analyzers.attachment_analyzer import AttachmentAnalyzer
+        AttachmentAnalyzer.load_hash_blocklist(hash_blocklist)
+    if fuzzy_hashes:
+        from utils.email_parser import EmailParser
+        EmailParser.FUZZY_HASHES = True
+    if free_providers:
+        from analyzers.sender_analyzer import SenderAnalyzer
+        SenderAnalyzer.load_free_email_providers(free_providers)
+
+    resolver = None
+    if verify_auth or zone_file or enrich:
+        from utils.dns_resolver import CachingResolver, SystemResolver, ZoneFileResolver
+        resolver = CachingResolver(ZoneFileResolver.from_file(zone_file) if zone_file else SystemResolver())
+
+    authenticator = None
+    if verify_auth or zone_file:
+        from utils.email_auth import EmailAuthenticator
+        authenticator = EmailAuthenticator(resolver)
+
+    enricher = None
+    if enrich:
+        from utils.enrichment import DomainEnricher, WhoisClient
+        enricher = DomainEnricher(resolver, WhoisClient(), cache_path=enrich_cache)
+
+    # Built after the domain lists are loaded so the ruleset version covers them
+    _pipeline = AnalysisPipeline(cache=ResultCache(path=cache_path), authenticator=authenticator,
+                                 enricher=enricher)
+
+def warm_up() -> int:
+    """Run every sample through a bare pipeline so lazy imports and caches are loaded.
+
+    The worker's own pipeline is left alone: warming it would make live DNS and WHOIS
+    lookups at every start and write the samples into the shared verdict cache.
+    """
+    pipeline = AnalysisPipeline()
+    for sample in SAMPLE_EMAILS.values():
+        pipeline.analyze(sample.encode('utf-8'))
+    return os.getpid()
+
+def analyze(raw: bytes) -> Dict:
+    """Analyze one raw message inside a worker"""
+    return _pipeline.analyze(raw)
+
+def analyze_batch(messages: List[bytes]) -> List[Dict]:
+    """Analyze several raw messages inside one worker, reporting failures per message.
+
+    Each message is prepared and evaluated once, with its own error handling, so a failure
+    never sends the rest of the batch through the campaign index or verdict cache again.
+    """
+    prepared: List[Optional[Dict]] = []
+    errors: List[Optional[str]] = []
+    for raw in messages:
+        try:
+            prepared.append(_pipeline.prepare(raw))
+            errors.append(None)
+        except Exception as e:
+            prepared.append(None)
+            errors.append(str(e))
+
+    if _pipeline.enricher is not None:
+        batch = [components for components in prepared if components is not None]
+        try:
+            # Together, so every distinct domain in the batch is enriched once
+            if batch:
+                _pipeline.enrich(batch)
+        except Exception:
+            # Fall back to one at a time to find out which message failed
+            for index, components in enumerate(prepared):
+                if components is None or 'domain_info' in components:
+                    continue
+                try:
+                    _pipeline.enrich([components])
+                except Exception as e:
+                    prepared[index], errors[index] = None, str(e)
+
+    results = []
+    for components, error in zip(prepared, errors):
+        if components is None:
+            results.append({'error': error})
+            continue
+        try:
+            results.append(_pipeline.evaluate(components))
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results